@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Stand-in Ollama server for benchmarks and offline testing
+
+Speaks enough of the Ollama REST API (/api/tags, /api/generate, /api/chat,
+/api/embeddings) for the PiAI examples, and answers with canned text at a
+configurable speed, so the rest of the pipeline can be measured without a
+model - or a Pi.
+
+Like Ollama, it only "prefills" the part of a prompt that differs from the
+model's previous one (about 4 characters per token), and reports that in
+prompt_eval_count - so prompt caching can be measured too.
+
+Usage:
+    python fake_ollama.py --port 11435 --first-token 0.4 --tokens-per-sec 8 --prefill-tokens-per-sec 40
+    OLLAMA_HOST=http://localhost:11435 python simple-chatbot/chatbot.py
+
+Or from Python:
+    server = FakeOllama(first_token_delay=0.2).start()
+    client = OllamaClient(server.url)
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ("Sure, happy to help with that. This answer comes from the stand-in "
+                 "server, so it says the same thing every time. Ask me anything else!")
+
+
+class FakeOllama:
+    """Local HTTP server that imitates Ollama with canned, paced answers"""
+
+    def __init__(self, host="127.0.0.1", port=0, models=("phi3:mini",), replies=(DEFAULT_REPLY,),
+                 first_token_delay=0.3, tokens_per_second=10.0, load_delay=0.0,
+                 prefill_tokens_per_second=0.0):
+        self.models = list(models)
+        self.replies = list(replies)
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        self.load_delay = load_delay  # Extra delay the first time a model is used
+        self.prefill_tokens_per_second = prefill_tokens_per_second  # 0 = prefill is free
+        self.loaded = set()
+        self.last_prompt = {}  # Model -> previous prompt text, like a KV cache
+        self.requests = []  # (path, payload) of every POST, for inspection
+        self._count = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread; returns self."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def next_reply(self):
+        """Canned replies are used in turn."""
+        with self._lock:
+            reply = self.replies[self._count % len(self.replies)]
+            self._count += 1
+            return reply
+
+    def prefill(self, model, text):
+        """
+        Returns (prompt tokens, tokens evaluated, seconds): only the text
+        after the prefix shared with the model's previous prompt is evaluated.
+        """
+        with self._lock:
+            previous = self.last_prompt.get(model, "")
+            self.last_prompt[model] = text
+        shared = 0
+        for a, b in zip(previous, text):
+            if a != b:
+                break
+            shared += 1
+        total = max(1, len(text) // 4)
+        evaluated = max(1, total - shared // 4)
+        seconds = evaluated / self.prefill_tokens_per_second if self.prefill_tokens_per_second else 0.0
+        return total, evaluated, seconds
+
+    def startup_delay(self, model):
+        """Time to first token, including a simulated cold load."""
+        with self._lock:
+            cold = model not in self.loaded
+            self.loaded.add(model)
+        return self.first_token_delay + (self.load_delay if cold else 0.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None  # Set by FakeOllama
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client closed a pooled connection
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        line = (json.dumps(data) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name} for name in self.fake.models]})
+        elif self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.fake.requests.append((self.path, payload))
+
+        if self.path in ("/api/embeddings", "/api/embed"):
+            return self._embeddings(payload)
+        if self.path not in ("/api/generate", "/api/chat"):
+            return self._send_json({"error": "not found"}, status=404)
+
+        model = payload.get("model")
+        if model not in self.fake.models:
+            return self._send_json({"error": f"model '{model}' not found"}, status=404)
+
+        chat = self.path == "/api/chat"
+        prompt = payload.get("prompt", "")
+        delay = self.fake.startup_delay(model)
+
+        # An empty prompt just loads the model (warm-up)
+        if not chat and not prompt:
+            time.sleep(delay)
+            return self._send_json({"model": model, "response": "", "done": True})
+
+        # The text the model reads, system prompt first as in a chat template
+        if chat:
+            text = "".join(f"<{m.get('role')}>{m.get('content', '')}\n" for m in payload.get("messages", []))
+        else:
+            text = f"<system>{payload.get('system', '')}\n<user>{prompt}\n"
+        prompt_tokens, evaluated, prefill_seconds = self.fake.prefill(model, text)
+        delay += prefill_seconds
+
+        words = self.fake.next_reply().split()
+        tokens = [(" " if i else "") + word for i, word in enumerate(words)]
+        stats = {
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill_seconds * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) / self.fake.tokens_per_second * 1e9),
+            "context": list(range(prompt_tokens + len(tokens))),
+        }
+
+        if not payload.get("stream", True):
+            time.sleep(delay + len(tokens) / self.fake.tokens_per_second)
+            result = {"model": model, "done": True, **stats}
+            if chat:
+                result["message"] = {"role": "assistant", "content": "".join(tokens)}
+            else:
+                result["response"] = "".join(tokens)
+            return self._send_json(result)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(delay)
+            for token in tokens:
+                chunk = {"model": model, "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": token}
+                else:
+                    chunk["response"] = token
+                self._send_chunk(chunk)
+                time.sleep(1 / self.fake.tokens_per_second)
+            final = {"model": model, "done": True, **stats}
+            if chat:
+                final["message"] = {"role": "assistant", "content": ""}
+            else:
+                final["response"] = ""
+            self._send_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading (e.g. barge-in)
+
+    def _embeddings(self, payload):
+        # Letter counts - crude, but similar texts get similar vectors
+        text = payload.get("prompt") or payload.get("input") or ""
+        if isinstance(text, list):
+            text = " ".join(text)
+        vector = [float(text.lower().count(c)) for c in "abcdefghijklmnopqrstuvwxyz"]
+        self._send_json({"embedding": vector, "embeddings": [vector]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server with canned answers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", action="append", help="Model name to advertise (repeatable)")
+    parser.add_argument("--reply", action="append", help="Canned reply, used in turn (repeatable)")
+    parser.add_argument("--first-token", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=10.0)
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Extra delay on first use of a model")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0.0,
+                        help="Prompt evaluation speed (default: instant)")
+    args = parser.parse_args()
+
+    server = FakeOllama(args.host, args.port, models=args.model or ["phi3:mini"],
+                        replies=args.reply or [DEFAULT_REPLY], first_token_delay=args.first_token,
+                        tokens_per_second=args.tokens_per_sec, load_delay=args.load_delay,
+                        prefill_tokens_per_second=args.prefill_tokens_per_sec)
+    print(f"Stand-in Ollama listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
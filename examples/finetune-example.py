@@ -11,20 +11,36 @@ PRIVACY: This script operates entirely offline. Make sure to:
 Usage:
     source ~/ai-tools/venv/bin/activate
     python finetune-example.py
+    python finetune-example.py --data packed       # pack short samples together
+    python finetune-example.py --data padded       # the old way, for comparison
+    python finetune-example.py --data-files ~/logs/  # your own JSONL/Parquet/text files
+    python finetune-example.py --profile pi5 --autotune  # time a few settings, train with the fastest
+    python finetune-example.py --lora-budget 4M    # choose LoRA layers for 4M trainable parameters
+
+Checkpoints (adapter + optimizer state only) are written every --save-steps
+steps and every --save-minutes minutes. Ctrl+C or SIGTERM writes one more
+before stopping; run the same command again to resume from the latest.
 """
 
 import os
+import math
+import argparse
 import torch
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
     TrainingArguments,
-    Trainer,
-    DataCollatorForLanguageModeling
+    Trainer
 )
 from peft import LoraConfig, get_peft_model, TaskType
 from datasets import Dataset
 
+from finetune_data import DATA_MODES, ThroughputCallback, prepare, sampler_args
+from finetune_corpus import TokenizedCorpus
+from finetune_checkpoints import CheckpointCallback, checkpoint_args, latest_checkpoint
+import finetune_profile
+import finetune_lora
+
 # Ensure offline mode (privacy)
 os.environ["HF_HUB_OFFLINE"] = "1"
 os.environ["TRANSFORMERS_OFFLINE"] = "1"
@@ -32,7 +48,7 @@ os.environ["TRANSFORMERS_OFFLINE"] = "1"
 def create_sample_dataset():
     """
     Create a simple sample dataset for demonstration.
-    Replace this with your own data loading logic.
+    Use --data-files to train on your own files instead.
     """
     data = {
         "text": [
@@ -45,32 +61,53 @@ def create_sample_dataset():
     }
     return Dataset.from_dict(data)
 
-def tokenize_function(examples, tokenizer, max_length=128):
-    """Tokenize the text data."""
-    return tokenizer(
-        examples["text"],
-        truncation=True,
-        padding="max_length",
-        max_length=max_length,
-        return_tensors="pt"
-    )
+def parse_args():
+    parser = argparse.ArgumentParser(description="LoRA fine-tuning on the Pi 5 (offline)")
+    parser.add_argument("--model", default="microsoft/phi-2", help="Hub name (pre-downloaded) or local directory")
+    parser.add_argument("--data", choices=DATA_MODES, default="dynamic",
+                        help="Batching: pad to max length, pad per batch, or pack samples (default: dynamic)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Examples (or packed rows) per step; length grouping helps from 2 up")
+    parser.add_argument("--data-files", nargs="+", metavar="PATH",
+                        help="Train on these JSONL/Parquet/text files or directories (tokenized once, cached)")
+    parser.add_argument("--text-field", default="text", help="Field holding the text in JSONL/Parquet files")
+    parser.add_argument("--save-steps", type=int, default=100, help="Checkpoint every N steps (default: 100)")
+    parser.add_argument("--save-minutes", type=float, default=5,
+                        help="...and at least every N minutes, 0 = steps only (default: 5)")
+    parser.add_argument("--keep-checkpoints", type=int, default=3,
+                        help="Newest checkpoints kept on disk (default: 3)")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of resuming")
+    parser.add_argument("--profile", choices=["auto", *finetune_profile.PROFILES], default="auto",
+                        help="Threads, precision and checkpointing for this machine (default: auto-detect)")
+    parser.add_argument("--precision", choices=["auto", *finetune_profile.PRECISIONS],
+                        help="Base weights: fp32, bf16, or int8/4-bit with bitsandbytes (default: from profile)")
+    parser.add_argument("--threads", type=int, help="PyTorch threads (default: from profile)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Time a few steps with each candidate setting and train with the fastest")
+    parser.add_argument("--lora-targets", help="Comma-separated layer names to adapt (default: chosen for the model)")
+    parser.add_argument("--lora-budget", help="Choose LoRA layers for this many trainable parameters, e.g. 4M")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
     print("=" * 60)
     print("Fine-tuning Example for Raspberry Pi 5")
     print("Privacy: 100% Local, No External Data Transfer")
     print("=" * 60)
     
     # Configuration
-    MODEL_NAME = "microsoft/phi-2"  # Change to your local model
+    MODEL_NAME = args.model  # Change to your local model
     OUTPUT_DIR = "./finetuned-model"
     MAX_LENGTH = 128
-    BATCH_SIZE = 1  # Small batch for Pi 5's memory
+    BATCH_SIZE = args.batch_size  # Small batch for Pi 5's memory
+    GRADIENT_ACCUMULATION = max(1, 4 // BATCH_SIZE)  # Simulate larger batch
     EPOCHS = 3
+    LORA_RANK = 8  # Low rank for memory efficiency
     
     # Check if model exists locally
     model_path = os.path.expanduser(f"~/.cache/huggingface/hub/models--{MODEL_NAME.replace('/', '--')}")
-    if not os.path.exists(model_path):
+    if not os.path.isdir(MODEL_NAME) and not os.path.exists(model_path):
         print(f"\n⚠️  Model not found locally: {MODEL_NAME}")
         print("To download before going offline:")
         print(f"  1. Set HF_HUB_OFFLINE=0")
@@ -91,78 +128,136 @@ def main():
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
     
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_NAME,
-        local_files_only=True,
-        trust_remote_code=True,
-        torch_dtype=torch.float32,  # Use float32 for CPU
-        low_cpu_mem_usage=True
-    )
+    # Prepare dataset - no padding yet, the collator pads each batch
+    print(f"\n✅ Preparing dataset ({args.data} batches)")
+    if args.data_files:
+        # Streamed from disk and tokenized once - re-runs reuse the cached shards
+        dataset = TokenizedCorpus(tokenizer, MAX_LENGTH, args.text_field).load(args.data_files)
+    else:
+        dataset = create_sample_dataset()
+    tokenized_dataset, data_collator = prepare(dataset, tokenizer, args.data, MAX_LENGTH)
+    
+    if args.data == "packed":
+        print(f"Dataset size: {len(dataset)} examples packed into {len(tokenized_dataset)} rows")
+    else:
+        print(f"Dataset size: {len(tokenized_dataset)} examples")
     
-    print(f"Model loaded. Parameters: {model.num_parameters():,}")
+    # Choose LoRA targets from the model's own layers - an empty copy, no weights loaded yet
+    skeleton = finetune_lora.empty_model(MODEL_NAME)
+    parameters = sum(p.numel() for p in skeleton.parameters())
+    layers = finetune_lora.linear_layers(skeleton, LORA_RANK)
+    if args.lora_targets:
+        targets, reason = [name.strip() for name in args.lora_targets.split(",")], "--lora-targets"
+        missing = [name for name in targets if name not in layers]
+        if missing:
+            print(f"\n❌ No linear layers named {', '.join(missing)}. This model has: {', '.join(layers)}")
+            return
+    else:
+        budget = finetune_lora.parse_count(args.lora_budget) if args.lora_budget else None
+        targets, reason = finetune_lora.choose_targets(skeleton, LORA_RANK, budget)
+    print(f"\n✅ Linear layers (* = LoRA target, {reason}):")
+    finetune_lora.print_layers(layers, targets)
     
     # Configure LoRA
-    print("\n✅ Configuring LoRA for efficient fine-tuning")
     lora_config = LoraConfig(
-        r=8,  # Low rank for memory efficiency
+        r=LORA_RANK,
         lora_alpha=16,
-        target_modules=["q_proj", "v_proj"],  # Adjust based on model architecture
+        target_modules=targets,
         lora_dropout=0.05,
         bias="none",
         task_type=TaskType.CAUSAL_LM
     )
     
-    model = get_peft_model(model, lora_config)
+    def load_model(settings):
+        base = AutoModelForCausalLM.from_pretrained(
+            MODEL_NAME,
+            local_files_only=True,
+            trust_remote_code=True,
+            low_cpu_mem_usage=True,
+            **finetune_profile.load_kwargs(settings["precision"]),  # fp32, bf16 or int8/4-bit weights
+        )
+        return get_peft_model(finetune_profile.prepare_model(base, settings), lora_config)
+    
+    # Threads, precision and gradient checkpointing for this machine
+    settings = finetune_profile.resolve(args.profile, args.precision, args.threads, parameters=parameters)
+    finetune_profile.apply_threads(settings["threads"])
+    if args.autotune:
+        print(f"\n✅ Timing candidate settings ({parameters:,} parameters)")
+        batch = finetune_profile.longest_batch(tokenized_dataset, data_collator, BATCH_SIZE)
+        best = finetune_profile.autotune(load_model, batch, finetune_profile.candidates(settings, parameters))
+        if best:
+            settings = best
+            finetune_profile.apply_threads(settings["threads"])
+        else:
+            print("No candidate fitted in memory - keeping the profile's settings")
+    print(f"\n✅ Profile {settings['profile']}: {finetune_profile.describe(settings)}")
+    
+    # What to expect, before committing hours to it
+    flops = finetune_lora.measure_flops(torch.float32 if settings["precision"] == "fp32" else torch.bfloat16)
+    tokens_per_step = finetune_lora.tokens_per_example(tokenized_dataset, args.data, MAX_LENGTH) \
+        * BATCH_SIZE * GRADIENT_ACCUMULATION
+    cost = finetune_lora.estimate(
+        skeleton, targets, LORA_RANK, finetune_profile.BYTES_PER_PARAMETER[settings["precision"]],
+        BATCH_SIZE, MAX_LENGTH, tokens_per_step, settings["gradient_checkpointing"], flops)
+    steps = math.ceil(len(tokenized_dataset) / (BATCH_SIZE * GRADIENT_ACCUMULATION)) * EPOCHS
+    total = cost["seconds_per_step"] * steps
+    duration = f"{total / 3600:.1f} h" if total >= 3600 else f"{total / 60:.0f} min"
+    print(f"Expected (rough): ~{cost['memory'] / 1e9:.1f} GB memory, ~{cost['seconds_per_step']:.1f}s per step, "
+          f"~{duration} for {steps:,} steps")
+    available = finetune_profile.available_memory()
+    if available and cost["memory"] > available:
+        print(f"⚠️  Only {available / 1e9:.1f} GB free - try --precision bf16/4bit or --data dynamic")
+    del skeleton
+    
+    print("\n✅ Configuring LoRA for efficient fine-tuning")
+    model = load_model(settings)
+    print(f"Model loaded. Parameters: {parameters:,}")
+    data_collator.mask_dtype = finetune_profile.model_dtype(model)  # Packed masks match the weights
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
     total_params = sum(p.numel() for p in model.parameters())
     
     print(f"Trainable parameters: {trainable_params:,} ({100 * trainable_params / total_params:.2f}%)")
     
-    # Prepare dataset
-    print("\n✅ Preparing dataset")
-    dataset = create_sample_dataset()
-    tokenized_dataset = dataset.map(
-        lambda x: tokenize_function(x, tokenizer, MAX_LENGTH),
-        batched=True,
-        remove_columns=dataset.column_names
-    )
-    
-    print(f"Dataset size: {len(tokenized_dataset)} examples")
-    
     # Training arguments
     training_args = TrainingArguments(
         output_dir=OUTPUT_DIR,
         num_train_epochs=EPOCHS,
         per_device_train_batch_size=BATCH_SIZE,
-        gradient_accumulation_steps=4,  # Simulate larger batch
+        gradient_accumulation_steps=GRADIENT_ACCUMULATION,
         learning_rate=2e-4,
         logging_steps=10,
-        save_strategy="epoch",
+        **checkpoint_args(args.save_steps, args.keep_checkpoints),  # Small LoRA-only checkpoints, rotated
         fp16=False,  # Pi 5 CPU doesn't support fp16
-        dataloader_num_workers=0,  # Single worker for stability
+        **finetune_profile.training_args(settings),  # bf16 autocast, gradient checkpointing, workers
         report_to="none",  # No external reporting (privacy)
-    )
-    
-    # Data collator
-    data_collator = DataCollatorForLanguageModeling(
-        tokenizer=tokenizer,
-        mlm=False
+        **sampler_args(args.data),  # Similar lengths share a batch (dynamic)
     )
     
     # Trainer
+    checkpoints = CheckpointCallback(args.save_minutes)  # Also saves on Ctrl+C / SIGTERM
     trainer = Trainer(
         model=model,
         args=training_args,
         train_dataset=tokenized_dataset,
         data_collator=data_collator,
+        callbacks=[ThroughputCallback(data_collator), checkpoints],  # tokens/sec and padding efficiency
     )
     
     # Train
     print("\n✅ Starting training...")
     print("⚠️  This may take a while on Pi 5. Monitor with: htop")
     
+    resume_from = None if args.no_resume else latest_checkpoint(OUTPUT_DIR)
+    if resume_from:
+        print(f"Resuming from {resume_from}")
+    
     try:
-        trainer.train()
+        trainer.train(resume_from_checkpoint=resume_from)
+        if checkpoints.stopped_by:
+            print(f"\n⚠️  Training stopped ({checkpoints.stopped_by})")
+            print(f"Checkpoint saved: {latest_checkpoint(OUTPUT_DIR, remove_incomplete=False)}")
+            print("Run the same command again to resume")
+            return
         print("\n✅ Training completed!")
         
         # Save the fine-tuned model
@@ -180,7 +275,7 @@ def main():
         
     except KeyboardInterrupt:
         print("\n⚠️  Training interrupted by user")
-        print("Partial results may be saved in:", OUTPUT_DIR)
+        print(f"Latest checkpoint: {latest_checkpoint(OUTPUT_DIR, remove_incomplete=False) or 'none yet'}")
     except Exception as e:
         print(f"\n❌ Error during training: {e}")
         raise
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+PiAI Fine-tuning Checkpoints
+
+A fine-tuning run on the Pi takes hours to days, and a Ctrl+C, a power cut
+or a thermal shutdown shouldn't cost more than a few minutes of it.
+
+With a LoRA model the Trainer's checkpoints are small: save_pretrained()
+writes only the adapter weights, and the optimizer only holds state for
+the trainable (adapter) parameters - megabytes, not the gigabytes of the
+base model. So they can be written often:
+
+- Every `save_steps` steps, and at least every `every_minutes` minutes
+- Only the newest `keep` checkpoints stay on the SD card
+- SIGTERM (shutdown, systemd stop) or a first Ctrl+C writes one last
+  checkpoint after the current step and stops; a second Ctrl+C quits now
+- latest_checkpoint() finds the newest complete checkpoint to resume from.
+  One that was cut off mid-write is deleted rather than resumed
+"""
+
+import time
+import shutil
+import signal
+from pathlib import Path
+
+from transformers import TrainerCallback
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
+
+STATE_FILE = "trainer_state.json"  # Written last, so its presence means the checkpoint is complete
+
+
+def checkpoint_args(save_steps=100, keep=3):
+    """TrainingArguments for step-based checkpoints with rotation."""
+    return {"save_strategy": "steps", "save_steps": save_steps, "save_total_limit": keep,
+            "save_only_model": False}  # Keep optimizer state so a resume continues smoothly
+
+
+def latest_checkpoint(output_dir, remove_incomplete=True):
+    """Newest complete checkpoint directory in output_dir, or None."""
+    complete = []
+    for path in Path(output_dir).glob(f"{PREFIX_CHECKPOINT_DIR}-*"):
+        if not path.name.rsplit("-", 1)[-1].isdigit():
+            continue
+        if (path / STATE_FILE).exists():
+            complete.append(path)
+        elif remove_incomplete:
+            print(f"Removing incomplete checkpoint {path.name}")
+            shutil.rmtree(path, ignore_errors=True)
+    if not complete:
+        return None
+    return str(max(complete, key=lambda path: int(path.name.rsplit("-", 1)[-1])))
+
+
+def directory_size(path):
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+
+
+class CheckpointCallback(TrainerCallback):
+    """Time-based checkpoints, and a final one when the run is stopped"""
+
+    def __init__(self, every_minutes=5):
+        self.every = every_minutes * 60 if every_minutes else None
+        self.last_save = time.monotonic()
+        self.stopped_by = None  # Name of the signal that stopped training
+        self._save_started = None
+        self._previous_handlers = {}
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.last_save = time.monotonic()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._previous_handlers[signum] = signal.signal(signum, self._stop)
+
+    def on_train_end(self, args, state, control, **kwargs):
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers = {}
+
+    def _stop(self, signum, frame):
+        self.stopped_by = signal.Signals(signum).name
+        print(f"\n{self.stopped_by}: saving a checkpoint after this step (Ctrl+C again to quit now)")
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self.stopped_by:
+            control.should_save = True
+            control.should_training_stop = True
+        elif self.every and time.monotonic() - self.last_save >= self.every:
+            control.should_save = True
+        if control.should_save:
+            self._save_started = time.monotonic()
+
+    def on_save(self, args, state, control, **kwargs):
+        self.last_save = time.monotonic()
+        path = Path(args.output_dir) / f"{PREFIX_CHECKPOINT_DIR}-{state.global_step}"
+        if path.exists():
+            seconds = self.last_save - self._save_started if self._save_started else 0.0
+            print(f"\nCheckpoint {path.name}: {directory_size(path) / 1e6:.1f} MB in {seconds:.1f}s")
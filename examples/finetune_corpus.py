@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+PiAI Fine-tuning Corpus Cache
+
+Maintenance-log corpora run to several GB - more than the Pi's RAM - so
+they can't go through Dataset.from_dict. TokenizedCorpus streams
+JSONL, Parquet and plain-text files (optionally .gz) a batch at a time,
+tokenizes them once and writes the token ids to Arrow shards on disk, one
+per source file. Training memory-maps the shards instead of loading them.
+
+The cache directory is keyed by a hash of the tokenizer and the max
+length, so a different tokenizer never reads the wrong ids. A manifest
+records each source file's size and modification time:
+
+- Re-running with the same files tokenizes nothing
+- New or changed files are tokenized; the others are reused
+- Each file is committed to the manifest when it's done, so an
+  interrupted run picks up at the file it was working on
+
+Documents longer than max_length are split into max_length pieces rather
+than cut off. Tokenize ahead of training (e.g. overnight):
+
+    python finetune_corpus.py microsoft/phi-2 ~/logs/ --max-length 128
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import pyarrow as pa
+from datasets import Dataset, concatenate_datasets
+
+CACHE_DIR = Path.home() / ".cache" / "piai" / "finetune-data"
+SUFFIXES = (".jsonl", ".parquet", ".txt")
+SCHEMA = pa.schema([("input_ids", pa.list_(pa.int32())), ("length", pa.int32())])
+
+
+def tokenizer_hash(tokenizer):
+    """Stable hash of everything that decides the token ids."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        spec = backend.to_str()  # Vocabulary, merges, normalizer, special tokens...
+    else:
+        spec = json.dumps(sorted(tokenizer.get_vocab().items()))
+    spec += json.dumps([type(tokenizer).__name__, tokenizer.all_special_tokens])
+    return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+
+def find_files(paths):
+    """Supported files among paths (directories are searched recursively), sorted."""
+    files = []
+    for path in map(Path, paths):
+        candidates = path.rglob("*") if path.is_dir() else [path]
+        for file in candidates:
+            name = file.name[:-3] if file.name.endswith(".gz") else file.name
+            if file.is_file() and name.endswith(SUFFIXES):
+                files.append(file.resolve())
+    return sorted(set(files))
+
+
+def read_texts(path, text_field="text", batch_size=1000):
+    """Yield lists of texts from a file without reading it all into memory."""
+    name = path.name[:-3] if path.name.endswith(".gz") else path.name
+    if name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=[text_field]):
+            yield [text for text in batch.column(0).to_pylist() if text]
+        return
+
+    opener = gzip.open if path.name.endswith(".gz") else open
+    batch = []
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if name.endswith(".txt"):
+                text = line.strip()  # One sample per line
+            else:
+                try:
+                    text = json.loads(line).get(text_field) if line.strip() else None
+                except (ValueError, AttributeError):
+                    text = None  # Skip broken lines rather than stop hours into a run
+            if text:
+                batch.append(text)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class TokenizedCorpus:
+    """Token ids of a set of files, cached as memory-mapped Arrow shards"""
+
+    def __init__(self, tokenizer, max_length=128, text_field="text", cache_dir=CACHE_DIR):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.text_field = text_field
+        self.directory = Path(cache_dir).expanduser() / f"{tokenizer_hash(tokenizer)}-{max_length}"
+        self.manifest_path = self.directory / "manifest.json"
+        self.manifest = self._load_manifest()
+
+    def load(self, paths):
+        """
+        Tokenize whatever is new among paths and return a Dataset with
+        input_ids and length columns, memory-mapped from the shards.
+        """
+        files = find_files(paths)
+        if not files:
+            raise FileNotFoundError(f"No {'/'.join(SUFFIXES)} files in {', '.join(map(str, paths))}")
+
+        shards = []
+        for file in files:
+            entry = self.manifest.get(str(file))
+            if not self._is_current(file, entry):
+                entry = self._tokenize_file(file)
+            if entry["examples"]:
+                shards.append(Dataset.from_file(str(self.directory / entry["shard"])))
+        if not shards:
+            raise ValueError(f"No text found in field {self.text_field!r}")
+        return concatenate_datasets(shards) if len(shards) > 1 else shards[0]
+
+    def _is_current(self, file, entry):
+        if entry is None or entry.get("text_field") != self.text_field:
+            return False
+        stat = file.stat()
+        return (entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and (self.directory / entry["shard"]).exists())
+
+    def _tokenize_file(self, file):
+        stat = file.stat()
+        shard = hashlib.sha1(str(file).encode()).hexdigest()[:16] + ".arrow"
+        partial = self.directory / (shard + ".tmp")
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        examples = tokens = 0
+        start = time.monotonic()
+        with pa.OSFile(str(partial), "wb") as sink, pa.ipc.new_stream(sink, SCHEMA) as writer:
+            for texts in read_texts(file, self.text_field):
+                pieces = []
+                for ids in self.tokenizer(texts)["input_ids"]:
+                    # Split long documents instead of throwing their tail away
+                    pieces.extend(ids[i:i + self.max_length] for i in range(0, len(ids), self.max_length))
+                writer.write_batch(pa.record_batch([
+                    pa.array(pieces, pa.list_(pa.int32())),
+                    pa.array([len(ids) for ids in pieces], pa.int32()),
+                ], schema=SCHEMA))
+                examples += len(pieces)
+                tokens += sum(len(ids) for ids in pieces)
+        os.replace(partial, self.directory / shard)
+        print(f"Tokenized {file.name}: {examples:,} examples, {tokens:,} tokens "
+              f"({time.monotonic() - start:.1f}s)")
+
+        entry = {"shard": shard, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "text_field": self.text_field, "examples": examples, "tokens": tokens}
+        self.manifest[str(file)] = entry
+        self._save_manifest()  # Committed file by file, so an interrupted run resumes here
+        return entry
+
+    def _load_manifest(self):
+        try:
+            return json.loads(self.manifest_path.read_text())["files"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save_manifest(self):
+        partial = self.manifest_path.with_suffix(".tmp")
+        partial.write_text(json.dumps({"files": self.manifest}, indent=1))
+        os.replace(partial, self.manifest_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize a corpus into the fine-tuning cache")
+    parser.add_argument("model", help="Model whose tokenizer to use (pre-downloaded or a local directory)")
+    parser.add_argument("paths", nargs="+", help="JSONL/Parquet/text files or directories of them")
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--text-field", default="text", help="Field holding the text (JSONL/Parquet)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"Shard cache (default: {CACHE_DIR})")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.model, local_files_only=True, trust_remote_code=True)
+    corpus = TokenizedCorpus(tokenizer, args.max_length, args.text_field, args.cache_dir)
+    dataset = corpus.load(args.paths)
+    print(f"{len(dataset):,} examples ready in {corpus.directory}")
+
+
+if __name__ == "__main__":
+    main()
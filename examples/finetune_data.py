@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+PiAI Fine-tuning Data Pipeline
+
+Padding every example to max_length means that with short samples most of
+the Pi's training FLOPs go into pad tokens. finetune-example.py can batch
+its data three ways (--data):
+
+- padded:  every example padded to max_length (the original behaviour)
+- dynamic: each batch is padded only to its longest example, and examples
+           of similar length are grouped into the same batches
+- packed:  whole examples are packed together into rows of up to
+           max_length tokens. Each one only sees itself: position ids
+           restart at every example and a block-diagonal causal mask stops
+           attention (and the loss) from crossing into its neighbours
+
+ThroughputCallback reports trained tokens/sec and padding efficiency - the
+share of batch positions that hold real tokens - with the training logs.
+"""
+
+import time
+import dataclasses
+
+import torch
+from transformers import TrainerCallback, TrainingArguments
+
+DATA_MODES = ("padded", "dynamic", "packed")
+
+
+def tokenize(dataset, tokenizer, max_length, text_column="text"):
+    """Tokenize without padding; adds a `length` column for grouping."""
+    def encode(examples):
+        encoded = tokenizer(examples[text_column], truncation=True, max_length=max_length)
+        return {"input_ids": encoded["input_ids"], "length": [len(ids) for ids in encoded["input_ids"]]}
+
+    return dataset.map(encode, batched=True, remove_columns=dataset.column_names)
+
+
+def pack(dataset, max_length):
+    """
+    Pack tokenized examples into rows of at most max_length tokens.
+
+    Best-fit decreasing: longest examples first, each into the row it fills
+    most tightly. Examples are never split. Only the example numbers are
+    kept per row, so a memory-mapped corpus stays on disk.
+    """
+    lengths = list(dataset["length"])
+    rows = []  # Example numbers per row
+    free = [[] for _ in range(max_length + 1)]  # Free tokens -> rows with exactly that much room
+    for index in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        length = lengths[index]
+        room = next((room for room in range(length, max_length + 1) if free[room]), None)
+        if room is None:
+            rows.append([])
+            row, room = len(rows) - 1, max_length
+        else:
+            row = free[room].pop()
+        rows[row].append(index)
+        free[room - length].append(row)
+    return PackedDataset(dataset, rows)
+
+
+class PackedDataset(torch.utils.data.Dataset):
+    """Rows of whole examples, concatenated when a batch asks for them"""
+
+    def __init__(self, dataset, rows):
+        self.dataset = dataset
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        examples = self.dataset[self.rows[index]]["input_ids"]
+        return {"input_ids": [token for ids in examples for token in ids],
+                "seq_lengths": [len(ids) for ids in examples]}
+
+
+class BatchCollator:
+    """
+    Builds causal-LM batches for one of DATA_MODES and counts real and
+    padded tokens for ThroughputCallback.
+
+    Labels are -100 on padding and, when packed, on the first token of
+    each example, so no example learns to predict its neighbour.
+    """
+
+    def __init__(self, pad_token_id, mode="dynamic", max_length=128, pad_to_multiple_of=8,
+                 mask_dtype=torch.float32):
+        if mode not in DATA_MODES:
+            raise ValueError(f"Unknown data mode {mode!r}, expected one of {DATA_MODES}")
+        self.pad_token_id = pad_token_id
+        self.mode = mode
+        self.max_length = max_length
+        self.pad_to_multiple_of = pad_to_multiple_of  # Friendlier shapes for the CPU kernels
+        self.mask_dtype = mask_dtype  # Must match the model's dtype (packed mode)
+        self.real_tokens = 0
+        self.batch_tokens = 0
+
+    def padded_length(self, features):
+        if self.mode == "padded":
+            return self.max_length
+        longest = max(len(f["input_ids"]) for f in features)
+        multiple = self.pad_to_multiple_of or 1
+        return min(self.max_length, -(-longest // multiple) * multiple)
+
+    def __call__(self, features):
+        length = self.padded_length(features)
+        input_ids = torch.full((len(features), length), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), length), -100, dtype=torch.long)
+        for row, feature in enumerate(features):
+            ids = torch.tensor(feature["input_ids"][:length], dtype=torch.long)
+            input_ids[row, :len(ids)] = ids
+            labels[row, :len(ids)] = ids
+            self.real_tokens += len(ids)
+        self.batch_tokens += input_ids.numel()
+
+        if self.mode != "packed":
+            attention_mask = (labels != -100).long()
+            return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+        return self._packed(features, input_ids, labels)
+
+    def _packed(self, features, input_ids, labels):
+        batch, length = input_ids.shape
+        position_ids = torch.zeros_like(input_ids)
+        segments = torch.full((batch, length), -1, dtype=torch.long)  # Example number per token, -1 = padding
+        for row, feature in enumerate(features):
+            start = 0
+            for number, seq_length in enumerate(feature["seq_lengths"]):
+                end = min(start + seq_length, length)
+                position_ids[row, start:end] = torch.arange(end - start)
+                segments[row, start:end] = number
+                labels[row, start] = -100  # Would be predicted from the previous example
+                start = end
+
+        # Additive 4D mask (0 = attend): causal, within the same example only.
+        # Padding attends to itself so no row is fully masked.
+        same = (segments[:, :, None] == segments[:, None, :]) & (segments[:, :, None] >= 0)
+        causal = torch.ones(length, length, dtype=torch.bool).tril()
+        allowed = (same & causal) | torch.eye(length, dtype=torch.bool)
+        attention_mask = torch.zeros(batch, 1, length, length, dtype=self.mask_dtype)
+        attention_mask.masked_fill_(~allowed[:, None], torch.finfo(self.mask_dtype).min)
+        return {"input_ids": input_ids, "attention_mask": attention_mask,
+                "position_ids": position_ids, "labels": labels}
+
+    def efficiency(self):
+        """Share of batch positions holding real tokens so far."""
+        return self.real_tokens / self.batch_tokens if self.batch_tokens else 0.0
+
+
+class ThroughputCallback(TrainerCallback):
+    """Adds tokens/sec and padding efficiency to the Trainer's logs"""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.started = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.started = time.monotonic()
+
+    def tokens_per_second(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return self.collator.real_tokens / elapsed if elapsed > 0 else 0.0
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs is not None:
+            logs["tokens_per_sec"] = round(self.tokens_per_second(), 1)
+            logs["padding_efficiency"] = round(self.collator.efficiency(), 3)
+
+    def on_train_end(self, args, state, control, **kwargs):
+        print(f"\nThroughput: {self.collator.real_tokens:,} tokens at {self.tokens_per_second():.1f} tokens/sec, "
+              f"padding efficiency {self.collator.efficiency():.0%} ({self.collator.mode})")
+
+
+def prepare(dataset, tokenizer, mode, max_length, mask_dtype=torch.float32):
+    """Tokenize (and pack) dataset for a data mode; returns (train_dataset, collator)."""
+    # A TokenizedCorpus (finetune_corpus.py) comes already tokenized
+    tokenized = dataset if "input_ids" in dataset.column_names else tokenize(dataset, tokenizer, max_length)
+    if mode == "packed":
+        tokenized = pack(tokenized, max_length)
+    collator = BatchCollator(tokenizer.pad_token_id, mode, max_length, mask_dtype=mask_dtype)
+    return tokenized, collator
+
+
+def sampler_args(mode):
+    """TrainingArguments that group examples of similar length (dynamic mode)."""
+    args = {"remove_unused_columns": False}  # The collator needs seq_lengths
+    if mode != "dynamic":
+        return args
+    # Renamed in newer transformers releases
+    fields = {field.name for field in dataclasses.fields(TrainingArguments)}
+    if "train_sampling_strategy" in fields:
+        args["train_sampling_strategy"] = "group_by_length"
+    else:
+        args["group_by_length"] = True
+    args["length_column_name"] = "length"
+    return args
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+PiAI LoRA Target Discovery
+
+LoRA only trains the layers named in `target_modules`, and the names
+differ between architectures: q_proj/v_proj in Llama, Wqkv in the original
+phi-2 code, c_attn in GPT-2, query_key_value in GPT-NeoX. Names that match
+nothing fail, names that match too much waste the Pi's compute, so the
+targets are chosen from the model itself:
+
+- linear_layers() lists every linear layer, grouped by name, with its
+  parameter count and what a LoRA adapter on it would add
+- choose_targets() takes the names from TARGET_MODULES for the model's
+  architecture (or PEFT's own table) if the model really has them.
+  Otherwise - or when given a budget of trainable parameters - it picks
+  attention projections first, then the rest, while they fit the budget
+- estimate() gives the memory and time per training step to expect
+
+It works on an empty (meta device) model, so nothing is loaded to look:
+
+    python finetune_lora.py microsoft/phi-2
+    python finetune_lora.py microsoft/phi-2 --budget 4M
+"""
+
+import re
+import time
+import argparse
+
+import torch
+
+# Attention projections, as PEFT's defaults. Checked against the model before use
+TARGET_MODULES = {
+    "llama": ["q_proj", "v_proj"],
+    "mistral": ["q_proj", "v_proj"],
+    "qwen2": ["q_proj", "v_proj"],
+    "qwen3": ["q_proj", "v_proj"],
+    "gemma": ["q_proj", "v_proj"],
+    "gemma2": ["q_proj", "v_proj"],
+    "phi": ["q_proj", "v_proj"],  # phi-2 in transformers
+    "phi-msft": ["Wqkv"],  # phi-2's original remote code
+    "phi3": ["qkv_proj"],
+    "gpt2": ["c_attn"],
+    "gpt_neox": ["query_key_value"],
+    "falcon": ["query_key_value"],
+    "bloom": ["query_key_value"],
+    "stablelm": ["q_proj", "v_proj"],
+    "opt": ["q_proj", "v_proj"],
+}
+DEFAULT_BUDGET = 0.005  # Share of the model's parameters when there's no table entry
+
+# Rough constants for estimate()
+ADAPTER_BYTES = 16  # Per trainable parameter: fp32 weight, gradient and two Adam moments
+ACTIVATIONS_PER_TOKEN = 17  # Values kept per token and hidden unit in each layer for the backward pass
+
+
+def parse_count(text):
+    """'4M' -> 4000000, '250k' -> 250000, '1000' -> 1000."""
+    text = str(text).strip().lower()
+    scale = {"k": 1e3, "m": 1e6, "b": 1e9}.get(text[-1:], 1)
+    return int(float(text.rstrip("kmb")) * scale)
+
+
+def empty_model(model_name):
+    """The model's layers on the meta device - shapes only, no weights loaded."""
+    from transformers import AutoConfig, AutoModelForCausalLM
+    config = AutoConfig.from_pretrained(model_name, local_files_only=True, trust_remote_code=True)
+    with torch.device("meta"):
+        return AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+
+
+def _shape(module):
+    """(in_features, out_features) of a linear layer, or None."""
+    if isinstance(module, torch.nn.Linear):  # bitsandbytes layers included
+        return module.in_features, module.out_features
+    if type(module).__name__ == "Conv1D" and hasattr(module, "nf"):  # GPT-2 style, weight is (in, out)
+        return module.weight.shape[0], module.nf
+    return None
+
+
+def linear_layers(model, rank=8):
+    """
+    Linear layers grouped by the last part of their name:
+    {name: {"count", "shape", "params", "lora_params", "attention"}}.
+    The output head is left out - it isn't a useful LoRA target.
+    """
+    head = model.get_output_embeddings()
+    groups = {}
+    for path, module in model.named_modules():
+        shape = _shape(module)
+        if shape is None or module is head:
+            continue
+        name = path.rsplit(".", 1)[-1]
+        group = groups.setdefault(name, {"count": 0, "shape": shape, "params": 0, "lora_params": 0,
+                                         "attention": False})
+        group["count"] += 1
+        group["params"] += shape[0] * shape[1]
+        group["lora_params"] += rank * (shape[0] + shape[1])
+        group["attention"] |= bool(re.search(r"attn|attention|mixer", path))
+    return groups
+
+
+def _priority(name, group):
+    """Lower first: query/value (or fused qkv), key, other attention, the rest."""
+    if re.fullmatch(r"(q|v|query|value)(_proj)?|.*qkv.*|query_key_value|c_attn", name, re.IGNORECASE):
+        return 0
+    if re.fullmatch(r"(k|key)(_proj)?", name):
+        return 1
+    return 2 if group["attention"] else 3
+
+
+def choose_targets(model, rank=8, budget=None):
+    """
+    Returns (target names, how they were chosen).
+
+    Without a budget the architecture's table entry is used if the model
+    has all of its layers; otherwise, or with a budget (trainable
+    parameters), layers are added by priority while they fit.
+    """
+    groups = linear_layers(model, rank)
+    if not groups:
+        raise ValueError("The model has no linear layers to adapt")
+
+    if budget is None:
+        model_type = getattr(model.config, "model_type", None)
+        names = TARGET_MODULES.get(model_type)
+        if names is None:
+            from peft.utils.constants import TRANSFORMERS_MODELS_TO_LORA_TARGET_MODULES_MAPPING
+            names = TRANSFORMERS_MODELS_TO_LORA_TARGET_MODULES_MAPPING.get(model_type)
+        if names and all(name in groups for name in names):
+            return list(names), f"table entry for {model_type}"
+        if names:
+            print(f"The {model_type} table entry {names} doesn't match this model's layers - choosing by budget")
+        budget = int(DEFAULT_BUDGET * sum(p.numel() for p in model.parameters()))
+
+    chosen, total = [], 0
+    for name, group in sorted(groups.items(), key=lambda item: (_priority(*item), item[1]["lora_params"])):
+        if total + group["lora_params"] <= budget:
+            chosen.append(name)
+            total += group["lora_params"]
+    if not chosen:  # Even the cheapest doesn't fit - take it anyway rather than train nothing
+        chosen = [min(groups, key=lambda name: (_priority(name, groups[name]), groups[name]["lora_params"]))]
+    return chosen, f"budget of {budget:,} trainable parameters"
+
+
+def print_layers(groups, targets):
+    print(f"  {'layer':<18} {'count':>5}  {'shape':>12} {'params':>10} {'LoRA adds':>10}")
+    for name, group in sorted(groups.items(), key=lambda item: -item[1]["params"]):
+        mark = "*" if name in targets else " "
+        shape = f"{group['shape'][0]}x{group['shape'][1]}"
+        print(f"{mark} {name:<18} {group['count']:>5}  {shape:>12} {group['params'] / 1e6:>9.1f}M "
+              f"{group['lora_params'] / 1e6:>9.2f}M")
+
+
+def measure_flops(dtype=torch.float32, size=512, seconds=0.3):
+    """Matrix multiplication FLOP/s on this CPU with the current thread settings."""
+    a = torch.randn(size, size, dtype=dtype)
+    b = torch.randn(size, size, dtype=dtype)
+    a @ b  # Warm up
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        a @ b
+        runs += 1
+    return 2 * size ** 3 * runs / (time.perf_counter() - start)
+
+
+def estimate(model, targets, rank=8, bytes_per_parameter=4, batch_size=1, max_length=128,
+             tokens_per_step=None, gradient_checkpointing=False, flops=None):
+    """
+    Rough memory (bytes) and seconds per optimizer step for LoRA training.
+
+    Memory: base weights + adapter with gradients and Adam state +
+    activations of a batch of max_length examples. Time: a forward and a
+    backward pass through the frozen weights (~4 FLOPs per parameter and
+    token, ~6 with gradient checkpointing) at the measured FLOP/s.
+    """
+    groups = linear_layers(model, rank)
+    parameters = sum(p.numel() for p in model.parameters())
+    lora_params = sum(groups[name]["lora_params"] for name in targets if name in groups)
+
+    config = model.config
+    hidden = getattr(config, "hidden_size", None) or getattr(config, "n_embd", 0)
+    layers = getattr(config, "num_hidden_layers", None) or getattr(config, "n_layer", 0)
+    activation_bytes = 4 if bytes_per_parameter == 4 else 2  # Anything below fp32 computes in bf16
+    per_layer = batch_size * max_length * hidden * activation_bytes
+    if gradient_checkpointing:
+        activations = per_layer * (layers + ACTIVATIONS_PER_TOKEN)  # Layer inputs + one layer recomputed
+    else:
+        activations = per_layer * layers * ACTIVATIONS_PER_TOKEN
+
+    memory = parameters * bytes_per_parameter + lora_params * ADAPTER_BYTES + activations
+    tokens = tokens_per_step or batch_size * max_length
+    step_flops = (6 if gradient_checkpointing else 4) * parameters * tokens
+    seconds = step_flops / (flops or measure_flops())
+    return {"parameters": parameters, "lora_params": lora_params, "memory": memory,
+            "activations": activations, "seconds_per_step": seconds}
+
+
+def tokens_per_example(dataset, mode, max_length):
+    """Average tokens the model sees per training example (or packed row)."""
+    if mode == "padded":
+        return max_length
+    if hasattr(dataset, "rows"):  # PackedDataset
+        return sum(dataset.dataset["length"]) / max(len(dataset.rows), 1)
+    lengths = dataset["length"]
+    return sum(lengths) / max(len(lengths), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List a model's linear layers and choose LoRA targets")
+    parser.add_argument("model", help="Model name (pre-downloaded) or local directory")
+    parser.add_argument("--rank", type=int, default=8)
+    parser.add_argument("--budget", help="Trainable parameters to spend, e.g. 4M (default: architecture table)")
+    args = parser.parse_args()
+
+    model = empty_model(args.model)
+    budget = parse_count(args.budget) if args.budget else None
+    targets, reason = choose_targets(model, args.rank, budget)
+    print(f"{type(model).__name__} ({model.config.model_type}), "
+          f"{sum(p.numel() for p in model.parameters()):,} parameters")
+    print_layers(linear_layers(model, args.rank), targets)
+    cost = estimate(model, targets, args.rank)
+    print(f"\nTargets: {', '.join(targets)} ({reason}) - {cost['lora_params']:,} trainable parameters")
+    print(f"fp32, batch 1 x 128 tokens: ~{cost['memory'] / 1e9:.1f} GB, ~{cost['seconds_per_step']:.1f}s per step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+PiAI Fine-tuning Hardware Profiles
+
+The training settings that matter most on the Pi are not the ones in the
+LoRA config:
+
+- threads:   one per Cortex-A76 core. More only adds contention
+- precision: fp32 weights of a 2.7B model (phi-2) need ~11 GB - more than
+             any Pi 5 has. bf16 weights and autocast halve that, and with
+             bitsandbytes installed the frozen base weights can be loaded in
+             int8 or 4-bit (QLoRA-style) while the adapter trains in full
+             precision
+- gradient checkpointing: recomputes activations in the backward pass
+             instead of keeping them, trading ~30% more compute for a
+             fraction of the activation memory
+
+A profile picks these for a machine. "pi5" uses the four cores, gradient
+checkpointing, and the most precise weights that fit in the free memory.
+"default" keeps the script's original settings (fp32, no checkpointing).
+
+Which is fastest depends on the model and the data, so autotune() runs a
+few training steps with each candidate - threads, precision, checkpointing
+on or off - and keeps the fastest one that didn't run the Pi out of memory.
+"""
+
+import gc
+import os
+import time
+import threading
+from pathlib import Path
+
+import torch
+
+PROFILES = {
+    "default": {"threads": None, "precision": "fp32", "gradient_checkpointing": False, "workers": 0},
+    # Cortex-A76 x4. Batches are collated in the training loop: a worker
+    # process would only take a core away from the matrix multiplications
+    "pi5": {"threads": 4, "precision": "auto", "gradient_checkpointing": True, "workers": 0},
+}
+PRECISIONS = ("fp32", "bf16", "int8", "4bit")  # Most precise first
+BYTES_PER_PARAMETER = {"fp32": 4, "bf16": 2, "int8": 1, "4bit": 0.5}
+TRAINING_OVERHEAD = 1.3  # Activations, adapter and optimizer state, allocator slack - a rough allowance
+
+
+def is_pi5():
+    try:
+        return "Raspberry Pi 5" in Path("/proc/device-tree/model").read_text()
+    except OSError:
+        return False
+
+
+def detect_profile():
+    return "pi5" if is_pi5() else "default"
+
+
+def _meminfo(field):
+    try:
+        for line in Path("/proc/meminfo").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def available_memory():
+    """Bytes that can be allocated without swapping (Linux), or None."""
+    return _meminfo("MemAvailable")
+
+
+def total_memory():
+    return _meminfo("MemTotal")
+
+
+def bf16_supported():
+    """True if this PyTorch build can run bf16 autocast on the CPU."""
+    try:
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return torch.ones(2, 2) @ torch.ones(2, 2) is not None
+    except RuntimeError:
+        return False
+
+
+def kbit_supported():
+    """True if bitsandbytes is installed, for int8/4-bit base weights."""
+    try:
+        import bitsandbytes  # noqa: F401
+        return True
+    except Exception:  # Not installed, or no backend for this CPU
+        return False
+
+
+def supported_precisions():
+    supported = ["fp32"]
+    if bf16_supported():
+        supported.append("bf16")
+        if kbit_supported():
+            supported += ["int8", "4bit"]
+    return supported
+
+
+def memory_needed(parameters, precision):
+    """Rough bytes to train LoRA on a model of this size and precision."""
+    return parameters * BYTES_PER_PARAMETER[precision] * TRAINING_OVERHEAD
+
+
+def choose_precision(parameters, memory=None):
+    """The most precise supported precision whose estimate fits in memory."""
+    memory = memory or available_memory()
+    supported = supported_precisions()
+    for precision in supported:
+        if memory is None or memory_needed(parameters, precision) <= memory:
+            return precision
+    return supported[-1]  # Nothing fits on paper - try the smallest anyway
+
+
+def resolve(profile="auto", precision=None, threads=None, gradient_checkpointing=None, parameters=None):
+    """Settings for a profile, with any overrides; resolves precision 'auto'."""
+    if profile == "auto":
+        profile = detect_profile()
+    settings = dict(PROFILES[profile], profile=profile)
+    for key, value in (("precision", precision), ("threads", threads),
+                       ("gradient_checkpointing", gradient_checkpointing)):
+        if value is not None:
+            settings[key] = value
+    if settings["precision"] not in ("auto", *supported_precisions()):
+        print(f"{settings['precision']} weights need bf16 support and bitsandbytes - choosing another precision")
+        settings["precision"] = "auto"
+    if settings["precision"] == "auto":
+        settings["precision"] = choose_precision(parameters) if parameters else "fp32"
+    return settings
+
+
+def describe(settings):
+    threads = settings["threads"] or torch.get_num_threads()
+    checkpointing = "on" if settings["gradient_checkpointing"] else "off"
+    return f"{settings['precision']}, {threads} threads, gradient checkpointing {checkpointing}"
+
+
+def apply_threads(threads):
+    if not threads:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)  # Only allowed before any parallel work
+    except RuntimeError:
+        pass
+
+
+def _dtype_key():
+    """from_pretrained() renamed torch_dtype to dtype in transformers 4.56."""
+    import transformers
+    from packaging.version import Version
+    return "dtype" if Version(transformers.__version__) >= Version("4.56") else "torch_dtype"
+
+
+def load_kwargs(precision):
+    """from_pretrained() arguments for the base weights in this precision."""
+    if precision == "fp32":
+        return {_dtype_key(): torch.float32}
+    if precision == "bf16":
+        return {_dtype_key(): torch.bfloat16}
+
+    from transformers import BitsAndBytesConfig
+    if precision == "int8":
+        quantization = BitsAndBytesConfig(load_in_8bit=True)
+    else:
+        quantization = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_quant_type="nf4",
+                                          bnb_4bit_compute_dtype=torch.bfloat16)
+    return {_dtype_key(): torch.bfloat16, "quantization_config": quantization}
+
+
+def prepare_model(model, settings):
+    """Ready a freshly loaded base model for LoRA training with these settings."""
+    if settings["precision"] in ("int8", "4bit"):
+        from peft import prepare_model_for_kbit_training
+        model = prepare_model_for_kbit_training(model, use_gradient_checkpointing=False)
+    model.config.use_cache = False  # The cache is for generation; it conflicts with checkpointing
+    return model
+
+
+def training_args(settings):
+    """TrainingArguments for these settings."""
+    args = {
+        "bf16": settings["precision"] != "fp32",  # CPU autocast
+        "gradient_checkpointing": settings["gradient_checkpointing"],
+        "dataloader_num_workers": settings["workers"],
+    }
+    if args["bf16"]:
+        args["use_cpu"] = True  # Otherwise a CUDA build of PyTorch refuses bf16 without a GPU
+    if settings["gradient_checkpointing"]:
+        # Non-reentrant checkpointing works with frozen inputs (LoRA) as is
+        args["gradient_checkpointing_kwargs"] = {"use_reentrant": False}
+    return args
+
+
+def model_dtype(model):
+    """dtype of the hidden states - what a 4D attention mask has to match."""
+    return model.get_input_embeddings().weight.dtype
+
+
+def longest_batch(dataset, collator, batch_size):
+    """A batch of the longest examples, the worst case for memory."""
+    if hasattr(dataset, "column_names") and "length" in dataset.column_names:
+        lengths = dataset["length"]
+        indices = sorted(range(len(lengths)), key=lambda i: -lengths[i])[:batch_size]
+    else:
+        indices = range(min(batch_size, len(dataset)))  # Packed rows are all about full
+    batch = collator([dataset[i] for i in indices])
+    collator.real_tokens = collator.batch_tokens = 0  # Not part of the training throughput
+    return batch
+
+
+class _MemoryWatch:
+    """Lowest available memory seen while the block runs"""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.lowest = available_memory()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            available = available_memory()
+            if available is not None and (self.lowest is None or available < self.lowest):
+                self.lowest = available
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def time_steps(model, batch, settings, steps=2):
+    """Seconds per training step (after one warm-up step)."""
+    apply_threads(settings["threads"])
+    if settings["gradient_checkpointing"]:
+        model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+    else:
+        model.gradient_checkpointing_disable()
+    model.train()
+
+    dtype = model_dtype(model)
+    batch = {key: value.to(dtype) if value.is_floating_point() else value for key, value in batch.items()}
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=0.0)
+    bf16 = settings["precision"] != "fp32"
+
+    start = None
+    for step in range(steps + 1):
+        if step == 1:
+            start = time.perf_counter()
+        with torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+            loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    return (time.perf_counter() - start) / steps
+
+
+def thread_options(settings):
+    """All of this machine's cores, and one fewer - at most the profile's thread count."""
+    cores = os.cpu_count() or 1
+    if settings["threads"]:
+        cores = min(cores, settings["threads"])
+    return sorted({cores, max(1, cores - 1)}, reverse=True)
+
+
+def candidates(settings, parameters=None, threads=None):
+    """Settings worth timing: threads x precisions that fit x checkpointing on/off."""
+    threads = threads or thread_options(settings)
+    memory = available_memory()
+    precisions = [p for p in supported_precisions()
+                  if not (parameters and memory) or memory_needed(parameters, p) <= memory]
+    options = []
+    for precision in precisions or [settings["precision"]]:
+        for count in threads:
+            for checkpointing in (False, True):
+                options.append(dict(settings, precision=precision, threads=count,
+                                    gradient_checkpointing=checkpointing))
+    return options
+
+
+def autotune(load_model, batch, options, steps=2, reserve=0.05):
+    """
+    Time `steps` training steps for each of options and return the fastest
+    settings that kept `reserve` of the memory free.
+
+    load_model(settings) returns a model ready to train; it is loaded once
+    per precision.
+    """
+    total = total_memory()
+    best, best_seconds = None, None
+    model, loaded = None, None
+    for settings in sorted(options, key=lambda s: PRECISIONS.index(s["precision"])):
+        if settings["precision"] != loaded:
+            model = None
+            gc.collect()
+            try:
+                model, loaded = load_model(settings), settings["precision"]
+            except Exception as e:  # e.g. bitsandbytes without a backend for this CPU
+                print(f"  {settings['precision']}: can't load ({e})")
+                loaded = settings["precision"]
+                continue
+        if model is None:
+            continue
+
+        try:
+            with _MemoryWatch() as watch:
+                seconds = time_steps(model, batch, settings, steps)
+        except RuntimeError as e:  # Out of memory, unsupported kernel...
+            print(f"  {describe(settings)}: failed ({e})")
+            continue
+        fits = total is None or watch.lowest is None or watch.lowest >= reserve * total
+        print(f"  {describe(settings)}: {seconds:.2f}s/step" + ("" if fits else " - too little memory left"))
+        if fits and (best_seconds is None or seconds < best_seconds):
+            best, best_seconds = settings, seconds
+
+    model = None
+    gc.collect()
+    return best
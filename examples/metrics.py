@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Lightweight metrics for the PiAI examples
+
+Fixed-bucket histograms use constant memory however long the program runs,
+which matters for an always-on assistant. Quantiles are estimated from
+the buckets.
+
+A Metrics registry collects per-stage latencies, counters and gauges (CPU
+temperature and clock speed, to spot thermal throttling) and can expose
+them as:
+- a Prometheus-style text endpoint on localhost (MetricsServer)
+- a JSONL file with one line per interaction, flushed periodically
+  (JsonlWriter)
+
+Usage from an example directory:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from metrics import Metrics, MetricsServer
+
+    metrics = Metrics()
+    with metrics.timer("stt"):
+        text = transcribe(audio)
+    MetricsServer(metrics, port=9101).start()   # curl localhost:9101/metrics
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def exponential_buckets(start, factor, count):
+    """Bucket upper bounds start, start*factor, ... (count of them)."""
+    return [start * factor ** i for i in range(count)]
+
+
+def linear_buckets(start, width, count):
+    """Bucket upper bounds start, start+width, ... (count of them)."""
+    return [start + width * i for i in range(count)]
+
+
+# Seconds, 1 ms to ~33 s - fits everything from a wake-word frame to an LLM answer
+LATENCY_BUCKETS = exponential_buckets(0.001, 2, 16)
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus count, sum, min and max"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)  # Upper bounds; one extra bucket for the rest
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """
+        Estimate the q-th quantile (0..1) by interpolating inside a bucket.
+
+        Returns 0.0 if nothing has been observed.
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    low = self.buckets[i - 1] if i > 0 else min(self.min, self.buckets[0])
+                    high = self.buckets[i] if i < len(self.buckets) else self.max
+                    low, high = max(low, self.min), min(high, self.max)
+                    return low + (high - low) * (rank - seen) / n
+                seen += n
+            return self.max
+
+    def cumulative(self):
+        """[(upper_bound, count <= bound), ...] ending with (inf, total)."""
+        with self._lock:
+            result, total = [], 0
+            for bound, n in zip(self.buckets + [float("inf")], self.counts):
+                total += n
+                result.append((bound, total))
+            return result
+
+    def snapshot(self):
+        """Plain-dict summary, e.g. for JSON output."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+# -- Registry --------------------------------------------------------------------
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """
+    Histograms, counters and gauges for one program.
+
+    Stage latencies go into the "stage_seconds" histogram with a stage
+    label. Everything is kept in memory with fixed size: histograms have
+    fixed buckets and only the last `keep` interactions are remembered.
+    """
+
+    def __init__(self, prefix="piai", keep=100):
+        self.prefix = prefix
+        self.started = time.monotonic()
+        self.recent = deque(maxlen=keep)  # Latest interaction records
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}  # (name, labels) -> number
+        self._gauges = {}  # (name, labels) -> callable returning a number
+        self._listeners = []  # Called with every interaction record
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        """Get or create a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def add_histogram(self, name, histogram, **labels):
+        """Export a histogram that is kept somewhere else (e.g. the wake word engine)."""
+        with self._lock:
+            self._histograms[self._key(name, labels)] = histogram
+
+    def observe(self, stage, seconds):
+        """Record how long a pipeline stage took."""
+        self.histogram("stage_seconds", stage=stage).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time a block: with metrics.timer("stt"): ..."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, name, **labels):
+        return self._counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name, read, **labels):
+        """Register a value that is read when metrics are exported."""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = read
+
+    def _read_gauges(self):
+        values = {}
+        for key, read in list(self._gauges.items()):
+            try:
+                value = read()
+            except Exception:
+                continue  # E.g. sensor not present on this machine
+            if value is not None:
+                values[key] = float(value)
+        return values
+
+    def record(self, timings, **fields):
+        """
+        Record one interaction: every stage timing plus any extra fields.
+
+        The record (with current gauge values) is kept in `recent` and
+        passed to listeners such as JsonlWriter.
+        """
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+        self.increment("interactions_total")
+
+        entry = {"time": datetime.now().isoformat(timespec="seconds")}
+        entry.update(fields)
+        entry["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        entry["gauges"] = {name + _label_text(dict(labels)): value
+                           for (name, labels), value in self._read_gauges().items()}
+        self.recent.append(entry)
+        for listener in self._listeners:
+            listener(entry)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    # -- Export ----------------------------------------------------------------
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(self._counters.items()):
+            full = f"{self.prefix}_{name}"
+            declare(full, "counter")
+            lines.append(f"{full}{_label_text(dict(labels))} {value}")
+
+        for (name, labels), value in sorted(self._read_gauges().items()):
+            full = f"{self.prefix}_{name}"
+            declare(full, "gauge")
+            lines.append(f"{full}{_label_text(dict(labels))} {value:g}")
+
+        for (name, labels), hist in sorted(self._histograms.items(), key=lambda item: item[0]):
+            full = f"{self.prefix}_{name}"
+            declare(full, "histogram")
+            labels = dict(labels)
+            for bound, count in hist.cumulative():
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{full}_bucket{_label_text({**labels, 'le': le})} {count}")
+            lines.append(f"{full}_sum{_label_text(labels)} {hist.sum:g}")
+            lines.append(f"{full}_count{_label_text(labels)} {hist.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Summaries of everything as a plain dict (for JSON)."""
+        def flat(key):
+            name, labels = key
+            return name + _label_text(dict(labels))
+
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "counters": {flat(k): v for k, v in sorted(self._counters.items())},
+            "gauges": {flat(k): v for k, v in sorted(self._read_gauges().items())},
+            "histograms": {flat(k): h.snapshot() for k, h in sorted(self._histograms.items())},
+            "recent": list(self.recent),
+        }
+
+    def summary(self, stages):
+        """One line per stage with p50/p95, for printing on exit."""
+        lines = []
+        for stage in stages:
+            hist = self._histograms.get(self._key("stage_seconds", {"stage": stage}))
+            if hist and hist.count:
+                lines.append(f"  {stage:<18} n={hist.count:<4} p50 {hist.quantile(0.5):.2f}s  "
+                             f"p95 {hist.quantile(0.95):.2f}s")
+        return "\n".join(lines)
+
+
+# -- System gauges -----------------------------------------------------------------
+
+def _read_number(path, scale=1.0):
+    return int(Path(path).read_text().strip()) / scale
+
+
+def add_system_gauges(metrics):
+    """CPU temperature, clock speed and load - shows when the Pi is throttling."""
+    metrics.gauge("cpu_temperature_celsius",
+                  lambda: _read_number("/sys/class/thermal/thermal_zone0/temp", 1000))
+    metrics.gauge("cpu_frequency_mhz",
+                  lambda: _read_number("/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq", 1000))
+    metrics.gauge("load_average_1m", lambda: os.getloadavg()[0])
+
+
+# -- Exporters ---------------------------------------------------------------------
+
+class MetricsServer:
+    """
+    Serves metrics over HTTP on localhost.
+
+    GET /metrics       Prometheus text format
+    GET /metrics.json  snapshot() as JSON, including recent interactions
+    """
+
+    def __init__(self, metrics, host="127.0.0.1", port=9101):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot(), indent=2).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JsonlWriter:
+    """
+    Appends every interaction record to a JSONL file.
+
+    Records are buffered (at most `max_pending`) and written every
+    `interval` seconds by a background thread, so the SD card isn't
+    written after every sentence.
+    """
+
+    def __init__(self, metrics, path, interval=60, max_pending=1000):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self._pending = deque(maxlen=max_pending)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        metrics.add_listener(self._pending.append)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        lines = []
+        while self._pending:
+            lines.append(json.dumps(self._pending.popleft()))
+        if lines:
+            with open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def stop(self):
+        self._stop_event.set()
+        self.flush()
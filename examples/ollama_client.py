@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Shared Ollama client for the PiAI examples
+
+One persistent HTTP session (keep-alive connection pool) for every call to
+the local Ollama server, instead of a fresh TCP connection per request.
+
+Features:
+- Configurable connect/read timeouts
+- Retry with exponential backoff on connection errors and 502/503/504
+- Streaming helpers that yield Ollama's NDJSON chunks as they arrive
+- Cached model list and one shared model-selection rule
+- Model warm-up, `keep_alive` on every request and a background keeper
+  thread so the model stays loaded between uses
+
+Usage from an example directory:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from ollama_client import OllamaClient
+"""
+
+import os
+import re
+import json
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+if not DEFAULT_URL.startswith("http"):
+    DEFAULT_URL = f"http://{DEFAULT_URL}"
+
+DEFAULT_MODEL = "phi3:mini"
+DEFAULT_KEEP_ALIVE = "30m"  # How long Ollama keeps a model loaded after a request
+
+
+# Units Go's time.ParseDuration - and so Ollama - accepts in a keep_alive string
+DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+_DURATION_PART = r"(\d+(?:\.\d*)?|\.\d+)(ns|us|µs|ms|s|m|h)"
+
+
+def keep_alive_seconds(value):
+    """
+    Convert an Ollama keep_alive value ("30m", "1h30m", "-1m", 300, -1) to seconds.
+
+    Returns None for "forever" (negative values). Strings need a unit, as
+    Ollama rejects "300" or "-1" with a 400 - use the number instead.
+    """
+    if isinstance(value, (int, float)):
+        return None if value < 0 else float(value)
+    text = str(value).strip()
+    if text in ("0", "-0", "+0"):
+        return 0.0  # The one duration Go accepts without a unit
+    if not re.fullmatch(rf"[-+]?({_DURATION_PART})+", text):
+        raise ValueError(f"Invalid keep_alive value: {value!r} (use a number of seconds, "
+                         f"or a duration with a unit such as \"30m\" or \"-1m\")")
+    seconds = sum(float(amount) * DURATION_UNITS[unit] for amount, unit in re.findall(_DURATION_PART, text))
+    if text.startswith("-") and seconds > 0:
+        return None
+    return seconds
+
+
+def normalize_keep_alive(value):
+    """keep_alive in a form Ollama accepts: unitless strings ("300", "-1") become numbers."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip()
+    if not re.fullmatch(r"[-+]?(\d+(\.\d*)?|\.\d+)", text):
+        keep_alive_seconds(text)  # Raises if Ollama couldn't parse it either
+        return text
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+class OllamaError(requests.exceptions.RequestException):
+    """Error reported by Ollama inside an otherwise successful response."""
+
+
+class OllamaClient:
+    """Pooled, retrying client for the local Ollama REST API"""
+
+    def __init__(self, base_url=DEFAULT_URL, connect_timeout=2, read_timeout=60,
+                 retries=2, backoff=0.5, pool_size=4, models_ttl=60, keep_alive=None):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = normalize_keep_alive(keep_alive)  # Sent with every request unless None
+        self.models_ttl = models_ttl
+        self._models = None
+        self._models_at = 0.0
+
+        # Only retry failures that happen before Ollama starts generating
+        # (read=0) so a slow answer is never silently generated twice
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _timeout(self, read_timeout=None):
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def _payload(self, payload, stream):
+        payload = dict(payload, stream=stream)
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        return payload
+
+    def get(self, path, timeout=None):
+        """GET an API path and return the decoded JSON."""
+        response = self.session.get(f"{self.base_url}{path}", timeout=self._timeout(timeout))
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, payload, timeout=None):
+        """POST a non-streaming request and return the decoded JSON."""
+        payload = self._payload(payload, stream=False)
+        response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                     timeout=self._timeout(timeout))
+        response.raise_for_status()
+        result = response.json()
+        if result.get("error"):
+            raise OllamaError(result["error"])
+        return result
+
+    def stream(self, path, payload, timeout=None):
+        """POST a streaming request and yield each decoded NDJSON chunk."""
+        payload = self._payload(payload, stream=True)
+        with self.session.post(f"{self.base_url}{path}", json=payload, stream=True,
+                               timeout=self._timeout(timeout)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError as e:  # Truncated line, e.g. the connection dropped mid-chunk
+                    raise OllamaError(f"Malformed response from Ollama: {line[:80]!r}") from e
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                yield chunk
+                if chunk.get("done"):
+                    return
+
+    # -- Convenience wrappers -------------------------------------------------
+
+    def generate(self, payload, timeout=None):
+        """Blocking /api/generate call."""
+        return self.post("/api/generate", payload, timeout)
+
+    def stream_generate(self, payload, timeout=None):
+        """Streaming /api/generate call, yields chunks."""
+        return self.stream("/api/generate", payload, timeout)
+
+    def chat(self, payload, timeout=None):
+        """Blocking /api/chat call."""
+        return self.post("/api/chat", payload, timeout)
+
+    def stream_chat(self, payload, timeout=None):
+        """Streaming /api/chat call, yields chunks."""
+        return self.stream("/api/chat", payload, timeout)
+
+    def embed(self, model, text, timeout=None):
+        """Embedding vector of text from an embedding model (e.g. nomic-embed-text)."""
+        return self.post("/api/embeddings", {"model": model, "prompt": text}, timeout)["embedding"]
+
+    # -- Server and model discovery -------------------------------------------
+
+    def is_available(self):
+        """Return True if the Ollama server answers."""
+        try:
+            self.list_models(refresh=True)
+            return True
+        except requests.exceptions.RequestException:
+            return False
+
+    def list_models(self, refresh=False):
+        """Return installed model names (cached for models_ttl seconds)."""
+        if refresh or self._models is None or time.monotonic() - self._models_at > self.models_ttl:
+            data = self.get("/api/tags", timeout=self.connect_timeout)
+            self._models = [m["name"] for m in data.get("models", [])]
+            self._models_at = time.monotonic()
+        return list(self._models)
+
+    def pick_model(self, preferred=DEFAULT_MODEL):
+        """
+        Choose a model to use.
+
+        Exact match on `preferred` first, then any model of the same family
+        (e.g. "phi3:latest" for "phi3:mini"), then the first installed model.
+        Returns None if nothing is installed.
+        """
+        models = self.list_models()
+        if preferred in models:
+            return preferred
+        family = preferred.split(":")[0]
+        for name in models:
+            if name.split(":")[0] == family:
+                return name
+        return models[0] if models else None
+
+    # -- Keeping the model loaded ---------------------------------------------
+
+    def warm_up(self, model, timeout=180):
+        """
+        Load a model into memory with an empty prompt.
+
+        Ollama loads the weights without generating anything, so the first
+        real request doesn't pay the load from SD card. Returns the seconds
+        taken (near zero if the model was already loaded).
+        """
+        start = time.monotonic()
+        self.post("/api/generate", {"model": model, "prompt": ""}, timeout=timeout)
+        return time.monotonic() - start
+
+    def start_keeper(self, model, interval=None):
+        """
+        Start a background thread that keeps `model` loaded.
+
+        By default it pings at half the keep_alive period (at most every
+        5 minutes), which also reloads the model if something evicted it.
+        Returns None without starting one if keep_alive is 0 - the model
+        is meant to unload straight after each request.
+        """
+        if interval is None:
+            seconds = keep_alive_seconds(self.keep_alive if self.keep_alive is not None
+                                         else DEFAULT_KEEP_ALIVE)
+            if seconds == 0:
+                return None
+            interval = min(seconds / 2, 300) if seconds else 300  # None: kept forever
+        keeper = ModelKeeper(self, model, interval)
+        keeper.start()
+        return keeper
+
+
+class ModelKeeper(threading.Thread):
+    """Background thread that stops Ollama from unloading an idle model"""
+
+    def __init__(self, client, model, interval):
+        super().__init__(daemon=True)
+        self.client = client
+        self.model = model
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.client.warm_up(self.model)
+            except requests.exceptions.RequestException:
+                pass  # Ollama restarting - try again next interval
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_default_client = None
+
+
+def get_client():
+    """Return the process-wide shared client."""
+    global _default_client
+    if _default_client is None:
+        _default_client = OllamaClient()
+    return _default_client
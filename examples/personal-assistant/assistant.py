@@ -21,15 +21,20 @@ import subprocess
 import time
 from datetime import datetime
 from pathlib import Path
-import requests
 
-# Check for required packages
-try:
-    import pyaudio
-    import numpy as np
-    from openwakeword.model import Model
-    import speech_recognition as sr
-except ImportError as e:
+# Shared helpers live one level up in examples/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ollama_client import OllamaClient, DEFAULT_KEEP_ALIVE, DEFAULT_URL
+from tts import SentenceSplitter, SpeechPipeline, TextToSpeech, TTSCache
+from stt import SAMPLE_RATE, WhisperSTT
+from metrics import JsonlWriter, Metrics, MetricsServer, add_system_gauges
+from weather import WeatherCache
+from prompts import PromptBuilder
+from intents import IntentRouter, Timers, add_builtin_intents
+from response_cache import ResponseCache, scope_key
+
+
+def missing_package(e):
     print(f"Missing required package: {e}")
     print("\nInstall dependencies:")
     print("  cd ~/PiAI/examples/personal-assistant")
@@ -37,27 +42,62 @@ except ImportError as e:
     sys.exit(1)
 
 
+# Check for required packages. PyAudio, openWakeWord and speech_recognition
+# are imported where they're used, so a replay from files needs none of them
+try:
+    import numpy as np
+except ImportError as e:
+    missing_package(e)
+
+from audio_capture import AudioCapture, EnergyVAD, Endpointer, find_microphone
+from wake_word import FRAME_SAMPLES, WakeWordEngine
+from async_core import WakeWordCore
+
+
 class LocalAssistant:
     """Privacy-first voice assistant running entirely on your Pi"""
     
-    def __init__(self):
+    # Fixed replies - synthesized once at startup and cached
+    NO_MODEL_REPLY = "Sorry, I need an AI model to respond. Please download one with: ~/ai-helper.sh pull phi3:mini"
+    NOT_HEARD_REPLY = "Sorry, I didn't catch that."
+    
+    def __init__(self, capture=None, stt=None, tts=None, ollama_url=DEFAULT_URL, config_file=None):
+        """
+        Components are created from the config unless passed in - the
+        replay harness passes a FileAudioSource instead of the microphone.
+        """
         self.user_name = "Doug"
         self.assistant_name = "PiAI"
         self.wake_word = "hey_jarvis"  # Using openWakeWord model (alexa, hey_jarvis, hey_mycroft available)
         self.mic_index = 0  # Default microphone
         
         # Paths
-        self.config_file = Path.home() / ".piai_assistant_config.json"
+        self.config_file = Path(config_file) if config_file else Path.home() / ".piai_assistant_config.json"
         self.load_config()
+        self.prompts = PromptBuilder(self.system_prompt())
         
         # Initialize components
         print(f"Initializing {self.assistant_name} for {self.user_name}...")
+        self.init_metrics()
+        self.init_weather()
+        self.init_intents()
+        self.init_audio(capture)
         self.init_wake_word()
-        self.init_speech_recognition()
+        self.init_speech_recognition(stt)
+        self.ollama = OllamaClient(ollama_url, read_timeout=30, keep_alive=self.keep_alive)
         self.init_ollama()
+        self.init_response_cache()
+        self.tts = tts or TextToSpeech(voice="en_US-lessac-medium", cache=TTSCache())
+        self.tts.prewarm([self.NO_MODEL_REPLY, self.NOT_HEARD_REPLY])
+        self.speech = SpeechPipeline(self.tts, metrics=self.metrics)
+        self.speech_ended_at = None
+        self.timings = {}  # Seconds per stage for the current interaction
+        if self.tts.cache:
+            self.metrics.gauge("tts_cache_hits", lambda: self.tts.cache.hits)
+            self.metrics.gauge("tts_cache_misses", lambda: self.tts.cache.misses)
         
         print(f"[OK] {self.assistant_name} ready!")
-        print(f"Say '{self.wake_word.replace('_', ' ')}' to wake me up\n")
+        print(f"Say '{self.wake_phrases()}' to wake me up\n")
     
     def load_config(self):
         """Load or create user configuration"""
@@ -66,11 +106,63 @@ class LocalAssistant:
                 config = json.load(f)
                 self.user_name = config.get("user_name", "Doug")
                 self.location = config.get("location", "")
+                self.keep_alive = config.get("keep_alive", DEFAULT_KEEP_ALIVE)
+                self.stt_config = config.get("stt", {})
+                self.listen_config = config.get("listen", {})
+                self.wake_config = config.get("wake_word", {})
+                self.metrics_config = config.get("metrics", {})
+                self.weather_config = config.get("weather", {})
+                self.pipeline_config = config.get("pipeline", {})
+                self.intents_config = config.get("intents", {})
+                self.cache_config = config.get("response_cache", {})
         else:
             # Create default config
             config = {
                 "user_name": "Doug",
                 "location": "",  # User can add their city
+                "keep_alive": DEFAULT_KEEP_ALIVE,  # How long Ollama keeps the model loaded
+                "stt": {
+                    "model_size": "base",     # tiny, base, small...
+                    "backend": "auto",        # auto, faster-whisper, whisper
+                    "threads": 4,             # Pi 5 has 4 cores
+                    "compute_type": "int8"    # int8 or float32
+                },
+                "wake_word": {
+                    "keywords": [self.wake_word],       # Several can listen at once
+                    "thresholds": {self.wake_word: 0.5},  # Raise if it wakes by itself
+                    "patience": 1,       # Frames in a row above threshold
+                    "refractory": 2.0,   # Seconds before the same word can fire again
+                    "energy_gate": True  # Skip inference while the room is quiet
+                },
+                "listen": {
+                    "trailing_silence": 0.8,  # Seconds of quiet that end a command
+                    "no_speech_timeout": 5,   # Give up if nothing is said
+                    "max_seconds": 10         # Hard limit per command
+                },
+                "pipeline": {
+                    "async": True,     # Listen while thinking and speaking
+                    "barge_in": True,  # The wake word interrupts the answer
+                    "queue_size": 2    # Commands waiting to be answered
+                },
+                "metrics": {
+                    "port": 9101,         # http://127.0.0.1:9101/metrics (null = off)
+                    "jsonl": None,        # e.g. "~/.cache/piai/assistant-metrics.jsonl"
+                    "flush_interval": 60  # Seconds between JSONL writes
+                },
+                "weather": {
+                    "ttl": 900,         # Seconds before the report is refreshed in the background
+                    "max_stale": 21600  # Older reports (e.g. offline for hours) aren't read out
+                },
+                "intents": {
+                    "enabled": True,  # Answer time, date, weather, timers and "repeat" without the LLM
+                    "plugins": []     # Modules with register(router, assistant) for your own commands
+                },
+                "response_cache": {
+                    "enabled": False,          # Answer repeated questions from ~/.cache/piai/responses.sqlite
+                    "ttl": 86400,              # Seconds before a cached answer is asked again
+                    "embedding_model": None,   # e.g. "nomic-embed-text" to match similar questions too
+                    "similarity": 0.92         # How similar (cosine) a question must be to reuse an answer
+                },
                 "preferences": {
                     "morning_greeting": True,
                     "weather_in_greeting": True
@@ -79,286 +171,548 @@ class LocalAssistant:
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
             self.location = ""
+            self.keep_alive = DEFAULT_KEEP_ALIVE
+            self.stt_config = config["stt"]
+            self.listen_config = config["listen"]
+            self.wake_config = config["wake_word"]
+            self.metrics_config = config["metrics"]
+            self.weather_config = config["weather"]
+            self.pipeline_config = config["pipeline"]
+            self.intents_config = config["intents"]
+            self.cache_config = config["response_cache"]
+        
+        self.wake_keywords = self.wake_config.get("keywords", [self.wake_word])
+        self.wake_word = self.wake_keywords[0]
+        self.trailing_silence = self.listen_config.get("trailing_silence", 0.8)
+        self.no_speech_timeout = self.listen_config.get("no_speech_timeout", 5)
+        self.max_seconds = self.listen_config.get("max_seconds", 10)
+    
+    def init_metrics(self):
+        """Per-stage timings, served on localhost and/or written to a JSONL file"""
+        self.metrics = Metrics()
+        add_system_gauges(self.metrics)
+        self.metrics_server = None
+        self.metrics_writer = None
+        
+        port = self.metrics_config.get("port", 9101)
+        if port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port=port).start()
+                print(f"[METRICS] Serving on {self.metrics_server.url}")
+            except OSError as e:
+                print(f"[WARN] Metrics endpoint not started: {e}")
+        
+        path = self.metrics_config.get("jsonl")
+        if path:
+            interval = self.metrics_config.get("flush_interval", 60)
+            self.metrics_writer = JsonlWriter(self.metrics, path, interval).start()
+            print(f"[METRICS] Writing interactions to {self.metrics_writer.path}")
+    
+    def init_weather(self):
+        """Weather is fetched in the background, so greetings never wait for it"""
+        self.weather = WeatherCache.from_config(self.location, self.weather_config).start()
+        self.metrics.gauge("weather_age_seconds", self.weather.age)
+    
+    def init_response_cache(self):
+        """Opt-in: repeated questions are answered from SQLite instead of the LLM"""
+        self.responses = None
+        if not self.cache_config.get("enabled", False):
+            return
+        embedding_model = self.cache_config.get("embedding_model")
+        embed = (lambda text: self.ollama.embed(embedding_model, text)) if embedding_model else None
+        self.responses = ResponseCache(scope=scope_key(self.model, self.prompts.system),
+                                       ttl=self.cache_config.get("ttl", 86400), embed=embed,
+                                       similarity=self.cache_config.get("similarity", 0.92),
+                                       metrics=self.metrics)
+        print(f"[CACHE] Answering repeated questions from {self.responses.path}")
+    
+    def init_intents(self):
+        """Simple commands are answered locally in microseconds instead of by the LLM"""
+        self.timers = Timers(self.speak)
+        self.intents = None
+        if not self.intents_config.get("enabled", True):
+            return
+        self.intents = IntentRouter(self.metrics)
+        add_builtin_intents(self.intents, weather=self.weather, timers=self.timers)
+        self.intents.load_plugins(self.intents_config.get("plugins", []), self)
+    
+    def init_audio(self, capture=None):
+        """Open the microphone once - every stage reads from its ring buffer"""
+        if capture is not None:
+            self.audio = None
+            self.capture = capture
+            self.capture.start()
+            return
+        
+        try:
+            import pyaudio
+        except ImportError as e:
+            missing_package(e)
+        self.audio = pyaudio.PyAudio()
+        
+        # Find USB microphone
+        self.mic_index, name = find_microphone(self.audio)
+        if self.mic_index is None:
+            print("[WARN] USB microphone not found, using default")
+        else:
+            print(f"[MIC] Using microphone: {name}")
+        
+        try:
+            self.capture = AudioCapture(self.audio, self.mic_index, rate=SAMPLE_RATE)
+            self.capture.start()
+            print(f"[MIC] Recording at {self.capture.device_rate} Hz")
+        except Exception as e:
+            print(f"[ERROR] Microphone initialization failed: {e}")
+            self.capture = None
     
     def init_wake_word(self):
         """Initialize wake word detection with openWakeWord"""
+        # Where the next command starts - just after the wake word
+        self.wake_reader = self.capture.reader() if self.capture else None
+        
         try:
-            # Use openWakeWord - fully local, open source
-            self.wake_model = Model(wakeword_models=[self.wake_word])
-            self.wake_audio = pyaudio.PyAudio()
-            
-            # Find USB microphone
-            mic_index = None
-            for i in range(self.wake_audio.get_device_count()):
-                info = self.wake_audio.get_device_info_by_index(i)
-                if 'USB' in info['name'] and info['maxInputChannels'] > 0:
-                    mic_index = i
-                    print(f"[MIC] Using microphone: {info['name']}")
-                    break
+            if self.capture is None:
+                raise RuntimeError("no microphone")
             
-            if mic_index is None:
-                print("[WARN] USB microphone not found, using default")
-                mic_index = 0
-            
-            self.mic_index = mic_index
-            self.wake_stream = self.wake_audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=16000,
-                input=True,
-                input_device_index=mic_index,
-                frames_per_buffer=1280
+            # Use openWakeWord - fully local, open source
+            self.wake_engine = WakeWordEngine(
+                self.wake_keywords,
+                thresholds=self.wake_config.get("thresholds"),
+                patience=self.wake_config.get("patience", 1),
+                refractory=self.wake_config.get("refractory", 2.0),
+                energy_gate=self.wake_config.get("energy_gate", True),
+                metrics=self.metrics,
             )
             
         except Exception as e:
             print(f"[ERROR] Wake word initialization failed: {e}")
             print("Falling back to keyboard input mode")
-            self.wake_model = None
+            self.wake_engine = None
     
-    def init_speech_recognition(self):
+    def wake_phrases(self):
+        """Wake words as spoken, joined for the "Say '...'" prompt"""
+        return "' or '".join(k.replace('_', ' ') for k in self.wake_keywords)
+    
+    def init_speech_recognition(self, stt=None):
         """Initialize speech recognition with local Whisper"""
-        self.recognizer = sr.Recognizer()
+        self.recognizer = None  # speech_recognition's, only used if Whisper failed to preload
+        self.vad = EnergyVAD()
         
-        # Try to find USB microphone, fall back to default
-        try:
-            import pyaudio
-            p = pyaudio.PyAudio()
-            mic_index = None
-            for i in range(p.get_device_count()):
-                info = p.get_device_info_by_index(i)
-                if 'USB' in info['name'] and info['maxInputChannels'] > 0:
-                    mic_index = i
-                    break
-            p.terminate()
-            
-            if mic_index is not None:
-                self.microphone = sr.Microphone(device_index=mic_index)
-            else:
-                self.microphone = sr.Microphone()
-        except:
-            # Fallback to default
-            self.microphone = sr.Microphone()
-        
-        # Adjust for ambient noise
+        # Learn the background noise level from one second of captured audio
         print("[AUDIO] Calibrating microphone...")
+        background = self.capture.reader().read(SAMPLE_RATE, timeout=2) if self.capture else None
+        if background is not None:
+            self.vad.calibrate(background)
+        else:
+            print("[WARN] Microphone calibration skipped: no audio")
+        
+        if stt is not None:
+            self.stt = stt
+            return
+        
+        # Load Whisper once and keep it in memory
         try:
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+            self.stt = WhisperSTT(**self.stt_config)
         except Exception as e:
-            print(f"[WARN] Microphone calibration skipped: {e}")
+            print(f"[WARN] Whisper preload failed: {e}")
+            self.stt = None
     
     def init_ollama(self):
         """Check Ollama is running and model is available"""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            models = response.json().get('models', [])
-            
             # Prefer phi3:mini for assistant
-            if any('phi3' in m['name'] for m in models):
-                self.model = "phi3:mini"
-            elif models:
-                self.model = models[0]['name']
-            else:
+            self.model = self.ollama.pick_model("phi3:mini")
+            if not self.model:
                 print("[WARN] No Ollama models found. Download one with:")
                 print("  ~/ai-helper.sh pull phi3:mini")
                 self.model = None
                 
             if self.model:
                 print(f"[LLM] Using model: {self.model}")
+                self.warm_up_model()
                 
         except Exception as e:
             print(f"[WARN] Ollama not available: {e}")
             print("Start it with: ~/ai-helper.sh start")
             self.model = None
     
+    def warm_up_model(self):
+        """Preload the model so the first question isn't a cold load"""
+        print(f"[LLM] Loading {self.model} into memory...")
+        try:
+            seconds = self.ollama.warm_up(self.model)
+            print(f"[LLM] Model ready ({seconds:.1f}s)")
+        except Exception as e:
+            print(f"[WARN] Model warm-up failed: {e}")
+        
+        # Prefill the system prompt now, so the first question reuses it
+        try:
+            tokens = self.prompts.prime(self.ollama, self.model)
+            print(f"[LLM] System prompt cached ({tokens} tokens)")
+        except Exception as e:
+            print(f"[WARN] System prompt priming failed: {e}")
+        self.metrics.gauge("llm_prompt_prefix_tokens", lambda: self.prompts.prefix_tokens)
+        
+        # Keep it loaded between wake words (unless keep_alive is 0)
+        self.model_keeper = self.ollama.start_keeper(self.model)
+        if self.model_keeper is None:
+            print("[LLM] keep_alive is 0 - the model unloads after each answer")
+    
     def listen_for_wake_word(self):
         """Listen for wake word (local detection)"""
-        if not self.wake_model:
+        if not self.wake_engine:
             # Fallback: press Enter
             input("Press Enter to talk (wake word not available)...")
+            if self.wake_reader:
+                self.wake_reader.seek(self.capture.position)
+            self.timings = {}
             return True
         
-        try:
-            audio_data = self.wake_stream.read(1280, exception_on_overflow=False)
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
-            
-            # Run prediction
-            prediction = self.wake_model.predict(audio_array)
-            
-            # Check if wake word detected
-            for key, score in prediction.items():
-                if score > 0.5:  # Confidence threshold
-                    return True
-                    
-        except Exception as e:
-            pass
+        # Blocks until the next frame has been captured - no polling
+        audio_array = self.wake_reader.read(FRAME_SAMPLES)
+        if audio_array is None:
+            return False
         
-        return False
+        # All wake words scored in one inference; returns the one heard, if any
+        keyword = self.wake_engine.process(audio_array)
+        if keyword:
+            # How far detection lags behind the end of the wake word
+            self.timings = {"wake": time.monotonic() - self.capture.time_of(self.wake_reader.position)}
+        return keyword
     
     def listen_for_speech(self):
         """Capture and transcribe speech using local Whisper"""
         print("[LISTEN] Listening...")
         
         try:
-            with self.microphone as source:
-                # Listen with timeout
-                audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
+            samples = self.record_command()
+            if samples is None:
+                return None
             
             print("[PROCESS] Processing speech...")
-            
-            # Use Whisper locally (no cloud API)
-            # Note: This requires whisper to be installed
-            text = self.recognizer.recognize_whisper(audio, model="base", language="english")
-            
+            self.timings["capture"] = len(samples) / SAMPLE_RATE
+            start = time.monotonic()
+            text = self.transcribe(samples)
+            self.timings["stt"] = time.monotonic() - start
             return text
             
-        except sr.WaitTimeoutError:
-            return None
-        except sr.UnknownValueError:
-            return None
         except Exception as e:
             print(f"[ERROR] Speech recognition error: {e}")
             return None
     
-    def get_weather(self):
-        """Get local weather (privacy-friendly)"""
-        if not self.location:
-            return ""
+    def transcribe(self, samples):
+        """Turn int16 samples into text with local Whisper (None if nothing recognized)"""
+        # Use Whisper locally (no cloud API)
+        if self.stt:
+            return self.stt.transcribe(samples) or None
         
+        # Note: This requires speech_recognition and whisper to be installed
+        import speech_recognition as sr
+        if self.recognizer is None:
+            self.recognizer = sr.Recognizer()
         try:
-            # Using wttr.in - privacy-friendly weather service
-            # No API key needed, no tracking
-            response = requests.get(
-                f"https://wttr.in/{self.location}?format=j1",
-                timeout=3
-            )
-            data = response.json()
-            current = data['current_condition'][0]
-            
-            temp_f = current['temp_F']
-            desc = current['weatherDesc'][0]['value']
-            
-            return f"The weather in {self.location} is {temp_f}°F and {desc.lower()}. "
-        except:
-            return ""
+            audio = sr.AudioData(samples.tobytes(), SAMPLE_RATE, 2)
+            text = self.recognizer.recognize_whisper(audio, model="base", language="english")
+        except sr.UnknownValueError:
+            return None
+        return text or None
     
-    def get_response(self, user_input):
-        """Get AI response from local Ollama"""
-        if not self.model:
-            return "Sorry, I need an AI model to respond. Please download one with: ~/ai-helper.sh pull phi3:mini"
+    def endpointer(self, start):
+        """End-of-command detection for a command starting at buffer position `start`"""
+        return Endpointer(self.vad, start, SAMPLE_RATE, self.trailing_silence,
+                          self.no_speech_timeout, self.max_seconds)
+    
+    def record_command(self):
+        """
+        Take the spoken command from the capture ring buffer.
         
-        # Build personalized context
-        hour = datetime.now().hour
-        greeting_time = "morning" if hour < 12 else "afternoon" if hour < 18 else "evening"
+        Reading starts exactly where wake-word detection stopped (or where
+        Enter was pressed), so words said straight after the wake word are
+        already there. Ends after
+        `trailing_silence` seconds of quiet. Returns int16 samples, or None
+        if nothing was said.
+        """
+        if self.capture is None:
+            raise RuntimeError("No microphone available")
         
-        # Check if this is a wake-up greeting
-        is_wake_greeting = any(word in user_input.lower() for word in ["hello", "hi", "hey", "good morning", "wake up"])
+        reader = self.capture.reader(self.wake_reader.position)
+        endpointer = self.endpointer(reader.position)
+        chunk = SAMPLE_RATE // 20  # 50 ms - how often we check for end of speech
+        
+        while True:
+            samples = reader.read(chunk)
+            if samples is None:
+                break  # Microphone stopped delivering audio
+            if endpointer.feed(samples, reader.position):
+                break
         
-        # Build system prompt
-        system_prompt = f"""You are {self.assistant_name}, a helpful AI assistant for {self.user_name} Richards.
+        # Wake-word detection carries on after the command
+        self.wake_reader.seek(reader.position)
+        
+        if endpointer.last_voice is None:
+            return None
+        
+        # When the last word was spoken, in wall-clock time
+        self.speech_ended_at = self.capture.time_of(endpointer.last_voice)
+        return endpointer.samples()
+    
+    def get_weather(self):
+        """Local weather from the cache (never waits for the network)"""
+        return self.weather.get()
+    
+    def system_prompt(self):
+        """
+        The fixed system prompt - sent unchanged with every request, so
+        Ollama can reuse it from its cache. Nothing time-dependent here.
+        """
+        return f"""You are {self.assistant_name}, a helpful AI assistant for {self.user_name} Richards.
 You run entirely on a Raspberry Pi 5 - no cloud, completely private.
 You are friendly, concise, and respectful of Doug's time.
-Current time: {datetime.now().strftime('%I:%M %p')}
 Keep responses brief and conversational."""
-
+    
+    def build_prompt(self, user_input):
+        """Build the user turn, volatile facts last; returns (prompt, weather_info)"""
+        # Check if this is a wake-up greeting
+        is_wake_greeting = any(word in user_input.lower() for word in ["hello", "hi", "hey", "good morning", "wake up"])
+        
         # Add weather to wake greeting
-        weather_info = ""
-        if is_wake_greeting:
-            weather_info = self.get_weather()
-            if weather_info:
-                system_prompt += f"\nWeather info: {weather_info}"
+        weather_info = self.get_weather() if is_wake_greeting else ""
+        
+        facts = [f"Current time: {datetime.now().strftime('%I:%M %p')}."]
+        if weather_info:
+            facts.append(f"Weather info: {weather_info}")
+        return self.prompts.prompt(user_input, facts), weather_info
+    
+    def build_request(self, prompt):
+        """Ollama request body for a prompt"""
+        return {
+            "model": self.model,
+            "system": self.prompts.system,  # Same every time - cached by Ollama
+            "prompt": prompt,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 150  # Keep responses concise
+            }
+        }
+    
+    def fast_answer(self, user_input):
+        """A reply from the intent router or the response cache, or None if the LLM should answer"""
+        routed = self.intents.route(user_input) if self.intents else None
+        if routed:
+            return routed[1]
+        cached = self.responses.get(user_input) if self.responses else None
+        if cached:
+            self.remember(cached)
+        return cached
+    
+    def remember(self, answer, user_input=None):
+        """Keep the last answer, for "say that again", and cache it if user_input is given"""
+        if self.intents:
+            self.intents.remember(answer)
+        if self.responses and user_input:
+            self.responses.put(user_input, answer)
+    
+    def get_response(self, user_input):
+        """Get AI response from local Ollama"""
+        answer = self.fast_answer(user_input)
+        if answer:
+            return answer
+        
+        if not self.model:
+            return self.NO_MODEL_REPLY
+        
+        prompt, weather_info = self.build_prompt(user_input)
         
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": f"System: {system_prompt}\n\nUser: {user_input}\n\nAssistant:",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 150  # Keep responses concise
-                    }
-                },
-                timeout=30
-            )
+            result = self.ollama.generate(self.build_request(prompt))
+            self.prompts.record(self.metrics, result, self.timings)
             
-            result = response.json()
             answer = result.get('response', '').strip()
             
             # Add weather naturally if it's a greeting
-            if is_wake_greeting and weather_info:
+            if weather_info:
                 # Ollama might not include weather, so mention it
-                if "weather" not in answer.lower() and weather_info:
+                if "weather" not in answer.lower():
                     answer += f" {weather_info}"
             
+            # Greetings mention the weather, which doesn't keep
+            self.remember(answer, None if weather_info else user_input)
             return answer
             
         except Exception as e:
             return f"Sorry, I had trouble thinking. Error: {e}"
     
+    def stream_answer(self, user_input, timings):
+        """
+        Yield the answer to user_input piece by piece as Ollama streams it.
+        
+        Records llm_first_token and llm_total in `timings`. Errors are
+        yielded as part of the answer, so they get spoken too.
+        """
+        answer = self.fast_answer(user_input)
+        if answer:
+            yield answer
+            return
+        
+        if not self.model:
+            yield self.NO_MODEL_REPLY
+            return
+        
+        prompt, weather_info = self.build_prompt(user_input)
+        answer = []
+        complete = True
+        request_at = time.monotonic()
+        
+        try:
+            for chunk in self.ollama.stream_generate(self.build_request(prompt)):
+                if chunk.get("done"):
+                    self.prompts.record(self.metrics, chunk, timings)
+                token = chunk.get("response", "")
+                if not token:
+                    continue
+                if not answer:
+                    timings["llm_first_token"] = time.monotonic() - request_at
+                    token = token.lstrip()
+                answer.append(token)
+                yield token
+        except Exception as e:
+            complete = False
+            yield f" Sorry, I had trouble thinking. Error: {e}"
+        timings["llm_total"] = time.monotonic() - request_at
+        
+        # Ollama might not include weather, so mention it
+        if weather_info and "weather" not in "".join(answer).lower():
+            answer.append(f" {weather_info}")
+            yield answer[-1]
+        # Only whole answers are cached, and greetings mention the weather, which doesn't keep
+        self.remember("".join(answer), user_input if complete and not weather_info else None)
+    
+    def respond(self, user_input):
+        """
+        Stream the AI response and speak it sentence by sentence.
+        
+        Each finished sentence goes to the TTS worker while Ollama keeps
+        generating, so speech starts after the first sentence instead of
+        after the whole answer.
+        """
+        if not self.model:
+            self.speak(self.get_response(user_input))
+            return
+        
+        splitter = SentenceSplitter()
+        started_at = self.speech_ended_at or time.monotonic()
+        self.speech_ended_at = None
+        self.speech.begin(started_at)
+        
+        print(f"\n[{self.assistant_name}]: ", end="", flush=True)
+        first_token_at = None
+        
+        for piece in self.stream_answer(user_input, self.timings):
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            print(piece, end="", flush=True)
+            for sentence in splitter.feed(piece):
+                self.speech.say(sentence)
+        
+        self.speech.say(splitter.flush())
+        print("\n")
+        
+        # Don't wait for the whole answer to be spoken - just for it to start
+        speech_start = self.speech.wait_started()
+        if self.speech.first_synthesis is not None:
+            self.timings["tts_first_sentence"] = self.speech.first_synthesis
+        if speech_start is not None:
+            self.timings["speech_start"] = speech_start
+            timing = f"[TIMING] Speech started {speech_start:.2f}s after you stopped talking"
+            if first_token_at:
+                timing += f" (first token {first_token_at - started_at:.2f}s)"
+            print(timing)
+    
     def speak(self, text):
-        """Speak text using local TTS"""
+        """Speak text using local TTS (returns immediately)"""
         print(f"\n[{self.assistant_name}]: {text}\n")
+        self.speech.say(text)
+    
+    def handle_wake(self, keyword=True):
+        """Listen for the command after a wake word and answer it"""
+        heard = f" ({keyword})" if isinstance(keyword, str) else ""
+        print(f"[WAKE] Wake word detected{heard}! Good {datetime.now().strftime('%A')}!")
         
-        try:
-            # Try Piper TTS first (best quality)
-            if os.path.exists("/usr/local/bin/piper"):
-                subprocess.run([
-                    "piper",
-                    "--model", "en_US-lessac-medium",
-                    "--output-raw"
-                ], input=text.encode(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            else:
-                # Fallback to espeak (faster, more robotic)
-                subprocess.run(["espeak", text], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except:
-            # If TTS fails, just print (silent mode)
-            pass
+        # Barge-in: stop talking as soon as the user wants to speak
+        self.speech.interrupt()
+        
+        # Play acknowledgment sound (optional)
+        # subprocess.run(["aplay", "wake.wav"], stdout=subprocess.DEVNULL)
+        
+        # Listen for command
+        user_speech = self.listen_for_speech()
+        
+        if user_speech:
+            print(f"[YOU]: {user_speech}")
+            
+            # Get AI response and speak it as it streams in
+            self.respond(user_speech)
+        else:
+            print("[INFO] Didn't catch that. Try again!\n")
+            self.speech.say(self.NOT_HEARD_REPLY)
+            self.metrics.increment("not_heard_total")
+        
+        self.metrics.record(self.timings, keyword=keyword if isinstance(keyword, str) else None,
+                            heard=bool(user_speech))
+        return user_speech
     
     def run(self):
         """Main assistant loop"""
         print(f"[READY] {self.assistant_name} is listening...")
-        print(f"Say '{self.wake_word.replace('_', ' ')}' or press Ctrl+C to exit\n")
+        print(f"Say '{self.wake_phrases()}' or press Ctrl+C to exit\n")
+        
+        if self.capture and self.pipeline_config.get("async", True):
+            # Listening, thinking and speaking run side by side
+            core = WakeWordCore(self, barge_in=self.pipeline_config.get("barge_in", True),
+                                queue_size=self.pipeline_config.get("queue_size", 2))
+            try:
+                core.run()
+            except KeyboardInterrupt:
+                print(f"\nGoodbye, {self.user_name}!")
+            finally:
+                self.cleanup()
+            return
         
         try:
             while True:
                 # Wait for wake word
-                if self.listen_for_wake_word():
-                    print(f"[WAKE] Wake word detected! Good {datetime.now().strftime('%A')}!")
-                    
-                    # Play acknowledgment sound (optional)
-                    # subprocess.run(["aplay", "wake.wav"], stdout=subprocess.DEVNULL)
-                    
-                    # Listen for command
-                    user_speech = self.listen_for_speech()
-                    
-                    if user_speech:
-                        print(f"[YOU]: {user_speech}")
-                        
-                        # Get AI response
-                        response = self.get_response(user_speech)
-                        
-                        # Speak response
-                        self.speak(response)
-                    else:
-                        print("[INFO] Didn't catch that. Try again!\n")
-                    
+                keyword = self.listen_for_wake_word()
+                if keyword:
+                    self.handle_wake(keyword)
                     print(f"[READY] Listening for wake word...")
                 
-                time.sleep(0.1)  # Small delay to prevent CPU overuse
-                
         except KeyboardInterrupt:
             print(f"\nGoodbye, {self.user_name}!")
             self.cleanup()
     
     def cleanup(self):
         """Clean up resources"""
-        if hasattr(self, 'wake_stream'):
-            self.wake_stream.stop_stream()
-            self.wake_stream.close()
-        if hasattr(self, 'wake_audio'):
-            self.wake_audio.terminate()
+        self.weather.stop()
+        self.timers.cancel()
+        if self.responses:
+            self.responses.close()
+        self.speech.interrupt()
+        self.tts.close()
+        if getattr(self, 'model_keeper', None):
+            self.model_keeper.stop()
+        if self.wake_engine:
+            print(self.wake_engine.summary())
+        summary = self.metrics.summary(["wake", "stt", "llm_first_token", "tts_first_sentence", "speech_start"])
+        if summary:
+            print(f"[METRICS] Stage latencies:\n{summary}")
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.capture:
+            self.capture.close()
+        if self.audio:
+            self.audio.terminate()
 
 
 def main():
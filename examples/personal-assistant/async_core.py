@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+PiAI Assistant Core (asyncio)
+
+Runs an assistant as asyncio tasks joined by bounded queues, so listening,
+thinking and speaking overlap instead of taking turns:
+
+    capture -> wake word -> STT -> LLM -> TTS
+           frames     commands  texts  sentences
+
+- The microphone is read the whole time, including while an answer is
+  being generated or spoken, so the next command can be said during
+  playback and is answered as soon as the current one is done
+- Barge-in: the wake word (or Enter) interrupts the answer - playback
+  stops and the Ollama stream is closed, which stops generation
+- Blocking work (ring buffer reads, wake word inference, Whisper or Vosk,
+  the Ollama stream) runs on one executor thread per stage, so a long
+  transcription never holds up wake word detection
+- Full queues push back: a stage that falls behind makes the one before
+  it wait, and audio piles up in the capture ring buffer instead of being
+  dropped
+
+WakeWordCore drives assistant.py. PushToTalkCore drives simple_assistant.py,
+where Vosk recognizes while recording, so capture and STT are one stage.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tts import SentenceSplitter
+from wake_word import FRAME_SAMPLES
+
+_END = object()  # Marks the end of a stream or of a turn's sentences
+
+
+class Turn:
+    """One command on its way through the pipeline"""
+
+    def __init__(self, keyword=None, position=None):
+        self.keyword = keyword  # Wake word that started it, if any
+        self.position = position  # Capture buffer position where the command starts
+        self.end = position  # ... and where listening stopped
+        self.samples = None
+        self.text = None
+        self.speech_ended_at = None  # When the user stopped talking (time.monotonic)
+        self.timings = {}  # Seconds per stage, as in the sequential loop
+        self.interrupted = False
+        self.spoken = False  # First sentence handed to the speech pipeline
+        self.started = None  # Future: (started_at, synthesis seconds) of the first sentence
+
+
+class AssistantCore:
+    """
+    LLM and TTS stages, barge-in and the event loop.
+
+    Subclasses provide listen_stages(): coroutines that put Turns with
+    text (or without, if nothing was heard) on self.texts, then None.
+    """
+
+    def __init__(self, assistant, barge_in=True, queue_size=2, on_turn=None):
+        self.assistant = assistant
+        self.barge_in = barge_in
+        self.queue_size = queue_size  # Commands waiting to be answered
+        self.on_turn = on_turn  # Called with every finished Turn (replay.py)
+        self.loop = None
+        self.executors = {}
+        self.responding = None  # Task answering the current turn
+        self._turns = set()  # Turns being answered or spoken
+
+    def run(self):
+        """Run until the audio ends or Ctrl+C."""
+        try:
+            asyncio.run(self.main())
+        finally:
+            for executor in self.executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.texts = asyncio.Queue(self.queue_size)
+        self.sentences = asyncio.Queue(16)
+        stages = self.listen_stages() + [self.llm_stage(), self.tts_stage()]
+        tasks = [asyncio.create_task(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def listen_stages(self):
+        raise NotImplementedError
+
+    def in_thread(self, stage, function, *args):
+        """Run blocking work on the stage's own executor thread."""
+        if stage not in self.executors:
+            self.executors[stage] = ThreadPoolExecutor(1, thread_name_prefix=f"piai-{stage}")
+        return self.loop.run_in_executor(self.executors[stage], function, *args)
+
+    async def stream(self, stage, make_iterator):
+        """Iterate a blocking generator on a stage thread, yielding its items here."""
+        items = asyncio.Queue()
+        stop = threading.Event()
+
+        def post(item, error=None):
+            try:
+                self.loop.call_soon_threadsafe(items.put_nowait, (item, error))
+            except RuntimeError:
+                pass  # Event loop already closed
+
+        def pump():
+            iterator = make_iterator()
+            try:
+                for item in iterator:
+                    if stop.is_set():
+                        break
+                    post(item)
+            except Exception as e:
+                post(_END, e)
+                return
+            finally:
+                iterator.close()  # Closes the HTTP stream, so Ollama stops generating
+            post(_END)
+
+        self.in_thread(stage, pump)
+        try:
+            while True:
+                item, error = await items.get()
+                if item is _END:
+                    if error:
+                        raise error
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def start_key_reader(self, on_press):
+        """Call on_press() in the event loop whenever Enter is pressed (None at end of input)."""
+        def read_keys():
+            while True:
+                try:
+                    input()
+                except EOFError:
+                    self.loop.call_soon_threadsafe(on_press, None)
+                    return
+                self.loop.call_soon_threadsafe(on_press, True)
+
+        # A daemon thread, not an executor: input() can't be cancelled on exit
+        threading.Thread(target=read_keys, daemon=True).start()
+
+    # -- Barge-in ---------------------------------------------------------------
+
+    def interrupt(self):
+        """Stop speaking and drop the answer being generated."""
+        if not self._turns and not self.assistant.speech.is_speaking():
+            return
+        print("\n[BARGE-IN] Stopping the current answer")
+        self.assistant.metrics.increment("barge_in_total")
+        for turn in list(self._turns):
+            turn.interrupted = True
+            self.finish(turn)
+        if self.responding:
+            self.responding.cancel()
+        while not self.sentences.empty():
+            self.sentences.get_nowait()
+        self.assistant.speech.interrupt()
+
+    def finish(self, turn):
+        """Record a turn's timings, once, when it is answered or interrupted."""
+        if turn not in self._turns:
+            return
+        self._turns.discard(turn)
+        self.assistant.metrics.record(turn.timings, keyword=turn.keyword, heard=bool(turn.text),
+                                      interrupted=turn.interrupted)
+        if self.on_turn:
+            self.on_turn(turn)
+
+    # -- LLM and TTS stages ---------------------------------------------------------
+
+    async def llm_stage(self):
+        """Answer commands one at a time, streaming sentences to the TTS stage."""
+        while True:
+            turn = await self.texts.get()
+            if turn is None:
+                await self.sentences.put(None)
+                return
+            self._turns.add(turn)
+            self.responding = asyncio.create_task(self.respond(turn))
+            await asyncio.wait([self.responding])
+            if not self.responding.cancelled() and self.responding.exception():
+                print(f"[ERROR] Answering failed: {self.responding.exception()}")
+                self.finish(turn)
+            self.responding = None
+
+    async def respond(self, turn):
+        assistant = self.assistant
+        turn.started = self.loop.create_future()
+        turn.speech_ended_at = turn.speech_ended_at or time.monotonic()
+
+        if turn.text:
+            print(f"[YOU]: {turn.text}")
+            print(f"\n[{assistant.assistant_name}]: ", end="", flush=True)
+            splitter = SentenceSplitter()
+            first_token_at = None
+            answer = self.stream("llm", lambda: assistant.stream_answer(turn.text, turn.timings))
+            async for piece in answer:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                print(piece, end="", flush=True)
+                for sentence in splitter.feed(piece):
+                    await self.sentences.put((turn, sentence))
+            await self.sentences.put((turn, splitter.flush()))
+            print("\n")
+        else:
+            print("[INFO] Didn't catch that. Try again!\n")
+            assistant.metrics.increment("not_heard_total")
+            await self.sentences.put((turn, assistant.NOT_HEARD_REPLY))
+        await self.sentences.put((turn, _END))
+
+        # The next command is answered once this one has started playing
+        await asyncio.wait([turn.started], timeout=30)
+        started_at, synthesis = turn.started.result() if turn.started.done() else (None, None)
+        if synthesis is not None:
+            turn.timings["tts_first_sentence"] = synthesis
+        if started_at is not None:
+            turn.timings["speech_start"] = started_at - turn.speech_ended_at
+            print(f"[TIMING] Speech started {turn.timings['speech_start']:.2f}s after you stopped talking")
+        self.finish(turn)
+
+    async def tts_stage(self):
+        """
+        Hand sentences to the speech pipeline, which synthesizes the next
+        one while the current one plays on its own threads.
+        """
+        speech = self.assistant.speech
+        while True:
+            item = await self.sentences.get()
+            if item is None:
+                await self.in_thread("tts", speech.wait)  # Let the last answer finish
+                return
+            turn, sentence = item
+            if turn.interrupted:
+                continue
+            if sentence is _END:
+                if not turn.spoken:
+                    self._started(turn, None, None)  # Nothing to say
+                continue
+            if not sentence:
+                continue
+
+            on_start = None
+            if not turn.spoken:
+                turn.spoken = True
+
+                def on_start(started_at, synthesis, turn=turn):
+                    self.loop.call_soon_threadsafe(self._started, turn, started_at, synthesis)
+            speech.say(sentence, on_start)
+
+    def _started(self, turn, started_at, synthesis):
+        if not turn.started.done():
+            turn.started.set_result((started_at, synthesis))
+
+
+class WakeWordCore(AssistantCore):
+    """assistant.py: capture -> wake word -> Whisper -> LLM -> TTS"""
+
+    FRAME_QUEUE = 25  # 2 s of 80 ms frames
+
+    def __init__(self, assistant, **options):
+        super().__init__(assistant, **options)
+        self.transcribing = None  # Turn on the STT thread right now
+
+    def listen_stages(self):
+        self.frames = asyncio.Queue(self.FRAME_QUEUE)
+        self.commands = asyncio.Queue(self.queue_size)
+        self.pressed = False
+        if self.assistant.wake_engine is None:
+            print("Press Enter to talk (wake word not available)...")
+            self.start_key_reader(self._on_press)
+        return [self.capture_stage(), self.wake_stage(), self.stt_stage()]
+
+    def _on_press(self, pressed):
+        self.pressed = bool(pressed)
+
+    async def capture_stage(self):
+        """Read the capture ring buffer one wake word frame at a time."""
+        capture = self.assistant.capture
+        reader = capture.reader(self.assistant.wake_reader.position)  # Includes audio since start-up
+        while True:
+            frame = await self.in_thread("capture", reader.read, FRAME_SAMPLES)
+            if frame is None:
+                if capture.ring.closed:
+                    break
+                continue  # No audio for a second - keep waiting
+            await self.frames.put((reader.position, frame))
+        await self.frames.put(None)
+
+    async def wake_stage(self):
+        """Spot the wake word, then collect the command that follows it."""
+        assistant = self.assistant
+        engine = assistant.wake_engine
+        turn = endpointer = None
+
+        while True:
+            item = await self.frames.get()
+            if item is None:
+                break
+            position, frame = item
+
+            if endpointer is None:
+                if engine:
+                    keyword = await self.in_thread("wake", engine.process, frame)
+                else:
+                    keyword, self.pressed = self.pressed, False
+                if not keyword:
+                    continue
+                turn = Turn(keyword if isinstance(keyword, str) else None, position)
+                if engine:
+                    # How far detection lags behind the end of the wake word
+                    turn.timings["wake"] = time.monotonic() - assistant.capture.time_of(position)
+                heard = f" ({keyword})" if turn.keyword else ""
+                print(f"[WAKE] Wake word detected{heard}!")
+                if self.barge_in:
+                    self.interrupt()
+                print("[LISTEN] Listening...")
+                endpointer = assistant.endpointer(position)
+                continue
+
+            if not endpointer.feed(frame, position):
+                continue
+            turn.end = position
+            if endpointer.last_voice is not None:
+                turn.samples = endpointer.samples()
+                turn.speech_ended_at = assistant.capture.time_of(endpointer.last_voice)
+                turn.timings["capture"] = len(turn.samples) / assistant.capture.rate
+            endpointer = None
+            await self.commands.put(turn)
+
+        await self.commands.put(None)
+
+    async def stt_stage(self):
+        """Transcribe commands on the STT thread."""
+        while True:
+            turn = await self.commands.get()
+            if turn is None:
+                break
+            if turn.samples is not None:
+                print("[PROCESS] Processing speech...")
+                self.transcribing = turn
+                start = time.monotonic()
+                try:
+                    turn.text = await self.in_thread("stt", self.assistant.transcribe, turn.samples)
+                except Exception as e:
+                    print(f"[ERROR] Speech recognition error: {e}")
+                turn.timings["stt"] = time.monotonic() - start
+            await self.texts.put(turn)
+        await self.texts.put(None)
+
+
+class PushToTalkCore(AssistantCore):
+    """simple_assistant.py: Enter -> Vosk (capture and STT together) -> LLM -> TTS"""
+
+    def __init__(self, assistant, continuous=False, **options):
+        super().__init__(assistant, **options)
+        self.continuous = continuous  # Listen again as soon as a command ends, no Enter (replay.py)
+
+    def listen_stages(self):
+        self.presses = asyncio.Queue()
+        if not self.continuous:
+            print("Press Enter to talk - also while I'm answering")
+            self.start_key_reader(self.presses.put_nowait)
+        return [self.listen_stage()]
+
+    async def listen_stage(self):
+        """Record and recognize one command per Enter press."""
+        capture = self.assistant.capture
+        while True:
+            if not self.continuous:
+                if not await self.presses.get():
+                    break  # End of input
+            if self.barge_in:
+                self.interrupt()
+
+            turn = Turn(position=capture.position)
+            turn.text, turn.speech_ended_at = await self.in_thread("stt", self.listen, turn)
+            turn.end = capture.position
+            if not turn.text and capture.ring.closed:
+                break
+            await self.texts.put(turn)
+
+            # Enter pressed while recording doesn't start another command
+            pressed = [self.presses.get_nowait() for _ in range(self.presses.qsize())]
+            if None in pressed:
+                break
+        await self.texts.put(None)
+
+    def listen(self, turn):
+        # Runs on the STT thread; listen() fills in the assistant's timings
+        self.assistant.timings = turn.timings
+        text = self.assistant.listen()
+        return text, self.assistant.speech_ended_at
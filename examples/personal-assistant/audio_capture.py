@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+PiAI Audio Capture
+
+One microphone stream for everything. PyAudio fills a preallocated NumPy
+ring buffer from its callback thread, and wake-word detection, voice
+activity detection and speech-to-text each read from it through their own
+cursor. Nothing is dropped while another stage is busy, and the words right
+after the wake word are already in the buffer - no need to reopen the mic.
+
+Positions are absolute sample counts since capture started, so a stage can
+hand another stage "start reading from here".
+
+FileAudioSource feeds recorded WAV files through the same buffer, so the
+whole pipeline can be replayed offline without a microphone (replay.py).
+"""
+
+import bisect
+import threading
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from resample import Resampler, supports_rate
+
+
+def find_microphone(audio):
+    """Return (device_index, name) of the first USB mic, or (None, None)."""
+    for i in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(i)
+        if 'USB' in info['name'] and info['maxInputChannels'] > 0:
+            return i, info['name']
+    return None, None
+
+
+class RingBuffer:
+    """Fixed-size int16 sample buffer that overwrites its oldest audio"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.written = 0  # Total samples ever written (absolute position)
+        self.wanted = 0  # Furthest position any reader has waited for
+        self.closed = False  # No more audio will arrive
+        self._cond = threading.Condition()
+
+    def write(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+        with self._cond:
+            start = (self.written + n - len(samples)) % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:len(samples) - first] = samples[first:]
+            self.written += n
+            self._cond.notify_all()
+
+    def oldest(self):
+        """Oldest absolute position still held in the buffer."""
+        return max(0, self.written - self.capacity)
+
+    def read(self, start, end):
+        """Copy samples [start, end); start must be >= oldest()."""
+        with self._cond:
+            start_index = start % self.capacity
+            count = end - start
+            if start_index + count <= self.capacity:
+                return self.data[start_index:start_index + count].copy()
+            first = self.capacity - start_index
+            return np.concatenate((self.data[start_index:], self.data[:count - first]))
+
+    def wait_for(self, position, timeout=None):
+        """Block until at least `position` samples have been written."""
+        with self._cond:
+            if position > self.wanted:
+                self.wanted = position
+                self._cond.notify_all()  # Wake an on-demand writer
+            self._cond.wait_for(lambda: self.written >= position or self.closed, timeout)
+            return self.written >= position
+
+    def wait_for_demand(self):
+        """Block until a reader wants audio that hasn't been written yet."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.wanted > self.written or self.closed)
+
+    def close(self):
+        """Mark the end of the audio; waiting readers return at once."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class BufferReader:
+    """A cursor into the ring buffer for one consumer"""
+
+    def __init__(self, ring, position):
+        self.ring = ring
+        self.position = position
+        self.overruns = 0  # Times this reader fell so far behind that audio was lost
+
+    def read(self, count, timeout=1.0):
+        """
+        Return the next `count` samples, blocking until they arrive.
+
+        Returns None on timeout (e.g. the mic stopped).
+        """
+        if not self.ring.wait_for(self.position + count, timeout):
+            return None
+        oldest = self.ring.oldest()
+        if self.position < oldest:
+            self.overruns += 1
+            self.position = oldest
+        samples = self.ring.read(self.position, self.position + count)
+        self.position += count
+        return samples
+
+    def seek(self, position):
+        self.position = position
+
+    def lag(self):
+        """Samples written but not yet read by this reader."""
+        return self.ring.written - self.position
+
+
+class AudioCapture:
+    """
+    Callback-mode microphone stream feeding a RingBuffer.
+
+    Records at `rate` if the device supports it, otherwise at 48 kHz and
+    resamples inside the callback, so readers always see `rate` audio.
+    """
+
+    def __init__(self, audio, device_index=None, rate=16000, seconds=30, frames_per_buffer=512):
+        import pyaudio  # Only live capture needs PortAudio - FileAudioSource doesn't
+        self.audio = audio
+        self.device_index = device_index
+        self.rate = rate
+        self.ring = RingBuffer(rate * seconds)
+
+        self.device_rate = rate
+        if device_index is not None and not supports_rate(audio, device_index, rate):
+            self.device_rate = 48000
+        self.resampler = Resampler(self.device_rate, rate)
+        self._continue = pyaudio.paContinue
+
+        self.stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.device_rate,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=frames_per_buffer * self.device_rate // rate,
+            stream_callback=self._callback,
+        )
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        data = self.resampler.process(in_data)
+        self.ring.write(np.frombuffer(data, dtype=np.int16))
+        return (None, self._continue)
+
+    @property
+    def position(self):
+        """Absolute sample position of the newest captured audio."""
+        return self.ring.written
+
+    def reader(self, position=None):
+        """New cursor starting at `position` (default: now)."""
+        return BufferReader(self.ring, self.position if position is None else position)
+
+    def time_of(self, position):
+        """Wall-clock (time.monotonic) time a sample position was captured."""
+        return time.monotonic() - (self.position - position) / self.rate
+
+    def start(self):
+        self.stream.start_stream()
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.ring.close()
+
+
+def audio_files(paths):
+    """Expand WAV files and directories of WAV files, in sorted order."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.wav")) if path.is_dir() else [path])
+    return files
+
+
+def load_wav(path, rate=16000):
+    """Read a 16-bit WAV file as mono int16 samples at `rate`."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV files are supported")
+        channels = wav.getnchannels()
+        file_rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if file_rate != rate:
+        data = Resampler(file_rate, rate).process(samples.tobytes())
+        samples = np.frombuffer(data, dtype=np.int16)
+    return samples
+
+
+class FileAudioSource:
+    """
+    Drop-in replacement for AudioCapture that plays WAV files into the ring.
+
+    speed=1.0 feeds audio in real time, 2.0 twice as fast and so on.
+    speed=0 feeds it on demand, as fast as the slowest stage reads it, so
+    a replay is limited only by how fast the pipeline runs. Each file is
+    followed by `gap` seconds of silence so recordings end cleanly.
+    """
+
+    BLOCK = 1280  # Samples written at a time (80 ms)
+
+    def __init__(self, paths, rate=16000, speed=0.0, gap=1.5):
+        self.rate = rate
+        self.device_rate = rate
+        self.speed = speed
+        self.files = audio_files(paths)
+        if not self.files:
+            raise ValueError("No WAV files to replay")
+
+        silence = np.zeros(int(gap * rate), dtype=np.int16)
+        parts, self.starts = [], []  # starts: position where each file begins
+        total = 0
+        for path in self.files:
+            samples = load_wav(path, rate)
+            self.starts.append(total)
+            parts.extend((samples, silence))
+            total += len(samples) + len(silence)
+        self.audio = np.concatenate(parts)
+
+        # Big enough to hold everything, so a slow stage never loses audio
+        self.ring = RingBuffer(len(self.audio) + self.BLOCK)
+        self.finished = threading.Event()
+        self._written_at = []  # (position, monotonic time) per block
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+
+    def _feed(self):
+        started = time.monotonic()
+        for position in range(0, len(self.audio), self.BLOCK):
+            if self.ring.closed:
+                break
+            if self.speed:
+                delay = started + position / (self.rate * self.speed) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                self.ring.wait_for_demand()
+            self._written_at.append((position, time.monotonic()))
+            self.ring.write(self.audio[position:position + self.BLOCK])
+        self.ring.close()
+        self.finished.set()
+
+    @property
+    def position(self):
+        return self.ring.written
+
+    def reader(self, position=None):
+        return BufferReader(self.ring, self.position if position is None else position)
+
+    def time_of(self, position):
+        """When a sample position was fed in (stands in for when it was spoken)."""
+        i = bisect.bisect_right(self._written_at, (position, float("inf"))) - 1
+        if i < 0:
+            return time.monotonic()
+        block_start, written_at = self._written_at[i]
+        if self.speed:
+            return written_at + (position - block_start) / (self.rate * self.speed)
+        return written_at
+
+    def file_at(self, position):
+        """The file a sample position belongs to."""
+        return self.files[max(0, bisect.bisect_right(self.starts, position) - 1)]
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self.ring.close()
+
+
+class EnergyVAD:
+    """
+    Simple energy-based voice activity detection.
+
+    A frame counts as speech when its RMS level is well above a noise floor
+    that follows the quietest recent audio and rises only slowly.
+    """
+
+    def __init__(self, ratio=3.0, min_level=300.0):
+        self.ratio = ratio
+        self.min_level = min_level
+        self.noise_floor = None
+
+    @staticmethod
+    def level(samples):
+        if len(samples) == 0:
+            return 0.0
+        samples = samples.astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples)))
+
+    def calibrate(self, samples, block=800):
+        """
+        Set the noise floor from a stretch of background audio.
+
+        Uses the quieter blocks (50 ms at 16 kHz), so someone talking during
+        calibration doesn't make the assistant deaf.
+        """
+        levels = [self.level(samples[i:i + block]) for i in range(0, len(samples), block)]
+        self.noise_floor = float(np.percentile(levels, 20)) if levels else None
+
+    def is_speech(self, samples):
+        level = self.level(samples)
+        if self.noise_floor is None or level < self.noise_floor:
+            self.noise_floor = level
+        else:
+            self.noise_floor += 0.01 * (level - self.noise_floor)
+        return level > max(self.min_level, self.noise_floor * self.ratio)
+
+
+class Endpointer:
+    """
+    Decides when a spoken command is over, one chunk at a time.
+
+    The command ends after `trailing_silence` seconds of quiet, when
+    nothing is said for `no_speech_timeout` seconds, or at `max_seconds`.
+    Time is counted in samples, so a backlog in the buffer doesn't skew it.
+    """
+
+    def __init__(self, vad, start, rate=16000, trailing_silence=0.8, no_speech_timeout=5,
+                 max_seconds=10):
+        self.vad = vad
+        self.rate = rate
+        self.start = start
+        self.position = start
+        self.last_voice = None  # Position just after the last voiced chunk
+        self.trailing_silence = trailing_silence
+        self.no_speech_timeout = no_speech_timeout
+        self.max_seconds = max_seconds
+        self._chunks = []
+
+    def feed(self, samples, position=None):
+        """
+        Add the next chunk (ending at buffer `position`).
+
+        Returns True once the command has ended.
+        """
+        self._chunks.append(samples)
+        self.position = self.position + len(samples) if position is None else position
+        if self.vad.is_speech(samples):
+            self.last_voice = self.position
+
+        elapsed = (self.position - self.start) / self.rate
+        if elapsed >= self.max_seconds:
+            return True
+        if self.last_voice is None:
+            return elapsed >= self.no_speech_timeout
+        return (self.position - self.last_voice) / self.rate >= self.trailing_silence
+
+    def samples(self):
+        """The command up to its last voiced chunk, or None if nothing was said."""
+        if self.last_voice is None:
+            return None
+        return np.concatenate(self._chunks)[:self.last_voice - self.start]
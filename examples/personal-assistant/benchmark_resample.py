@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: NumPy Resampler vs audioop.ratecv (48 kHz -> 16 kHz)
+
+Runs both over the same synthetic recording in mic-sized chunks and reports
+speed and accuracy. The test signal is a 440 Hz tone plus a 10 kHz tone; the
+10 kHz part is above the 8 kHz limit of 16 kHz audio, so a good resampler
+removes it and a poor one folds it back in as noise ("error" below is what's
+left besides the 440 Hz tone). audioop is skipped on Python 3.13+ where it no
+longer exists.
+
+Usage:
+    python benchmark_resample.py [--seconds 60] [--chunk 4800]
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from resample import Resampler
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:
+    audioop = None
+
+MIC_RATE = 48000
+OUT_RATE = 16000
+
+
+def make_signal(seconds):
+    """A 440 Hz tone we want to keep plus a 10 kHz tone that must be filtered out."""
+    t = np.arange(int(MIC_RATE * seconds)) / MIC_RATE
+    tone = 8000 * np.sin(2 * np.pi * 440 * t)
+    too_high = 4000 * np.sin(2 * np.pi * 10000 * t)
+    return (tone + too_high).astype(np.int16), tone
+
+
+def chunks(signal, chunk):
+    data = signal.tobytes()
+    step = chunk * 2
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+def run(name, convert, pieces, seconds, reference):
+    start = time.perf_counter()
+    out = b"".join(convert(piece) for piece in pieces)
+    elapsed = time.perf_counter() - start
+
+    result = np.frombuffer(out, dtype=np.int16).astype(np.float64)
+    n = min(len(result), len(reference))
+    # Compare against the ideal tone, allowing for the filter's small delay
+    best = min(
+        np.sqrt(np.mean((result[shift:n] - reference[:n - shift]) ** 2))
+        for shift in range(0, 16)
+    )
+    per_chunk_us = elapsed / len(pieces) * 1e6
+    print(f"{name:<28} {elapsed * 1000:8.1f} ms total  {per_chunk_us:8.1f} us/chunk  "
+          f"{seconds / elapsed:8.0f}x realtime  error {best:7.1f} RMS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--chunk", type=int, default=4800, help="frames per mic read")
+    args = parser.parse_args()
+
+    signal, tone = make_signal(args.seconds)
+    pieces = chunks(signal, args.chunk)
+    reference = tone[::MIC_RATE // OUT_RATE]
+
+    print(f"{args.seconds:.0f}s of 48 kHz audio in {len(pieces)} chunks of {args.chunk} frames\n")
+
+    resampler = Resampler(MIC_RATE, OUT_RATE)
+    run("numpy polyphase (stateful)", resampler.process, pieces, args.seconds, reference)
+
+    if audioop is None:
+        print("audioop not available (Python 3.13+) - skipped")
+        return
+
+    # What simple_assistant.py used to do: new state for every chunk
+    run("audioop.ratecv (state=None)",
+        lambda d: audioop.ratecv(d, 2, 1, MIC_RATE, OUT_RATE, None)[0],
+        pieces, args.seconds, reference)
+
+    state = [None]
+
+    def ratecv_stateful(data):
+        out, state[0] = audioop.ratecv(data, 2, 1, MIC_RATE, OUT_RATE, state[0])
+        return out
+
+    run("audioop.ratecv (stateful)", ratecv_stateful, pieces, args.seconds, reference)
+
+
+if __name__ == "__main__":
+    main()
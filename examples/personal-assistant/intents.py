@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+PiAI Intent Router
+
+Simple commands don't need a language model. "What time is it?" answered
+by Ollama takes seconds on a Pi; answered here it takes microseconds, and
+the answer can't be wrong.
+
+IntentRouter matches the whole (normalized) command against compiled
+regular expressions. Only a full match counts, so "what time is it in
+Tokyo?" is not mistaken for "what time is it?" and goes to the LLM, like
+everything else the router doesn't know.
+
+Built in: time, date, weather, timers and "say that again". More intents
+can be added in code:
+
+    @router.intent("line_status", r"(what is|what's) the status of line (?P<line>\\d+)")
+    def line_status(match):
+        return f"Line {match['line']} is running."
+
+or from plugin modules listed in the config - each one has a
+`register(router, assistant)` function that does the same.
+
+Try it without an assistant:
+
+    python intents.py "what time is it" "set a timer for 5 minutes" "tell me a joke"
+"""
+
+import re
+import time
+import argparse
+import importlib
+import threading
+from datetime import datetime
+
+# Words that don't change what was asked
+_FILLER = re.compile(r"^((hey|ok|okay|so|um|uh|please|can you|could you|would you)\s+)+|(\s+please)+$")
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
+    "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40,
+    "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+TENS = {"twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"}
+UNITS = {"one", "two", "three", "four", "five", "six", "seven", "eight", "nine"}
+UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def normalize(text):
+    """Lower case, no punctuation, no leading 'hey'/'please' - what patterns match against."""
+    text = re.sub(r"[^\w\s':]", " ", text.lower())
+    text = " ".join(text.split())
+    return _FILLER.sub("", text).strip()
+
+
+def parse_number(words):
+    """'5', 'five', 'twenty five' or 'a' -> int, or None."""
+    words = words.replace("-", " ").split()
+    if len(words) == 1:
+        return int(words[0]) if words[0].isdigit() else NUMBER_WORDS.get(words[0])
+    if len(words) == 2 and words[0] in TENS and words[1] in UNITS:  # Not 'five five'
+        return NUMBER_WORDS[words[0]] + NUMBER_WORDS[words[1]]
+    return None
+
+
+def describe(seconds):
+    """120 -> '2 minutes', 90 -> '1 minute 30 seconds'."""
+    seconds = int(round(seconds))
+    parts = []
+    for unit, size in (("hour", 3600), ("minute", 60), ("second", 1)):
+        count, seconds = divmod(seconds, size)
+        if count:
+            parts.append(f"{count} {unit}{'s' if count != 1 else ''}")
+    return " ".join(parts) or "0 seconds"
+
+
+class IntentRouter:
+    """Answers known commands directly; everything else falls through to the LLM"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.intents = []  # (name, compiled patterns, handler), checked in order
+        self.last_answer = None  # For "say that again"
+
+    def add(self, name, patterns, handler):
+        """
+        Answer commands fully matching any of `patterns` with handler(match).
+
+        The handler returns the reply, or None to let the LLM answer after all.
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.intents.append((name, [re.compile(p) for p in patterns], handler))
+
+    def intent(self, name, *patterns):
+        """Decorator version of add()."""
+        def register(handler):
+            self.add(name, patterns, handler)
+            return handler
+        return register
+
+    def route(self, text):
+        """Returns (intent name, reply), or None if the LLM should answer."""
+        command = normalize(text)
+        for name, patterns, handler in self.intents:
+            for pattern in patterns:
+                match = pattern.fullmatch(command)
+                if match is None:
+                    continue
+                reply = handler(match)
+                if reply is None:
+                    break  # Handler passed - try the other intents
+                if self.metrics:
+                    self.metrics.increment("intent_fast_path_total", intent=name)
+                self.remember(reply)
+                return name, reply
+        if self.metrics:
+            self.metrics.increment("intent_fallthrough_total")
+        return None
+
+    def remember(self, answer):
+        """Keep the last thing said, for the repeat intent."""
+        if answer and answer.strip():
+            self.last_answer = answer.strip()
+
+    def load_plugins(self, modules, assistant):
+        """Import each module and call its register(router, assistant)."""
+        for module_name in modules:
+            try:
+                importlib.import_module(module_name).register(self, assistant)
+                print(f"[INTENT] Loaded {module_name}")
+            except Exception as e:
+                print(f"[WARN] Intent plugin {module_name} not loaded: {e}")
+
+
+class Timers:
+    """Countdown timers; on_done(text) is called from a timer thread when one ends"""
+
+    def __init__(self, on_done):
+        self.on_done = on_done
+        self._timers = {}  # threading.Timer -> (ends_at, label)
+        self._lock = threading.Lock()
+
+    def start(self, seconds):
+        """Start a timer; returns its description, e.g. '5 minutes'."""
+        label = describe(seconds)
+        timer = threading.Timer(seconds, lambda: self._finished(timer, label))
+        timer.daemon = True
+        with self._lock:
+            self._timers[timer] = (time.monotonic() + seconds, label)
+        timer.start()
+        return label
+
+    def remaining(self):
+        """[(label, seconds left)], soonest first."""
+        now = time.monotonic()
+        with self._lock:
+            timers = sorted(self._timers.values())
+        return [(label, ends_at - now) for ends_at, label in timers]
+
+    def cancel(self):
+        """Cancel every timer; returns how many there were."""
+        with self._lock:
+            timers, self._timers = list(self._timers), {}
+        for timer in timers:
+            timer.cancel()
+        return len(timers)
+
+    def _finished(self, timer, label):
+        with self._lock:
+            if self._timers.pop(timer, None) is None:
+                return  # Cancelled just as it fired
+        self.on_done(f"Your timer for {label} is done.")
+
+
+def add_builtin_intents(router, weather=None, timers=None):
+    """Time, date and repeat; weather and timers if their sources are given."""
+
+    @router.intent("time", r"what time is it( now| right now)?", r"what time",
+                   r"(what is|what's|whats) the time( now| right now)?", r"(tell me )?the time")
+    def tell_time(match):
+        return f"It's {datetime.now().strftime('%I:%M %p').lstrip('0')}."
+
+    @router.intent("date", r"(what is|what's|whats) (the date|today's date|todays date)( today)?",
+                   r"what day is (it|today)( today)?", r"(what is|what's|whats) (the )?day today",
+                   r"(tell me )?the date", r"what's today")
+    def tell_date(match):
+        today = datetime.now()
+        return f"Today is {today.strftime('%A, %B')} {today.day}."
+
+    @router.intent("repeat", r"(repeat|say) (that|it)( again)?", r"repeat", r"say again",
+                   r"what did you (just )?say", r"come again", r"pardon( me)?", r"sorry what")
+    def repeat(match):
+        return router.last_answer or "I haven't said anything yet."
+
+    if weather is not None:
+        @router.intent("weather", r"(the )?weather( today| now)?",
+                       r"(what is|what's|whats|how is|how's|hows) the weather( like)?( today| now| outside| right now)?",
+                       r"(what is|what's|whats) it like outside")
+        def tell_weather(match):
+            if not weather.location:
+                return "I don't know where you are. Add your location to the config."
+            return weather.get().strip() or f"I don't have a recent weather report for {weather.location}."
+
+    if timers is not None:
+        number = r"(?P<number>\d+|[a-z]+(?: [a-z]+)?)"
+        unit = r"(?P<unit>second|minute|hour)s?"
+
+        @router.intent("timer_set", rf"(set )?(a |the )?timer (for )?{number} {unit}",
+                       rf"(set )?(a |an )?{number}[ -]{unit} timer", rf"(start )?(a )?timer for {number} {unit}")
+        def set_timer(match):
+            count = parse_number(match["number"])
+            if not count:
+                return None  # Not a number we understand - let the LLM deal with it
+            label = timers.start(count * UNIT_SECONDS[match["unit"]])
+            return f"Timer set for {label}."
+
+        @router.intent("timer_cancel", r"(cancel|stop|delete|clear) (the |my |all )?(timer|timers)")
+        def cancel_timer(match):
+            count = timers.cancel()
+            return "Timer cancelled." if count == 1 else f"{count} timers cancelled." if count else \
+                "There's no timer running."
+
+        @router.intent("timer_check", r"how (much time|long) is left( on the timer| on my timer)?",
+                       r"how (much time|long) left( on the timer| on my timer)?",
+                       r"(check|how's|hows|how is) (the |my )?timer")
+        def check_timer(match):
+            running = timers.remaining()
+            if not running:
+                return "There's no timer running."
+            return " ".join(f"{describe(left)} left on the timer for {label}." for label, left in running)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how commands would be routed")
+    parser.add_argument("commands", nargs="+")
+    args = parser.parse_args()
+
+    router = IntentRouter()
+    add_builtin_intents(router, timers=Timers(print))
+    for command in args.commands:
+        start = time.perf_counter()
+        routed = router.route(command)
+        elapsed = (time.perf_counter() - start) * 1e6
+        if routed:
+            print(f"{command!r} -> {routed[0]} ({elapsed:.0f} us): {routed[1]}")
+        else:
+            print(f"{command!r} -> LLM ({elapsed:.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+PiAI Prompt Builder
+
+Ollama (llama.cpp underneath) keeps the KV cache of the previous prompt
+and only prefills the tokens after the point where the new prompt starts
+to differ. Anything that changes between requests - the time, the
+weather - therefore has to come after everything that stays the same,
+or the whole system prompt is prefilled again on every question.
+
+PromptBuilder keeps the system prompt fixed for the whole run and sends it
+in Ollama's `system` field. Volatile facts go after the user's words, at
+the very end of the prompt. prime() prefills the fixed part at start-up,
+so even the first question finds it cached.
+
+Ollama reports the prompt tokens it actually evaluated (prompt_eval_count),
+and the `context` it returns holds every prompt and answer token, so the
+difference - tokens served from the cache - goes into the metrics.
+"""
+
+
+class PromptBuilder:
+    """Fixed system prompt first, per-request facts last"""
+
+    def __init__(self, system):
+        self.system = system  # Never changes while running - that's the cached prefix
+        self.prefix_tokens = None  # Tokens in the system prompt, measured by prime()
+
+    def prompt(self, user_input, facts=()):
+        """The user turn, with volatile facts after it."""
+        facts = [fact for fact in facts if fact]
+        if not facts:
+            return user_input
+        return f"{user_input}\n\n({' '.join(facts)})"
+
+    def prime(self, client, model):
+        """
+        Prefill the system prompt once (e.g. after loading the model).
+
+        Ollama ignores requests with an empty prompt, so this asks for a
+        single token. Returns the number of prompt tokens evaluated.
+        """
+        result = client.generate({
+            "model": model,
+            "system": self.system,
+            "prompt": "Hello",
+            "options": {"num_predict": 1},
+        })
+        self.prefix_tokens = result.get("prompt_eval_count")
+        return self.prefix_tokens
+
+    @staticmethod
+    def record(metrics, final, timings=None):
+        """Record prompt-cache numbers from the last chunk of an Ollama answer."""
+        evaluated = final.get("prompt_eval_count")
+        if evaluated is None:
+            return
+        metrics.increment("llm_prompt_tokens_evaluated_total", evaluated)
+        metrics.histogram("llm_prompt_tokens_evaluated", [16 * 2 ** i for i in range(8)]).observe(evaluated)
+
+        context = final.get("context")
+        if context:
+            total = len(context) - final.get("eval_count", 0)
+            metrics.increment("llm_prompt_tokens_total", total)
+            metrics.increment("llm_prompt_tokens_cached_total", max(0, total - evaluated))
+
+        if timings is not None and final.get("prompt_eval_duration"):
+            timings["llm_prefill"] = final["prompt_eval_duration"] / 1e9
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+PiAI Replay Harness
+
+Plays recorded WAV files through the real assistant pipeline - wake word,
+command capture, speech-to-text, LLM streaming, text-to-speech - without a
+microphone or speaker, and reports latency percentiles for every stage.
+Use it to compare settings and code changes, or to catch regressions in CI.
+
+By default audio is fed as fast as the pipeline can take it, Ollama is
+replaced by a local stand-in with a fixed time to first token and token
+rate, and playback is skipped. Everything else is the real thing unless
+you swap it for a stand-in too.
+
+Usage:
+    python replay.py recordings/                        # LocalAssistant
+    python replay.py recordings/ --assistant simple     # Vosk, no wake word
+    python replay.py recordings/ --ollama http://localhost:11434
+    python replay.py recordings/ --no-wake --stt transcripts --tts stand-in \\
+        --json results.json --max llm_first_token=0.5
+    python replay.py recordings/ --async --speed 1     # asyncio core, overlapping turns
+
+Recordings are 16-bit WAV files (any sample rate, mono or stereo) with one
+command each - "hey jarvis, what time is it" - starting with a moment of
+silence. For --stt transcripts put the expected text next to each file
+(what-time.wav -> what-time.txt).
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+from pathlib import Path
+
+import numpy as np
+
+# Shared helpers live one level up in examples/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fake_ollama import FakeOllama, DEFAULT_REPLY
+from audio_capture import FileAudioSource
+from tts import Audio, NullPlayer, TextToSpeech
+
+STAGES = [
+    ("wake", "Wake word detected after it was said"),
+    ("capture", "Length of the recorded command (audio)"),
+    ("stt", "Speech-to-text"),
+    ("llm_prefill", "LLM prompt evaluation"),
+    ("llm_first_token", "LLM time to first token"),
+    ("llm_total", "LLM full answer"),
+    ("tts_first_sentence", "Synthesizing the first sentence"),
+    ("speech_start", "End of speech to first audio"),
+]
+
+
+class TranscriptSTT:
+    """Stand-in for WhisperSTT that returns the text file next to each recording"""
+
+    def __init__(self, source, rtf=0.0):
+        self.source = source
+        self.rtf = rtf  # Simulated compute: seconds per second of audio
+        self.locate = lambda: 0  # Set once the assistant exists: position just after the command
+
+    def transcribe(self, samples):
+        time.sleep(len(samples) / self.source.rate * self.rtf)
+        transcript = self.source.file_at(self.locate() - 1).with_suffix(".txt")
+        return transcript.read_text().strip() if transcript.exists() else ""
+
+
+class StandInEngine:
+    """Stand-in TTS engine: silence as long as the text would take to say"""
+
+    name = "stand-in"
+
+    def __init__(self, rtf=0.0, chars_per_second=15, rate=16000):
+        self.rtf = rtf  # Simulated synthesis time per second of audio
+        self.chars_per_second = chars_per_second
+        self.rate = rate
+
+    def synthesize(self, text):
+        seconds = len(text) / self.chars_per_second
+        time.sleep(seconds * self.rtf)
+        return Audio(bytes(int(seconds * self.rate) * 2), self.rate)
+
+    def close(self):
+        pass
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {
+        "n": len(values),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def build_assistant(args, source, ollama_url, config_file):
+    tts = TextToSpeech(
+        use_piper=args.tts == "piper",
+        engine=StandInEngine(args.tts_rtf) if args.tts == "stand-in" else None,
+        player=NullPlayer(args.speed),
+    )
+
+    if args.assistant == "simple":
+        from simple_assistant import SimpleAssistant
+        return SimpleAssistant(capture=source, tts=tts, ollama_url=ollama_url, config_file=config_file)
+
+    from assistant import LocalAssistant
+    stt = TranscriptSTT(source, args.stt_rtf) if args.stt == "transcripts" else None
+    assistant = LocalAssistant(capture=source, stt=stt, tts=tts, ollama_url=ollama_url,
+                               config_file=config_file)
+    if stt:
+        stt.locate = lambda: assistant.wake_reader.position
+    return assistant
+
+
+def replay(assistant, source, args):
+    """Run every recording through the assistant; returns one record per command."""
+    interactions = []
+
+    def record(text, position):
+        interactions.append({
+            "file": source.file_at(position - 1).name,
+            "text": text,
+            "timings": dict(assistant.timings),
+        })
+
+    if args.assistant == "simple":
+        while True:
+            text = assistant.handle_command()
+            if text:
+                record(text, source.position)
+            elif source.finished.is_set():
+                return interactions
+
+    use_wake = not args.no_wake and assistant.wake_engine is not None
+    if not args.no_wake and not use_wake:
+        print("[WARN] Wake word engine unavailable - treating each recording as a command")
+
+    from wake_word import FRAME_SAMPLES
+    while True:
+        if use_wake:
+            keyword = assistant.listen_for_wake_word()
+            if not keyword:
+                if source.finished.is_set() and assistant.wake_reader.lag() < FRAME_SAMPLES:
+                    return interactions
+                continue
+            text = assistant.handle_wake(keyword)
+        else:
+            assistant.timings = {}
+            text = assistant.handle_wake()
+            if not text and source.finished.is_set():
+                return interactions
+        if text:
+            record(text, assistant.wake_reader.position)
+        assistant.speech.wait()  # One interaction at a time
+
+
+def replay_async(assistant, source, args):
+    """
+    Run the recordings through the asyncio core instead of the sequential loop.
+
+    Commands are queued rather than interrupting the answer before them,
+    so every recording gets answered.
+    """
+    if args.assistant != "simple" and (args.no_wake or assistant.wake_engine is None):
+        print("[WARN] The asyncio core needs the wake word engine - using the sequential loop")
+        return replay(assistant, source, args)
+
+    from async_core import PushToTalkCore, WakeWordCore
+    interactions = []
+
+    def record(turn):
+        if turn.text:
+            interactions.append({
+                "file": source.file_at(turn.end - 1).name,
+                "text": turn.text,
+                "timings": dict(turn.timings),
+            })
+
+    if args.assistant == "simple":
+        core = PushToTalkCore(assistant, continuous=True, barge_in=False, on_turn=record)
+    else:
+        core = WakeWordCore(assistant, barge_in=False, on_turn=record)
+        if isinstance(assistant.stt, TranscriptSTT):
+            assistant.stt.locate = lambda: core.transcribing.end
+    core.run()
+    return interactions
+
+
+def report(interactions, files, wall, audio_seconds, wake_stats=None, metrics=None):
+    """Print a percentile table; returns the stage summaries."""
+    stages = {}
+    print(f"\n{len(files)} recordings, {len(interactions)} commands heard, "
+          f"{audio_seconds:.1f}s of audio in {wall:.1f}s ({audio_seconds / wall:.1f}x real time)\n")
+    print(f"{'stage':<18}{'n':>4}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}   (ms)")
+    for stage, description in STAGES:
+        values = [i["timings"][stage] for i in interactions if stage in i["timings"]]
+        if not values:
+            continue
+        stages[stage] = summary = percentiles(values)
+        print(f"{stage:<18}{summary['n']:>4}" + "".join(
+            f"{summary[k] * 1000:>9.0f}" for k in ("p50", "p90", "p95", "p99", "max"))
+            + f"   {description}")
+    if wake_stats and wake_stats["frames"]:
+        time_per_frame = wake_stats["inference_time"]
+        print(f"\nWake word: {wake_stats['frames']} frames, {wake_stats['skipped']} skipped by "
+              f"energy gate, inference p50 {time_per_frame['p50'] * 1000:.1f} ms "
+              f"p95 {time_per_frame['p95'] * 1000:.1f} ms")
+    counters = metrics["counters"] if metrics else {}
+    if counters.get("llm_prompt_tokens_total"):
+        cached, total = counters.get("llm_prompt_tokens_cached_total", 0), counters["llm_prompt_tokens_total"]
+        print(f"\nPrompt cache: {cached:.0f} of {total:.0f} prompt tokens reused ({cached / total:.0%})")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV recordings through the assistant pipeline")
+    parser.add_argument("paths", nargs="+", help="WAV files or directories of them")
+    parser.add_argument("--assistant", choices=["local", "simple"], default="local")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Audio speed: 1 = real time, 0 = as fast as possible (default)")
+    parser.add_argument("--no-wake", action="store_true", help="Each recording is a command, no wake word")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use the asyncio core (listening overlaps answering)")
+    parser.add_argument("--stt", choices=["whisper", "transcripts"], default="whisper")
+    parser.add_argument("--stt-rtf", type=float, default=0.0, help="Simulated STT time for --stt transcripts")
+    parser.add_argument("--tts", choices=["piper", "espeak", "stand-in"], default="piper")
+    parser.add_argument("--tts-rtf", type=float, default=0.0, help="Simulated TTS time for --tts stand-in")
+    parser.add_argument("--ollama", help="Use this Ollama server instead of the stand-in")
+    parser.add_argument("--first-token", type=float, default=0.3, help="Stand-in time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=10.0, help="Stand-in generation speed")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0.0,
+                        help="Stand-in prompt evaluation speed (default: instant)")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Stand-in answer")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--max", action="append", default=[], metavar="STAGE=SECONDS",
+                        help="Fail (exit 1) if a stage's p95 is above this")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Hide the assistant's own output")
+    args = parser.parse_args()
+
+    limits = {}
+    for item in args.max:
+        stage, _, seconds = item.partition("=")
+        limits[stage] = float(seconds)
+
+    source = FileAudioSource(args.paths, speed=args.speed)
+    server = None
+    if not args.ollama:
+        server = FakeOllama(replies=[args.reply], first_token_delay=args.first_token,
+                            tokens_per_second=args.tokens_per_sec,
+                            prefill_tokens_per_second=args.prefill_tokens_per_sec).start()
+
+    output = io.StringIO() if args.quiet else sys.stdout
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(output):
+        # A throwaway config so replays never touch your real settings,
+        # with the metrics endpoint off so replays can run side by side
+        config_file = Path(tmp) / "config.json"
+        config_file.write_text(json.dumps({"metrics": {"port": None}}))
+        assistant = build_assistant(args, source, args.ollama or server.url, config_file)
+        started = time.monotonic()
+        try:
+            if args.use_async:
+                interactions = replay_async(assistant, source, args)
+            else:
+                interactions = replay(assistant, source, args)
+        finally:
+            wall = time.monotonic() - started
+            wake_engine = getattr(assistant, "wake_engine", None)
+            wake_stats = wake_engine.stats() if wake_engine else None
+            metrics = assistant.metrics.snapshot()
+            assistant.cleanup()
+            if server:
+                server.stop()
+
+    stages = report(interactions, source.files, wall, len(source.audio) / source.rate, wake_stats, metrics)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"stages": stages, "interactions": interactions, "wake": wake_stats,
+                       "metrics": metrics, "wall_seconds": wall}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    failed = [f"{stage} p95 {stages[stage]['p95']:.3f}s > {limit:.3f}s"
+              for stage, limit in limits.items() if stage in stages and stages[stage]["p95"] > limit]
+    missing = [stage for stage in limits if stage not in stages]
+    for problem in failed + [f"{stage}: no measurements" for stage in missing]:
+        print(f"[FAIL] {problem}")
+    sys.exit(1 if failed or missing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+PiAI Audio Resampling
+
+NumPy replacement for audioop.ratecv (audioop was removed in Python 3.13).
+
+The mic usually runs at 48 kHz and Vosk/Whisper want 16 kHz - an exact 3:1
+ratio - so we low-pass filter and keep every third sample (polyphase
+decimation). Other rates (44.1 kHz) are low-pass filtered the same way and
+then linearly interpolated. The filter history is carried from one chunk
+to the next, so there are no clicks at chunk boundaries, and input is read
+through np.frombuffer views without copying.
+"""
+
+import numpy as np
+
+
+def lowpass_taps(num_taps, cutoff):
+    """
+    Windowed-sinc low-pass FIR filter.
+
+    cutoff is in cycles per input sample (0.5 = Nyquist). Taps sum to 1.
+    """
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, 8.0)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class Resampler:
+    """
+    Streaming 16-bit mono resampler that keeps state across chunks.
+
+    - in_rate == out_rate: passthrough
+    - in_rate an exact multiple of out_rate (48k -> 16k): polyphase FIR
+      decimation
+    - anything else (44.1k -> 16k): the same low-pass FIR at the input
+      rate, so nothing above the new Nyquist frequency folds back into the
+      speech band, then linear interpolation with a carried fractional
+      position
+    """
+
+    def __init__(self, in_rate, out_rate, taps_per_phase=16):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+
+        if in_rate == out_rate:
+            self.mode = "passthrough"
+        elif in_rate % out_rate == 0:
+            self.mode = "decimate"
+            self.factor = in_rate // out_rate
+            num_taps = taps_per_phase * self.factor
+            # Cut off a little below the new Nyquist frequency
+            taps = lowpass_taps(num_taps, 0.45 / self.factor)
+            self.taps = taps[::-1].copy()  # Reversed for a dot product
+            self.history = np.zeros(num_taps - 1, dtype=np.float32)
+        else:
+            self.mode = "interpolate"
+            self.step = in_rate / out_rate
+            num_taps = taps_per_phase * int(np.ceil(self.step))
+            self.taps = lowpass_taps(num_taps, 0.45 * out_rate / in_rate)[::-1].copy()
+            self.history = np.zeros(num_taps - 1, dtype=np.float32)
+            self.position = 1.0  # Next output time, in input samples (0 = previous chunk)
+            self.last = np.zeros(1, dtype=np.float32)
+
+    def reset(self):
+        """Forget filter state (e.g. between unrelated recordings)."""
+        if self.mode == "decimate":
+            self.history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        elif self.mode == "interpolate":
+            self.history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+            self.position = 1.0
+            self.last[:] = 0
+
+    def process(self, data):
+        """Resample a chunk of int16 PCM bytes; returns int16 PCM bytes."""
+        if self.mode == "passthrough":
+            return data
+        samples = np.frombuffer(data, dtype=np.int16)  # Zero-copy view
+        if self.mode == "decimate":
+            out = self._decimate(samples)
+        else:
+            out = self._interpolate(samples)
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
+
+    def _decimate(self, samples):
+        buffer = np.concatenate((self.history, samples.astype(np.float32)))
+        num_taps = len(self.taps)
+        if len(buffer) < num_taps:
+            self.history = buffer
+            return np.zeros(0, dtype=np.float32)
+
+        # Only compute the outputs we keep: every factor-th window
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, num_taps)[::self.factor]
+        out = windows @ self.taps
+
+        # Keep everything the next window still needs
+        self.history = buffer[len(windows) * self.factor:]
+        return out
+
+    def _lowpass(self, samples):
+        """Filter at the input rate (every window, unlike _decimate)."""
+        buffer = np.concatenate((self.history, samples.astype(np.float32)))
+        num_taps = len(self.taps)
+        if len(buffer) < num_taps:
+            self.history = buffer
+            return np.zeros(0, dtype=np.float32)
+        out = np.lib.stride_tricks.sliding_window_view(buffer, num_taps) @ self.taps
+        self.history = buffer[len(out):]
+        return out
+
+    def _interpolate(self, samples):
+        filtered = self._lowpass(samples)
+        if not len(filtered):
+            return filtered
+        buffer = np.concatenate((self.last, filtered))
+        # Sample 0 of buffer is the last sample of the previous chunk
+        times = np.arange(self.position, len(buffer) - 1, self.step)
+        out = np.interp(times, np.arange(len(buffer)), buffer)
+        self.position = (times[-1] + self.step if len(times) else self.position) - (len(buffer) - 1)
+        self.last = buffer[-1:].copy()
+        return out
+
+
+def supports_rate(audio, device_index, rate):
+    """Return True if a PyAudio input device can record 16-bit mono at rate."""
+    import pyaudio
+    try:
+        return bool(audio.is_format_supported(
+            rate,
+            input_device=device_index,
+            input_channels=1,
+            input_format=pyaudio.paInt16,
+        ))
+    except ValueError:
+        return False
@@ -8,7 +8,9 @@ Libraries:
 - Ollama: Local LLM (already working)
 - eSpeak: TTS (GPL, already installed)
 
-No wake word complexity - just press Enter to talk.
+No wake word complexity - just press Enter to talk. Recording stops by
+itself shortly after you stop speaking, and pressing Enter while it
+answers interrupts it.
 100% local, no subscriptions, truly free.
 """
 
@@ -16,13 +18,25 @@ import os
 import sys
 import json
 import subprocess
-import pyaudio
-import requests
+import time
 import wave
-import audioop
 from datetime import datetime
 from pathlib import Path
 
+# Shared helpers live one level up in examples/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ollama_client import OllamaClient, DEFAULT_KEEP_ALIVE, DEFAULT_URL
+from tts import SentenceSplitter, SpeechPipeline, TextToSpeech, TTSCache
+from audio_capture import AudioCapture, EnergyVAD, find_microphone
+from metrics import JsonlWriter, Metrics, MetricsServer, add_system_gauges
+from weather import WeatherCache
+from prompts import PromptBuilder
+from intents import IntentRouter, Timers, add_builtin_intents
+from response_cache import ResponseCache, scope_key
+from async_core import PushToTalkCore
+
+SAMPLE_RATE = 16000  # Vosk model rate
+
 try:
     from vosk import Model, KaldiRecognizer
 except ImportError:
@@ -36,19 +50,41 @@ except ImportError:
 class SimpleAssistant:
     """A voice assistant that actually works on Pi 5"""
     
-    def __init__(self):
+    # Fixed replies - synthesized once at startup and cached
+    NO_MODEL_REPLY = "I need an AI model to respond. Please download phi3:mini."
+    NOT_HEARD_REPLY = "Sorry, I didn't hear anything."
+    
+    def __init__(self, capture=None, tts=None, ollama_url=DEFAULT_URL, config_file=None):
+        """
+        Components are created from the config unless passed in - the
+        replay harness passes a FileAudioSource instead of the microphone.
+        """
         self.user_name = "Doug"
         self.assistant_name = "PiAI"
         
         # Load config
-        self.config_file = Path.home() / ".piai_simple_config.json"
+        self.config_file = Path(config_file) if config_file else Path.home() / ".piai_simple_config.json"
         self.load_config()
+        self.prompts = PromptBuilder(self.system_prompt())
         
         print(f"\nInitializing {self.assistant_name} for {self.user_name}...")
         
         # Initialize components
-        self.init_vosk()
+        self.init_metrics()
+        self.init_weather()
+        self.init_intents()
+        self.init_vosk(capture)
+        self.ollama = OllamaClient(ollama_url, read_timeout=30, keep_alive=self.keep_alive)
         self.init_ollama()
+        self.init_response_cache()
+        self.tts = tts or TextToSpeech(espeak_wpm=150, use_piper=False, cache=TTSCache())
+        self.tts.prewarm([self.NO_MODEL_REPLY, self.NOT_HEARD_REPLY])
+        self.speech = SpeechPipeline(self.tts, metrics=self.metrics)
+        self.speech_ended_at = None
+        self.timings = {}  # Seconds per stage for the current interaction
+        if self.tts.cache:
+            self.metrics.gauge("tts_cache_hits", lambda: self.tts.cache.hits)
+            self.metrics.gauge("tts_cache_misses", lambda: self.tts.cache.misses)
         
         print(f"[OK] {self.assistant_name} ready!\n")
     
@@ -59,16 +95,113 @@ class SimpleAssistant:
                 config = json.load(f)
                 self.user_name = config.get("user_name", "Doug")
                 self.location = config.get("location", "")
+                self.keep_alive = config.get("keep_alive", DEFAULT_KEEP_ALIVE)
+                self.listen_config = config.get("listen", {})
+                self.metrics_config = config.get("metrics", {})
+                self.weather_config = config.get("weather", {})
+                self.pipeline_config = config.get("pipeline", {})
+                self.intents_config = config.get("intents", {})
+                self.cache_config = config.get("response_cache", {})
         else:
             config = {
                 "user_name": "Doug",
-                "location": ""  # Add your city for weather
+                "location": "",  # Add your city for weather
+                "keep_alive": DEFAULT_KEEP_ALIVE,  # How long Ollama keeps the model loaded
+                "listen": {
+                    "trailing_silence": 0.6,  # Seconds of quiet that end a command
+                    "no_speech_timeout": 5,   # Give up if nothing is said
+                    "max_seconds": 10         # Hard limit per command
+                },
+                "pipeline": {
+                    "async": True,     # Listen while thinking and speaking
+                    "barge_in": True,  # Enter interrupts the answer
+                    "queue_size": 2    # Commands waiting to be answered
+                },
+                "metrics": {
+                    "port": 9102,         # http://127.0.0.1:9102/metrics (null = off)
+                    "jsonl": None,        # e.g. "~/.cache/piai/simple-metrics.jsonl"
+                    "flush_interval": 60  # Seconds between JSONL writes
+                },
+                "weather": {
+                    "ttl": 900,         # Seconds before the report is refreshed in the background
+                    "max_stale": 21600  # Older reports (e.g. offline for hours) aren't read out
+                },
+                "intents": {
+                    "enabled": True,  # Answer time, date, weather, timers and "repeat" without the LLM
+                    "plugins": []     # Modules with register(router, assistant) for your own commands
+                },
+                "response_cache": {
+                    "enabled": False,          # Answer repeated questions from ~/.cache/piai/responses.sqlite
+                    "ttl": 86400,              # Seconds before a cached answer is asked again
+                    "embedding_model": None,   # e.g. "nomic-embed-text" to match similar questions too
+                    "similarity": 0.92         # How similar (cosine) a question must be to reuse an answer
+                }
             }
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
             self.location = ""
+            self.keep_alive = DEFAULT_KEEP_ALIVE
+            self.listen_config = config["listen"]
+            self.metrics_config = config["metrics"]
+            self.weather_config = config["weather"]
+            self.pipeline_config = config["pipeline"]
+            self.intents_config = config["intents"]
+            self.cache_config = config["response_cache"]
+        
+        self.trailing_silence = self.listen_config.get("trailing_silence", 0.6)
+        self.no_speech_timeout = self.listen_config.get("no_speech_timeout", 5)
+        self.max_seconds = self.listen_config.get("max_seconds", 10)
+    
+    def init_metrics(self):
+        """Per-stage timings, served on localhost and/or written to a JSONL file"""
+        self.metrics = Metrics()
+        add_system_gauges(self.metrics)
+        self.metrics_server = None
+        self.metrics_writer = None
+        
+        port = self.metrics_config.get("port", 9102)
+        if port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port=port).start()
+                print(f"[METRICS] Serving on {self.metrics_server.url}")
+            except OSError as e:
+                print(f"[WARN] Metrics endpoint not started: {e}")
+        
+        path = self.metrics_config.get("jsonl")
+        if path:
+            interval = self.metrics_config.get("flush_interval", 60)
+            self.metrics_writer = JsonlWriter(self.metrics, path, interval).start()
+            print(f"[METRICS] Writing interactions to {self.metrics_writer.path}")
+    
+    def init_weather(self):
+        """Weather is fetched in the background, so greetings never wait for it"""
+        self.weather = WeatherCache.from_config(self.location, self.weather_config).start()
+        self.metrics.gauge("weather_age_seconds", self.weather.age)
+    
+    def init_response_cache(self):
+        """Opt-in: repeated questions are answered from SQLite instead of the LLM"""
+        self.responses = None
+        if not self.cache_config.get("enabled", False):
+            return
+        embedding_model = self.cache_config.get("embedding_model")
+        embed = (lambda text: self.ollama.embed(embedding_model, text)) if embedding_model else None
+        self.responses = ResponseCache(scope=scope_key(self.model, self.prompts.system),
+                                       ttl=self.cache_config.get("ttl", 86400), embed=embed,
+                                       similarity=self.cache_config.get("similarity", 0.92),
+                                       metrics=self.metrics)
+        print(f"[CACHE] Answering repeated questions from {self.responses.path}")
     
-    def init_vosk(self):
+    def init_intents(self):
+        """Simple commands are answered locally in microseconds instead of by the LLM"""
+        self.timers = Timers(self.speak)
+        self.intents = None
+        if not self.intents_config.get("enabled", True):
+            return
+        self.intents = IntentRouter(self.metrics)
+        add_builtin_intents(self.intents, weather=self.weather, timers=self.timers)
+        self.intents.load_plugins(self.intents_config.get("plugins", []), self)
+    
+    def init_vosk(self, capture=None):
         """Initialize Vosk speech recognition"""
         model_path = Path("vosk-model-small-en-us-0.15")
         
@@ -82,173 +215,323 @@ class SimpleAssistant:
         
         print("[VOSK] Loading speech model...")
         self.vosk_model = Model(str(model_path))
-        self.recognizer = KaldiRecognizer(self.vosk_model, 16000)
+        self.recognizer = KaldiRecognizer(self.vosk_model, SAMPLE_RATE)
+        self.vad = EnergyVAD()  # Noise floor is learned across turns
+        
+        if capture is not None:
+            self.audio = None
+            self.capture = capture
+            self.capture.start()
+            print("[OK] Speech recognition ready")
+            return
         
-        # Initialize audio
+        # Initialize audio - PyAudio is only needed for a live microphone
+        import pyaudio
         self.audio = pyaudio.PyAudio()
         
         # Find USB microphone
-        mic_index = None
-        for i in range(self.audio.get_device_count()):
-            info = self.audio.get_device_info_by_index(i)
-            if 'USB' in info['name'] and info['maxInputChannels'] > 0:
-                mic_index = i
-                print(f"[MIC] Using: {info['name']}")
-                break
-        
-        if mic_index is None:
+        self.mic_index, name = find_microphone(self.audio)
+        if self.mic_index is None:
             print("[WARN] USB mic not found, using default")
-            mic_index = 0
+        else:
+            print(f"[MIC] Using: {name}")
         
-        self.mic_index = mic_index
+        # One always-open stream into a ring buffer. Records at 16kHz if the
+        # mic supports it, otherwise at 48kHz (what most USB mics support)
+        # and resamples for Vosk
+        self.capture = AudioCapture(self.audio, self.mic_index, rate=SAMPLE_RATE)
+        self.capture.start()
+        print(f"[MIC] Recording at {self.capture.device_rate} Hz")
         print("[OK] Speech recognition ready")
     
     def init_ollama(self):
         """Check Ollama and model"""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            models = response.json().get('models', [])
-            
-            if any('phi3' in m['name'] for m in models):
-                self.model = "phi3:mini"
-            elif models:
-                self.model = models[0]['name']
-            else:
+            self.model = self.ollama.pick_model("phi3:mini")
+            if not self.model:
                 print("[ERROR] No Ollama models found")
                 print("  Download: ~/ai-helper.sh pull phi3:mini")
                 self.model = None
             
             if self.model:
                 print(f"[LLM] Using: {self.model}")
+                self.warm_up_model()
         except Exception as e:
             print(f"[ERROR] Ollama not running: {e}")
             print("  Start: ~/ai-helper.sh start")
             self.model = None
     
-    def listen(self):
-        """Listen and transcribe speech with Vosk"""
-        print("\n[LISTENING] Speak now... (5 seconds)")
-        
-        # Use 48kHz (what the mic supports) and resample to 16kHz for Vosk
-        mic_rate = 48000
-        vosk_rate = 16000
-        
-        stream = self.audio.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=mic_rate,  # Use mic's native rate
-            input=True,
-            input_device_index=self.mic_index,
-            frames_per_buffer=4800  # 0.1 second at 48kHz
-        )
-        
-        stream.start_stream()
-        
-        # Record for 5 seconds
-        frames_to_capture = int(mic_rate / 4800 * 5)  # 5 seconds
-        
-        for _ in range(frames_to_capture):
-            data = stream.read(4800, exception_on_overflow=False)
+    def warm_up_model(self):
+        """Preload the model so the first question isn't a cold load"""
+        print(f"[LLM] Loading {self.model}...")
+        try:
+            seconds = self.ollama.warm_up(self.model)
+            print(f"[LLM] Model ready ({seconds:.1f}s)")
+        except Exception as e:
+            print(f"[WARN] Model warm-up failed: {e}")
+        
+        # Prefill the system prompt now, so the first question reuses it
+        try:
+            tokens = self.prompts.prime(self.ollama, self.model)
+            print(f"[LLM] System prompt cached ({tokens} tokens)")
+        except Exception as e:
+            print(f"[WARN] System prompt priming failed: {e}")
+        self.metrics.gauge("llm_prompt_prefix_tokens", lambda: self.prompts.prefix_tokens)
+        
+        # Keep it loaded while waiting for the next question (unless keep_alive is 0)
+        self.model_keeper = self.ollama.start_keeper(self.model)
+        if self.model_keeper is None:
+            print("[LLM] keep_alive is 0 - the model unloads after each answer")
+    
+    def listen(self, on_partial=None):
+        """
+        Listen and transcribe speech with Vosk, stopping when you stop.
+        
+        Partial results are passed to on_partial() while you're still
+        talking. Recording ends once there have been no new words and no
+        voice energy for `trailing_silence` seconds, so a short command
+        returns in about a second instead of a fixed 5-second window.
+        """
+        print("\n[LISTENING] Speak now...")
+        on_partial = on_partial or self.show_partial
+        
+        chunk = SAMPLE_RATE // 20  # 50 ms - how often we check for end of speech
+        reader = self.capture.reader()
+        start = reader.position
+        
+        # Reuse the recognizer - just clear the previous utterance
+        self.recognizer.Reset()
+        
+        segments = []
+        partial = ""
+        last_voice = None  # Buffer position just after the last word or voiced chunk
+        
+        while True:
+            samples = reader.read(chunk)
+            if samples is None:
+                break  # Microphone stopped delivering audio
+            now = reader.position  # Time is measured in samples
+            data = samples.tobytes()
             
-            # Resample from 48kHz to 16kHz for Vosk
-            resampled_data, _ = audioop.ratecv(
-                data, 2, 1, mic_rate, vosk_rate, None
-            )
+            # Energy VAD against a slowly adapting noise floor
+            if self.vad.is_speech(samples):
+                last_voice = now
             
-            if self.recognizer.AcceptWaveform(resampled_data):
-                result = json.loads(self.recognizer.Result())
-                text = result.get('text', '')
+            if self.recognizer.AcceptWaveform(data):
+                text = json.loads(self.recognizer.Result()).get('text', '')
                 if text:
-                    stream.stop_stream()
-                    stream.close()
-                    return text
+                    segments.append(text)
+                    partial = ""
+                    last_voice = now
+            else:
+                new_partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+                if new_partial != partial:
+                    partial = new_partial
+                    last_voice = now
+                    if partial:
+                        on_partial(" ".join(segments + [partial]))
+            
+            # End of speech?
+            heard = segments or partial
+            elapsed = (now - start) / SAMPLE_RATE
+            if heard and (now - last_voice) / SAMPLE_RATE >= self.trailing_silence:
+                break
+            if not heard and elapsed >= self.no_speech_timeout:
+                break
+            if elapsed >= self.max_seconds:
+                break
         
         # Get final result
-        result = json.loads(self.recognizer.FinalResult())
-        text = result.get('text', '')
-        
-        stream.stop_stream()
-        stream.close()
-        
-        # Reset recognizer for next use
-        self.recognizer = KaldiRecognizer(self.vosk_model, vosk_rate)
+        self.speech_ended_at = self.capture.time_of(last_voice) if last_voice else time.monotonic()
+        self.timings["capture"] = ((last_voice or reader.position) - start) / SAMPLE_RATE
+        finished_at = time.monotonic()
+        final = json.loads(self.recognizer.FinalResult()).get('text', '')
+        self.timings["stt"] = time.monotonic() - finished_at  # Vosk works as you speak; this is the tail
+        if final:
+            segments.append(final)
+        if partial or segments:
+            print()  # End the partial-results line
         
+        text = " ".join(segments)
         return text if text else None
     
+    def show_partial(self, text):
+        """Show what has been recognized so far, updating one line"""
+        print(f"\r[HEARING] {text}", end="", flush=True)
+    
     def get_weather(self):
-        """Get weather if location is set"""
-        if not self.location:
-            return ""
-        
-        try:
-            response = requests.get(
-                f"https://wttr.in/{self.location}?format=j1",
-                timeout=3
-            )
-            data = response.json()
-            current = data['current_condition'][0]
-            temp_f = current['temp_F']
-            desc = current['weatherDesc'][0]['value']
-            return f"The weather in {self.location} is {temp_f}°F and {desc.lower()}. "
-        except:
-            return ""
+        """Weather from the cache if location is set (never waits for the network)"""
+        return self.weather.get()
     
-    def get_response(self, user_input):
-        """Get AI response from Ollama"""
-        if not self.model:
-            return "I need an AI model to respond. Please download phi3:mini."
-        
+    def system_prompt(self):
+        """The fixed system prompt (no time or weather, so Ollama can cache it)"""
+        return f"""You are {self.assistant_name}, a helpful AI assistant for {self.user_name} Richards.
+You run on a Raspberry Pi 5 - completely private and local.
+Be friendly, concise, and helpful."""
+    
+    def build_prompt(self, user_input):
+        """Build the user turn, with the time (and weather) last; returns (prompt, weather_info)"""
         # Check for greeting
         is_greeting = any(word in user_input.lower() 
                          for word in ["hello", "hi", "hey", "good morning"])
         
-        # Build prompt
-        hour = datetime.now().hour
-        time_of_day = "morning" if hour < 12 else "afternoon" if hour < 18 else "evening"
+        facts = [f"Current time: {datetime.now().strftime('%I:%M %p')}."]
         
-        system_prompt = f"""You are {self.assistant_name}, a helpful AI assistant for {self.user_name} Richards.
-You run on a Raspberry Pi 5 - completely private and local.
-Be friendly, concise, and helpful. Current time: {datetime.now().strftime('%I:%M %p')}"""
-
         # Add weather for greetings
-        if is_greeting:
-            weather = self.get_weather()
-            if weather:
-                system_prompt += f"\n{weather}"
+        weather_info = self.get_weather() if is_greeting else ""
+        if weather_info:
+            facts.append(weather_info)
+        
+        return self.prompts.prompt(user_input, facts), weather_info
+    
+    def build_request(self, prompt):
+        """Ollama request body for a prompt"""
+        return {
+            "model": self.model,
+            "system": self.prompts.system,  # Same every time - cached by Ollama
+            "prompt": prompt,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 100
+            }
+        }
+    
+    def fast_answer(self, user_input):
+        """A reply from the intent router or the response cache, or None if the LLM should answer"""
+        routed = self.intents.route(user_input) if self.intents else None
+        if routed:
+            return routed[1]
+        cached = self.responses.get(user_input) if self.responses else None
+        if cached:
+            self.remember(cached)
+        return cached
+    
+    def remember(self, answer, user_input=None):
+        """Keep the last answer, for "say that again", and cache it if user_input is given"""
+        if self.intents:
+            self.intents.remember(answer)
+        if self.responses and user_input:
+            self.responses.put(user_input, answer)
+    
+    def get_response(self, user_input):
+        """Get AI response from Ollama"""
+        answer = self.fast_answer(user_input)
+        if answer:
+            return answer
+        
+        if not self.model:
+            return self.NO_MODEL_REPLY
         
         try:
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": f"System: {system_prompt}\n\nUser: {user_input}\n\nAssistant:",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 100
-                    }
-                },
-                timeout=30
-            )
-            
-            result = response.json()
-            return result.get('response', '').strip()
+            prompt, weather_info = self.build_prompt(user_input)
+            result = self.ollama.generate(self.build_request(prompt))
+            self.prompts.record(self.metrics, result, self.timings)
+            answer = result.get('response', '').strip()
+            self.remember(answer, None if weather_info else user_input)  # Weather answers go stale
+            return answer
         except Exception as e:
             return f"Sorry, error: {e}"
     
+    def stream_answer(self, user_input, timings):
+        """
+        Yield the answer to user_input piece by piece as Ollama streams it.
+        
+        Records llm_first_token and llm_total in `timings`. Errors are
+        yielded as part of the answer, so they get spoken too.
+        """
+        answer = self.fast_answer(user_input)
+        if answer:
+            yield answer
+            return
+        
+        if not self.model:
+            yield self.NO_MODEL_REPLY
+            return
+        
+        prompt, weather_info = self.build_prompt(user_input)
+        answer = []
+        complete = True
+        request_at = time.monotonic()
+        
+        try:
+            for chunk in self.ollama.stream_generate(self.build_request(prompt)):
+                if chunk.get("done"):
+                    self.prompts.record(self.metrics, chunk, timings)
+                token = chunk.get("response", "")
+                if not token:
+                    continue
+                if not answer:
+                    timings["llm_first_token"] = time.monotonic() - request_at
+                    token = token.lstrip()
+                answer.append(token)
+                yield token
+        except Exception as e:
+            complete = False
+            yield f" Sorry, error: {e}"
+        timings["llm_total"] = time.monotonic() - request_at
+        # Only whole answers without the weather in them are cached
+        self.remember("".join(answer), user_input if complete and not weather_info else None)
+    
+    def respond(self, user_input):
+        """Stream the AI response and speak each sentence as soon as it's complete"""
+        if not self.model:
+            self.speak(self.get_response(user_input))
+            return
+        
+        splitter = SentenceSplitter()
+        started_at = self.speech_ended_at or time.monotonic()
+        self.speech_ended_at = None
+        self.speech.begin(started_at)
+        
+        print(f"\n[{self.assistant_name}]: ", end="", flush=True)
+        first_token_at = None
+        
+        for piece in self.stream_answer(user_input, self.timings):
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            print(piece, end="", flush=True)
+            for sentence in splitter.feed(piece):
+                self.speech.say(sentence)
+        
+        self.speech.say(splitter.flush())
+        print("\n")
+        
+        # Don't wait for the whole answer to be spoken - just for it to start
+        speech_start = self.speech.wait_started()
+        if self.speech.first_synthesis is not None:
+            self.timings["tts_first_sentence"] = self.speech.first_synthesis
+        if speech_start is not None:
+            self.timings["speech_start"] = speech_start
+            timing = f"[TIMING] Speech started {speech_start:.2f}s after you stopped talking"
+            if first_token_at:
+                timing += f" (first token {first_token_at - started_at:.2f}s)"
+            print(timing)
+    
     def speak(self, text):
-        """Speak with eSpeak"""
+        """Speak with eSpeak (returns immediately)"""
         print(f"\n[{self.assistant_name}]: {text}\n")
+        self.speech.say(text)
+    
+    def handle_command(self):
+        """Record one command and answer it"""
+        self.speech.interrupt()  # Stop talking if still speaking
+        self.timings = {}
         
-        try:
-            # Use espeak - already installed
-            subprocess.run(
-                ["espeak", "-s", "150", text],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        except:
-            pass  # Silent mode if espeak fails
+        # Listen
+        text = self.listen()
+        
+        if text:
+            print(f"[YOU]: {text}")
+            
+            # Get response and speak it as it streams in
+            self.respond(text)
+        else:
+            print("[INFO] Didn't hear anything. Try again.\n")
+            self.speech.say(self.NOT_HEARD_REPLY)
+            self.metrics.increment("not_heard_total")
+        
+        self.metrics.record(self.timings, heard=bool(text))
+        return text
     
     def run(self):
         """Main loop"""
@@ -258,26 +541,39 @@ Be friendly, concise, and helpful. Current time: {datetime.now().strftime('%I:%M
         print("\nPress Enter to talk, Ctrl+C to exit\n")
         
         try:
+            if self.pipeline_config.get("async", True):
+                # Listening, thinking and speaking run side by side
+                PushToTalkCore(self, barge_in=self.pipeline_config.get("barge_in", True),
+                               queue_size=self.pipeline_config.get("queue_size", 2)).run()
+                return
             while True:
                 input("Press Enter to start recording... ")
-                
-                # Listen
-                text = self.listen()
-                
-                if text:
-                    print(f"[YOU]: {text}")
-                    
-                    # Get response
-                    response = self.get_response(text)
-                    
-                    # Speak
-                    self.speak(response)
-                else:
-                    print("[INFO] Didn't hear anything. Try again.\n")
+                self.handle_command()
         
         except KeyboardInterrupt:
             print(f"\nGoodbye, {self.user_name}!")
         finally:
+            self.cleanup()
+    
+    def cleanup(self):
+        """Clean up resources"""
+        self.weather.stop()
+        self.timers.cancel()
+        if self.responses:
+            self.responses.close()
+        if getattr(self, 'model_keeper', None):
+            self.model_keeper.stop()
+        summary = self.metrics.summary(["capture", "stt", "llm_first_token", "tts_first_sentence", "speech_start"])
+        if summary:
+            print(f"[METRICS] Stage latencies:\n{summary}")
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.speech.interrupt()
+        self.tts.close()
+        self.capture.close()
+        if self.audio:
             self.audio.terminate()
 
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+PiAI Speech-to-Text Engine
+
+Loads a Whisper model once at startup and keeps it in memory, instead of
+letting speech_recognition load or re-check it on every utterance.
+
+Backends:
+- faster-whisper (CTranslate2): fastest on the Pi 5 CPU, native int8
+- openai-whisper (PyTorch): optional int8 dynamic quantization
+
+Every transcription is timed so you can compare model sizes and settings.
+"""
+
+import os
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper expects 16 kHz mono
+
+
+def quantize_linears(model):
+    """
+    int8 dynamic quantization of a PyTorch model's linear layers.
+    Returns (model, number of layers quantized).
+
+    quantize_dynamic() only converts modules whose type is exactly
+    nn.Linear, and whisper's layers are a subclass (whisper.model.Linear),
+    so they are made plain nn.Linear first - on the CPU in float32 they
+    compute the same.
+    """
+    import torch
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized = sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+    return model, quantized
+
+
+class WhisperSTT:
+    """Resident Whisper model with configurable size, threads and precision"""
+
+    def __init__(self, model_size="base", backend="auto", threads=None,
+                 compute_type="int8", language="en"):
+        self.model_size = model_size
+        self.threads = threads or os.cpu_count() or 4
+        self.compute_type = compute_type
+        self.language = language
+        self.latencies = []  # Seconds per utterance, most recent last
+
+        self.backend = None
+        if backend in ("auto", "faster-whisper"):
+            self._load_faster_whisper()
+        if self.backend is None and backend in ("auto", "whisper"):
+            self._load_openai_whisper()
+        if self.backend is None:
+            raise RuntimeError(
+                "No Whisper backend available. Install one of:\n"
+                "  pip install faster-whisper\n"
+                "  pip install openai-whisper"
+            )
+
+    def _load_faster_whisper(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            return
+        print(f"[STT] Loading faster-whisper '{self.model_size}' "
+              f"({self.compute_type}, {self.threads} threads)...")
+        start = time.monotonic()
+        self.model = WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.threads,
+        )
+        self.backend = "faster-whisper"
+        print(f"[STT] Model loaded in {time.monotonic() - start:.1f}s")
+
+    def _load_openai_whisper(self):
+        try:
+            import torch
+            import whisper
+        except ImportError:
+            return
+        print(f"[STT] Loading whisper '{self.model_size}' ({self.threads} threads)...")
+        start = time.monotonic()
+        torch.set_num_threads(self.threads)
+        self.model = whisper.load_model(self.model_size, device="cpu")
+
+        if self.compute_type == "int8":
+            try:
+                self.model, quantized = quantize_linears(self.model)
+                if not quantized:
+                    raise RuntimeError("no linear layers were converted")
+                print(f"[STT] Quantized {quantized} linear layers to int8")
+            except Exception as e:
+                print(f"[WARN] int8 quantization skipped: {e}")
+                self.compute_type = "float32"
+        else:
+            self.compute_type = "float32"
+
+        self.backend = "whisper"
+        print(f"[STT] Model loaded in {time.monotonic() - start:.1f}s")
+
+    def transcribe(self, samples):
+        """
+        Transcribe 16 kHz mono audio.
+
+        samples: float32 numpy array in [-1, 1] (or int16, converted here).
+        Returns the text (may be empty).
+        """
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+
+        start = time.monotonic()
+        if self.backend == "faster-whisper":
+            segments, _ = self.model.transcribe(
+                samples, language=self.language, beam_size=1, vad_filter=True
+            )
+            text = " ".join(segment.text.strip() for segment in segments)
+        else:
+            result = self.model.transcribe(samples, language=self.language, fp16=False)
+            text = result.get("text", "")
+        elapsed = time.monotonic() - start
+
+        self.latencies = self.latencies[-99:] + [elapsed]
+        duration = len(samples) / SAMPLE_RATE
+        rtf = elapsed / duration if duration else 0.0
+        print(f"[STT] {self.backend}/{self.model_size}: {elapsed:.2f}s for "
+              f"{duration:.1f}s of audio (RTF {rtf:.2f}, avg {self.average_latency():.2f}s)")
+        return text.strip()
+
+    def average_latency(self):
+        if not self.latencies:
+            return 0.0
+        return sum(self.latencies) / len(self.latencies)
@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+"""
+PiAI Speech Output Helpers
+
+Shared by assistant.py and simple_assistant.py.
+
+- SentenceSplitter: turns a stream of LLM tokens into whole sentences
+- TextToSpeech: a long-lived voice (Piper loaded once, eSpeak fallback)
+  plus an interruptible player that streams PCM to the sound card
+- TTSCache: synthesized phrases cached on disk and in memory, so repeated
+  lines ("Didn't catch that", weather) play instantly
+- SpeechPipeline: synthesizes and plays sentences on worker threads while
+  the LLM keeps generating, so playback starts after the first sentence
+  instead of after the whole answer
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import time
+import wave
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import namedtuple, OrderedDict
+from pathlib import Path
+
+# End of sentence: punctuation, optional closing quote/bracket, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+# Fallback split points for long run-on sentences
+CLAUSE_END = re.compile(r'[,;:]\s+')
+
+# 16-bit mono PCM and its sample rate
+Audio = namedtuple("Audio", ["pcm", "rate"])
+
+PIPER_VOICE = "en_US-lessac-medium"
+PIPER_VOICE_DIRS = [
+    Path.cwd(),
+    Path(__file__).resolve().parent,
+    Path.home() / ".local" / "share" / "piper",
+    Path.home() / "piper",
+]
+
+
+class SentenceSplitter:
+    """Accumulates streamed tokens and hands back complete sentences"""
+
+    def __init__(self, min_chars=20, max_chars=200):
+        self.min_chars = min_chars  # Merge tiny fragments ("Dr.", "Yes.") with the next one
+        self.max_chars = max_chars  # Split long sentences at a comma instead of waiting
+        self.buffer = ""
+
+    def feed(self, token):
+        """Add a token and return any sentences that are now complete."""
+        self.buffer += token
+        sentences = []
+        start = 0
+
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+
+        if len(self.buffer) > self.max_chars:
+            clauses = list(CLAUSE_END.finditer(self.buffer))
+            if clauses:
+                cut = clauses[-1].end()
+                sentences.append(self.buffer[:cut].strip())
+                self.buffer = self.buffer[cut:]
+
+        return sentences
+
+    def flush(self):
+        """Return whatever is left at the end of the stream."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+
+def read_wav(source):
+    """Read a WAV file path or file object into Audio."""
+    with wave.open(source, "rb") as wav:
+        return Audio(wav.readframes(wav.getnframes()), wav.getframerate())
+
+
+def write_wav(path, audio):
+    """Write Audio to a WAV file atomically."""
+    tmp = f"{path}.tmp"
+    with wave.open(tmp, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(audio.rate)
+        wav.writeframes(audio.pcm)
+    os.replace(tmp, path)
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Keyed by a hash of the text and the voice settings, so changing voice or
+    speed never plays stale audio. Recently used phrases are kept in memory
+    (LRU), everything is stored as WAV files on disk, and both are bounded
+    in bytes - the least recently used files are deleted first. Pinned
+    phrases (the pre-warmed fixed prompts) are never evicted from memory.
+    """
+
+    def __init__(self, directory=Path.home() / ".cache" / "piai" / "tts",
+                 max_memory_bytes=8 * 1024 * 1024, max_disk_bytes=64 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, voice_id):
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{voice_id}\n{normalized}".encode()).hexdigest()
+
+    def get(self, key):
+        """Return cached Audio or None."""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        path = self.directory / f"{key}.wav"
+        try:
+            audio = read_wav(str(path))
+            os.utime(path)  # Mark as recently used for disk eviction
+        except (OSError, EOFError, wave.Error):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio, pin=False):
+        """Store Audio in memory and on disk."""
+        with self._lock:
+            if pin:
+                self._pinned.add(key)
+            self._remember(key, audio)
+        try:
+            write_wav(str(self.directory / f"{key}.wav"), audio)
+            self._evict_disk()
+        except OSError:
+            pass  # Disk full or read-only - memory cache still works
+
+    def pin(self, key):
+        with self._lock:
+            self._pinned.add(key)
+
+    def _remember(self, key, audio):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key).pcm)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio.pcm)
+
+        for old_key in list(self._memory):
+            if self._memory_bytes <= self.max_memory_bytes:
+                break
+            if old_key in self._pinned or old_key == key:
+                continue
+            self._memory_bytes -= len(self._memory.pop(old_key).pcm)
+
+    def _evict_disk(self):
+        files = []
+        for path in self.directory.glob("*.wav"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+
+# -- Synthesis engines ---------------------------------------------------------
+
+class PiperVoiceEngine:
+    """Piper running in-process via the piper-tts package (voice loaded once)"""
+
+    name = "piper"
+
+    def __init__(self, voice, speed=1.0):
+        self.voice = voice
+        self.length_scale = 1.0 / speed
+
+    @classmethod
+    def load(cls, voice_name=PIPER_VOICE, speed=1.0):
+        """Return an engine, or None if piper-tts or the voice file is missing."""
+        try:
+            from piper import PiperVoice
+        except ImportError:
+            return None
+
+        for folder in PIPER_VOICE_DIRS:
+            for candidate in (folder / voice_name, folder / f"{voice_name}.onnx"):
+                if candidate.is_file():
+                    print(f"[TTS] Loading Piper voice: {candidate}")
+                    return cls(PiperVoice.load(str(candidate)), speed)
+        return None
+
+    def synthesize(self, text):
+        if hasattr(self.voice, "synthesize_stream_raw"):
+            # piper-tts 1.2.x
+            pcm = b"".join(self.voice.synthesize_stream_raw(text, length_scale=self.length_scale))
+            return Audio(pcm, self.voice.config.sample_rate)
+
+        # piper-tts 1.3+ yields AudioChunk objects
+        from piper import SynthesisConfig
+        config = SynthesisConfig(length_scale=self.length_scale)
+        chunks = list(self.voice.synthesize(text, syn_config=config))
+        rate = chunks[0].sample_rate if chunks else self.voice.config.sample_rate
+        return Audio(b"".join(chunk.audio_int16_bytes for chunk in chunks), rate)
+
+    def close(self):
+        pass
+
+
+class PiperProcessEngine:
+    """
+    One long-lived `piper` CLI process fed over a pipe.
+
+    The voice model is loaded when the process starts, not per utterance.
+    Each request is a JSON line naming an output file; Piper prints the file
+    path once it has been written, which tells us the audio is ready.
+    """
+
+    name = "piper-cli"
+
+    def __init__(self, binary, voice_name=PIPER_VOICE, speed=1.0):
+        self.workdir = tempfile.mkdtemp(prefix="piai-tts-")
+        self.process = subprocess.Popen(
+            [binary, "--model", voice_name, "--json-input",
+             "--output_dir", self.workdir, "--length_scale", str(1.0 / speed)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self._lock = threading.Lock()
+        self._count = 0
+
+    @classmethod
+    def start(cls, voice_name=PIPER_VOICE, speed=1.0):
+        """Return an engine, or None if the piper binary isn't installed."""
+        binary = shutil.which("piper")
+        if binary is None and os.path.exists("/usr/local/bin/piper"):
+            binary = "/usr/local/bin/piper"
+        if binary is None:
+            return None
+        print(f"[TTS] Starting Piper process: {voice_name}")
+        return cls(binary, voice_name, speed)
+
+    def synthesize(self, text):
+        with self._lock:
+            if self.process.poll() is not None:
+                raise RuntimeError("piper process exited")
+            self._count += 1
+            path = os.path.join(self.workdir, f"{self._count}.wav")
+            self.process.stdin.write(json.dumps({"text": text, "output_file": path}) + "\n")
+            self.process.stdin.flush()
+            if not self.process.stdout.readline():
+                raise RuntimeError("piper process exited")
+        try:
+            return read_wav(path)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class EspeakEngine:
+    """eSpeak fallback (fast, robotic, always available)"""
+
+    name = "espeak"
+
+    def __init__(self, wpm=175):
+        self.wpm = wpm
+
+    def synthesize(self, text):
+        result = subprocess.run(
+            ["espeak", "-s", str(self.wpm), "--stdout", text],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        return read_wav(io.BytesIO(result.stdout))
+
+    def close(self):
+        pass
+
+
+# -- Playback ------------------------------------------------------------------
+
+class AudioPlayer:
+    """Streams 16-bit mono PCM to the sound card; stop() cuts playback short"""
+
+    CHUNK_SECONDS = 0.05  # How quickly stop() takes effect
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._streams = {}
+        self._aplay = None
+        try:
+            import pyaudio
+            self._pyaudio = pyaudio
+            self._pa = pyaudio.PyAudio()
+        except Exception:
+            self._pa = None  # Fall back to piping into aplay
+
+    def play(self, audio, cancelled=None):
+        """
+        Play audio, returning when done or when stop() is called.
+
+        cancelled() is checked before each chunk as well: a stop() that
+        came just before play() is otherwise lost when it starts.
+        """
+        self._stop.clear()
+
+        def stopped():
+            return self._stop.is_set() or (cancelled is not None and cancelled())
+
+        step = max(2, int(audio.rate * self.CHUNK_SECONDS) * 2)
+
+        if self._pa is not None:
+            stream = self._stream(audio.rate)
+            for i in range(0, len(audio.pcm), step):
+                if stopped():
+                    break
+                stream.write(audio.pcm[i:i + step])
+            return
+
+        self._aplay = subprocess.Popen(
+            ["aplay", "-q", "-r", str(audio.rate), "-f", "S16_LE", "-t", "raw", "-c", "1", "-"],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            for i in range(0, len(audio.pcm), step):
+                if stopped():
+                    break
+                self._aplay.stdin.write(audio.pcm[i:i + step])
+            self._aplay.stdin.close()
+            self._aplay.wait()
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            self._aplay = None
+
+    def stop(self):
+        self._stop.set()
+        aplay = self._aplay
+        if aplay is not None:
+            aplay.kill()
+
+    def _stream(self, rate):
+        # Keep one open output stream per sample rate - opening is slow
+        if rate not in self._streams:
+            self._streams[rate] = self._pa.open(
+                format=self._pyaudio.paInt16,
+                channels=1,
+                rate=rate,
+                output=True,
+            )
+        return self._streams[rate]
+
+    def close(self):
+        for stream in self._streams.values():
+            stream.stop_stream()
+            stream.close()
+        self._streams = {}
+        if self._pa is not None:
+            self._pa.terminate()
+
+
+class NullPlayer:
+    """
+    Stands in for AudioPlayer without a sound card (offline replay).
+
+    Takes as long as the audio would take to play, divided by `speed`;
+    speed=0 returns immediately.
+    """
+
+    def __init__(self, speed=0.0):
+        self.speed = speed
+        self._stop = threading.Event()
+
+    def play(self, audio, cancelled=None):
+        self._stop.clear()
+        if cancelled is not None and cancelled():
+            return
+        if self.speed:
+            self._stop.wait(len(audio.pcm) / 2 / audio.rate / self.speed)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        pass
+
+
+class TextToSpeech:
+    """
+    Long-lived text-to-speech: one engine, one player.
+
+    Picks Piper in-process if the piper-tts package and voice file are
+    available, then a persistent piper CLI process, then eSpeak. If Piper
+    fails at runtime we drop to eSpeak rather than go silent. With a cache,
+    each phrase is only ever synthesized once per voice.
+    """
+
+    def __init__(self, voice=PIPER_VOICE, speed=1.0, espeak_wpm=175, use_piper=True, cache=None,
+                 engine=None, player=None):
+        self.voice = voice
+        self.speed = speed
+        self.espeak_wpm = espeak_wpm
+        self.cache = cache
+        self.engine = engine
+        if self.engine is None and use_piper:
+            self.engine = PiperVoiceEngine.load(voice, speed) or PiperProcessEngine.start(voice, speed)
+        if self.engine is None:
+            self.engine = EspeakEngine(espeak_wpm)
+        self.player = player or AudioPlayer()
+        print(f"[TTS] Using {self.engine.name}")
+
+    @property
+    def voice_id(self):
+        """Everything that changes how a phrase sounds (part of the cache key)."""
+        if isinstance(self.engine, EspeakEngine):
+            return f"espeak:{self.espeak_wpm}"
+        if not isinstance(self.engine, (PiperVoiceEngine, PiperProcessEngine)):
+            return self.engine.name
+        return f"piper:{self.voice}:{self.speed}"
+
+    def synthesize(self, text, pin=False):
+        """Return Audio for text, from the cache when possible."""
+        if self.cache is None:
+            return self._synthesize(text)
+
+        key = self.cache.key(text, self.voice_id)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self._synthesize(text)
+            self.cache.put(key, audio, pin=pin)
+        elif pin:
+            self.cache.pin(key)
+        return audio
+
+    def prewarm(self, phrases):
+        """Synthesize fixed phrases in the background so they play instantly."""
+        def warm():
+            for phrase in phrases:
+                try:
+                    self.synthesize(phrase, pin=True)
+                except Exception:
+                    pass
+        threading.Thread(target=warm, daemon=True).start()
+
+    def _synthesize(self, text):
+        try:
+            return self.engine.synthesize(text)
+        except Exception as e:
+            if isinstance(self.engine, EspeakEngine):
+                raise
+            print(f"\n[WARN] {self.engine.name} failed ({e}), switching to espeak")
+            self.engine.close()
+            self.engine = EspeakEngine(self.espeak_wpm)
+            return self.engine.synthesize(text)
+
+    def play(self, audio, cancelled=None):
+        self.player.play(audio, cancelled)
+
+    def stop(self):
+        """Stop whatever is playing right now."""
+        self.player.stop()
+
+    def close(self):
+        self.engine.close()
+        self.player.close()
+
+
+# -- Pipeline ------------------------------------------------------------------
+
+class SpeechPipeline:
+    """
+    Producer/consumer queues between the LLM stream and the speaker.
+
+    say() queues a sentence and returns immediately. One worker thread
+    synthesizes sentences, a second plays them in order, so the next
+    sentence is being synthesized while the current one plays. interrupt()
+    drops everything queued and stops playback (barge-in).
+    """
+
+    def __init__(self, tts, max_ahead=2, metrics=None):
+        self.tts = tts
+        self.metrics = metrics  # Optional metrics.Metrics for synthesis times
+        self.started_at = None
+        self.speech_started_at = None
+        self.first_synthesis = None  # Seconds to synthesize the first sentence
+        self._generation = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._started = threading.Event()
+        self._texts = queue.Queue()
+        self._audio = queue.Queue(maxsize=max_ahead)
+        threading.Thread(target=self._synthesize_loop, daemon=True).start()
+        threading.Thread(target=self._play_loop, daemon=True).start()
+
+    def begin(self, started_at=None):
+        """Mark the start of an interaction (e.g. end of user speech)."""
+        self.started_at = started_at or time.monotonic()
+        self.speech_started_at = None
+        self.first_synthesis = None
+        self._started.clear()
+
+    def say(self, sentence, on_start=None):
+        """
+        Queue a sentence for speaking (returns immediately).
+
+        on_start(started_at, synthesis_seconds) is called from the player
+        thread when the sentence starts playing, with started_at None if
+        it could not be synthesized.
+        """
+        if not sentence:
+            return
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+            self._texts.put((self._generation, sentence, on_start))
+
+    def is_speaking(self):
+        return not self._idle.is_set()
+
+    def wait_started(self, timeout=30):
+        """
+        Wait until the first sentence starts playing.
+
+        Returns seconds from begin() until speech started, or None if
+        nothing was spoken.
+        """
+        deadline = time.monotonic() + timeout
+        while not self._started.wait(0.02):
+            if self._idle.is_set() or time.monotonic() > deadline:
+                return None
+        if self.started_at is None:
+            return None
+        return self.speech_started_at - self.started_at
+
+    def wait(self, timeout=None):
+        """Block until everything queued has been spoken."""
+        return self._idle.wait(timeout)
+
+    def interrupt(self):
+        """Drop queued sentences and stop playback."""
+        with self._lock:
+            self._generation += 1
+            self._pending = 0
+            for q in (self._texts, self._audio):
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+            self._idle.set()
+        self.tts.stop()
+
+    def _done(self, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._pending -= 1
+                if self._pending <= 0:
+                    self._pending = 0
+                    self._idle.set()
+
+    def _synthesize_loop(self):
+        while True:
+            generation, sentence, on_start = self._texts.get()
+            audio = None
+            elapsed = None
+            if generation == self._generation:
+                start = time.monotonic()
+                try:
+                    audio = self.tts.synthesize(sentence)
+                except Exception:
+                    pass  # Never let a TTS failure stall the queue
+                elapsed = time.monotonic() - start
+                if self.first_synthesis is None:
+                    self.first_synthesis = elapsed
+                if self.metrics is not None:
+                    self.metrics.observe("tts_synthesis", elapsed)
+            self._audio.put((generation, audio, elapsed, on_start))
+
+    def _play_loop(self):
+        while True:
+            generation, audio, synthesis, on_start = self._audio.get()
+            if generation == self._generation and audio is not None:
+                started_at = time.monotonic()
+                if self.speech_started_at is None:
+                    self.speech_started_at = started_at
+                    self._started.set()
+                if on_start:
+                    on_start(started_at, synthesis)
+                try:
+                    self.tts.play(audio, cancelled=lambda: generation != self._generation)
+                except Exception:
+                    pass
+            elif generation == self._generation and on_start:
+                on_start(None, synthesis)
+            self._done(generation)
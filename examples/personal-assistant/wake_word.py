@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+PiAI Wake Word Engine
+
+Listens for several wake words at once with one model call per 80 ms
+frame: openWakeWord computes the shared melspectrogram and speech
+embedding once and scores every loaded keyword on it, so a second wake
+word costs only its small classifier head.
+
+- Per-keyword thresholds
+- Patience (frames in a row above threshold) and a refractory period, so
+  one utterance fires once
+- Energy gate: silent frames skip inference entirely - on an always-on Pi
+  the room is quiet most of the time, and idle CPU is heat and power
+- Inference-time and score histograms, to tune thresholds and see the cost
+
+Frames are counted instead of wall-clock time, so recorded audio replayed
+faster than real time behaves the same as a live microphone.
+"""
+
+import time
+from collections import deque
+
+from metrics import Histogram, exponential_buckets, linear_buckets
+from audio_capture import EnergyVAD
+
+FRAME_SAMPLES = 1280  # openWakeWord scores 80 ms frames at 16 kHz
+FRAME_SECONDS = FRAME_SAMPLES / 16000
+
+SCORE_BUCKETS = linear_buckets(0.1, 0.1, 9)  # 0.1, 0.2 ... 0.9
+INFERENCE_BUCKETS = exponential_buckets(0.0005, 1.5, 16)  # 0.5 ms to ~220 ms
+
+
+class WakeWordEngine:
+    """openWakeWord keywords with thresholds, debouncing and an energy gate"""
+
+    def __init__(self, keywords, thresholds=None, default_threshold=0.5, patience=1,
+                 refractory=2.0, energy_gate=True, gate_hangover=1.0, gate_preroll=1.0,
+                 inference_framework=None, metrics=None):
+        from openwakeword.model import Model
+
+        options = {}
+        if inference_framework:
+            options["inference_framework"] = inference_framework  # "tflite" or "onnx"
+        self.model = Model(wakeword_models=list(keywords), **options)
+
+        self.keywords = list(keywords)
+        self.thresholds = dict(thresholds or {})
+        self.default_threshold = default_threshold
+        self.patience = max(1, patience)
+        self.refractory_frames = int(refractory / FRAME_SECONDS)
+
+        # Gate opens on frames clearly above the background level and stays
+        # open for gate_hangover seconds, so quiet syllables are still scored
+        self.gate = EnergyVAD(ratio=2.0, min_level=150.0) if energy_gate else None
+        self.hangover_frames = int(gate_hangover / FRAME_SECONDS)
+        self._open_frames = 0
+        # Gated frames, replayed when sound starts: enough to refill the model's
+        # melspectrogram and embedding window, so the start of a wake word isn't
+        # scored against audio from long before the silence
+        self._preroll = deque(maxlen=max(1, int(gate_preroll / FRAME_SECONDS)))
+
+        self._streaks = {}  # Keyword -> frames in a row above threshold
+        self._last_fired = {}  # Keyword -> frame number of last detection
+
+        self.frames = 0
+        self.inferences = 0
+        self.skipped = 0
+        self.errors = 0
+        self.detections = {}
+        self.inference_time = Histogram(INFERENCE_BUCKETS)
+        self.scores = {}  # Keyword -> Histogram of its scores
+
+        # Optional metrics.Metrics to export everything to
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_histogram("wake_inference_seconds", self.inference_time)
+            metrics.gauge("wake_frames", lambda: self.frames)
+            metrics.gauge("wake_frames_skipped", lambda: self.skipped)
+            metrics.gauge("wake_errors", lambda: self.errors)
+
+    def threshold(self, name):
+        """Threshold for a keyword (model names may carry a version suffix)."""
+        if name in self.thresholds:
+            return self.thresholds[name]
+        for keyword, value in self.thresholds.items():
+            if name.startswith(keyword):
+                return value
+        return self.default_threshold
+
+    def process(self, frame):
+        """
+        Score one 80 ms frame of 16 kHz int16 audio.
+
+        Returns the detected keyword, or None.
+        """
+        self.frames += 1
+
+        if self.gate is not None:
+            if self.gate.is_speech(frame):
+                self._open_frames = self.hangover_frames
+            elif self._open_frames > 0:
+                self._open_frames -= 1
+            else:
+                self.skipped += 1
+                self._preroll.append(frame)
+                self._streaks.clear()
+                return None
+            if self._preroll:
+                self.model.reset()  # Forget the audio from before the gate closed
+                for gated in self._preroll:
+                    self._predict(gated)  # Catch the start of the wake word
+                self._preroll.clear()
+
+        detected = None
+        for name, score in self._predict(frame).items():
+            if name not in self.scores:
+                self.scores[name] = Histogram(SCORE_BUCKETS)
+                if self.metrics is not None:
+                    self.metrics.add_histogram("wake_score", self.scores[name], keyword=name)
+            self.scores[name].observe(score)
+            if score >= self.threshold(name):
+                self._streaks[name] = self._streaks.get(name, 0) + 1
+            else:
+                self._streaks[name] = 0
+
+            last = self._last_fired.get(name)
+            if (detected is None and self._streaks[name] >= self.patience
+                    and (last is None or self.frames - last > self.refractory_frames)):
+                detected = name
+
+        if detected:
+            self._last_fired[detected] = self.frames
+            self.detections[detected] = self.detections.get(detected, 0) + 1
+            if self.metrics is not None:
+                self.metrics.increment("wake_detections_total", keyword=detected)
+            self._streaks.clear()
+            self.model.reset()  # Don't fire again on the same audio
+        return detected
+
+    def _predict(self, frame):
+        start = time.perf_counter()
+        try:
+            prediction = self.model.predict(frame)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1 or self.errors % 100 == 0:
+                print(f"[WARN] Wake word inference failed ({self.errors}x): {e}")
+            return {}
+        self.inference_time.observe(time.perf_counter() - start)
+        self.inferences += 1
+        return prediction
+
+    def stats(self):
+        """Counters and histogram summaries as a plain dict."""
+        return {
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "detections": dict(self.detections),
+            "inference_time": self.inference_time.snapshot(),
+            "scores": {name: hist.snapshot() for name, hist in self.scores.items()},
+        }
+
+    def summary(self):
+        """One-line summary for the console."""
+        skipped = 100 * self.skipped / self.frames if self.frames else 0.0
+        line = (f"[WAKE] {self.frames} frames, {skipped:.0f}% skipped by energy gate, "
+                f"inference p50 {self.inference_time.quantile(0.5) * 1000:.1f} ms / "
+                f"p95 {self.inference_time.quantile(0.95) * 1000:.1f} ms")
+        if self.detections:
+            line += ", detections: " + ", ".join(f"{k}={v}" for k, v in self.detections.items())
+        if self.errors:
+            line += f", {self.errors} errors"
+        return line
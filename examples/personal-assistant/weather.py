@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+PiAI Weather Cache
+
+Current weather from wttr.in, kept in memory and on disk so a greeting
+never waits for the network:
+
+- get() only reads memory and returns at once - even offline
+- Stale-while-revalidate: after `ttl` seconds the cached report is still
+  used, and a background thread fetches a new one. Reports older than
+  `max_stale` are dropped rather than read out
+- A background thread refreshes the report before it goes stale, and
+  retries sooner after a failure
+- The last report is saved to disk, so it survives restarts
+
+StandInWeather is a local wttr.in look-alike for trying it offline:
+
+    python weather.py London                 # fetch and show the cached report
+    python weather.py London --stand-in      # same, against a local stand-in
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+WTTR_URL = "https://wttr.in"
+CACHE_PATH = Path.home() / ".cache" / "piai" / "weather.json"
+
+
+class WeatherCache:
+    """Non-blocking weather lookups with background refresh and a disk copy"""
+
+    def __init__(self, location, url=WTTR_URL, ttl=900, max_stale=6 * 3600, retry=60,
+                 timeout=5, path=CACHE_PATH):
+        self.location = location
+        self.url = url.rstrip("/")
+        self.ttl = ttl  # Seconds before a report is refreshed
+        self.max_stale = max_stale  # Seconds before a report is too old to use
+        self.retry = retry  # Seconds between attempts while offline
+        self.timeout = timeout
+        self.path = Path(path).expanduser() if path else None
+        self.report = None  # {"temp_F": ..., "description": ...}
+        self.fetched_at = None  # Wall-clock time, so it means the same after a restart
+        self.failures = 0
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()  # Wakes the refresh thread early
+        self._stopped = False
+        self._thread = None
+        self._load()
+
+    @classmethod
+    def from_config(cls, location, config):
+        """A cache with the settings in a config section; unknown keys are ignored with a warning."""
+        options = ("url", "ttl", "max_stale", "retry", "timeout", "path")
+        unknown = sorted(key for key in config if key not in options)
+        if unknown:
+            print(f"[WARN] Ignoring unknown weather settings: {', '.join(unknown)}")
+        return cls(location, **{key: config[key] for key in options if key in config})
+
+    def age(self):
+        """Seconds since the report was fetched, or None."""
+        if self.fetched_at is None:
+            return None
+        return max(0.0, time.time() - self.fetched_at)
+
+    def get(self):
+        """
+        Weather sentence for the prompt, from memory only.
+
+        Returns "" if there is no report recent enough to use.
+        """
+        with self._lock:
+            report, age = self.report, self.age()
+        if age is None or age > self.ttl:
+            self._wanted.set()  # Revalidate in the background
+        if report is None or age > self.max_stale:
+            return ""
+        return (f"The weather in {self.location} is {report['temp_F']}°F "
+                f"and {report['description'].lower()}. ")
+
+    def refresh(self):
+        """Fetch the weather now (blocking). Returns True on success."""
+        try:
+            # Using wttr.in - privacy-friendly weather service
+            # No API key needed, no tracking
+            response = self.session.get(f"{self.url}/{self.location}", params={"format": "j1"},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            current = response.json()["current_condition"][0]
+            report = {"temp_F": current["temp_F"], "description": current["weatherDesc"][0]["value"]}
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            self.failures += 1
+            if self.failures == 1:
+                print(f"[WARN] Weather update failed, using the cached report: {e}")
+            return False
+
+        with self._lock:
+            self.report = report
+            self.fetched_at = time.time()
+        if self.failures:
+            print("[WEATHER] Back online")
+        self.failures = 0
+        self._save()
+        return True
+
+    def start(self):
+        """Keep the report fresh from a background thread; returns self."""
+        if self.location and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wanted.set()
+
+    def _run(self):
+        next_refresh = self.fetched_at + self.ttl if self.fetched_at else 0.0
+        while not self._stopped:
+            if time.time() >= next_refresh:
+                next_refresh = time.time() + (self.ttl if self.refresh() else self.retry)
+            # get() wakes us to re-check, but never cuts short the retry delay
+            self._wanted.wait(max(0.0, next_refresh - time.time()))
+            self._wanted.clear()
+
+    def _load(self):
+        if not self.path or not self.location:
+            return
+        try:
+            saved = json.loads(self.path.read_text())
+            if saved["location"] == self.location:
+                self.report = saved["report"]
+                self.fetched_at = saved["fetched_at"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # No usable copy - the first refresh makes one
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            saved = {"location": self.location, "report": self.report, "fetched_at": self.fetched_at}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial = self.path.with_suffix(".tmp")
+            partial.write_text(json.dumps(saved))
+            os.replace(partial, self.path)  # Never leave a half-written file
+        except OSError:
+            pass  # Read-only or full disk - the memory copy still works
+
+
+class StandInWeather:
+    """Local HTTP server answering like wttr.in's ?format=j1, for offline testing"""
+
+    def __init__(self, host="127.0.0.1", port=0, temp_f=61, description="Partly cloudy",
+                 delay=0.0, fail=False):
+        self.temp_f = temp_f
+        self.description = description
+        self.delay = delay  # Seconds before answering, like a slow network
+        self.fail = fail  # Answer 503, like an outage
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.delay)
+                if server.fail:
+                    self.send_error(503)
+                    return
+                body = json.dumps({"current_condition": [{
+                    "temp_F": str(server.temp_f),
+                    "weatherDesc": [{"value": server.description}],
+                }]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show and refresh the cached weather report")
+    parser.add_argument("location")
+    parser.add_argument("--url", default=WTTR_URL, help="Weather service (default: wttr.in)")
+    parser.add_argument("--stand-in", action="store_true", help="Use a local stand-in server")
+    args = parser.parse_args()
+
+    server = StandInWeather(delay=1.0).start() if args.stand_in else None
+    cache = WeatherCache(args.location, server.url if server else args.url,
+                         path=None if server else CACHE_PATH)
+
+    start = time.monotonic()
+    cached = cache.get()
+    print(f"Cached ({(time.monotonic() - start) * 1000:.1f} ms): {cached or '(nothing yet)'}")
+    start = time.monotonic()
+    if cache.refresh():
+        print(f"Fetched ({time.monotonic() - start:.2f} s): {cache.get()}")
+    if server:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+PiAI Response Cache
+
+On a factory floor the same handful of questions come up again and again,
+and each one costs a full generation on the Pi. ResponseCache keeps the
+answers in SQLite, so a repeated question is answered in milliseconds:
+
+- Exact lookups: the question is normalized (lower case, no punctuation,
+  single spaces) and looked up together with a scope - a hash of the model
+  and system prompt - so switching either never returns old answers
+- Similar lookups (optional): with an `embed` function, e.g. a local Ollama
+  embedding model such as nomic-embed-text, a new question is compared to
+  the cached ones (cosine similarity, a NumPy matrix in memory) and reuses
+  the answer of one that is close enough
+- Answers expire after `ttl` seconds. Questions about things that change -
+  the time, the weather, "today", "latest" - are never cached at all
+- invalidate() forgets everything, or only questions containing a word
+
+It is opt-in for the assistants and the chatbot. To look inside:
+
+    python response_cache.py stats
+    python response_cache.py clear              # or: clear "shift schedule"
+"""
+
+import re
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Exact lookups still work
+
+CACHE_PATH = Path.home() / ".cache" / "piai" / "responses.sqlite"
+
+# Answers to these go stale - or are wrong - by the next time they're asked.
+# Greetings too: the assistants answer them with the time of day and weather
+VOLATILE = (r"\b(time|date|day|today|tonight|tomorrow|yesterday|now|currently|latest|"
+            r"recent|news|weather|temperature|forecast|this (morning|afternoon|evening|week|month|year)|"
+            r"timer|remind|hello|hi|hey|good (morning|afternoon|evening))\b")
+
+
+def normalize(text):
+    """Lower case, no punctuation, single spaces - the exact-match key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def scope_key(*parts):
+    """Short hash of whatever the answers depend on (model, system prompt...)."""
+    return hashlib.sha256("\n".join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Answers to repeated questions, from SQLite, with optional similarity matching"""
+
+    def __init__(self, path=CACHE_PATH, scope="", ttl=24 * 3600, embed=None, similarity=0.92,
+                 volatile=VOLATILE, max_entries=1000, metrics=None):
+        self.path = Path(path).expanduser()
+        self.scope = scope
+        self.ttl = ttl  # Seconds an answer stays valid
+        self.embed = embed  # text -> vector, or None for exact lookups only
+        self.similarity = similarity  # Minimum cosine similarity for a similar-question hit
+        self.volatile = re.compile(volatile) if volatile else None
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # (scope, keys, created, matrix) of the embeddings, loaded lazily
+        self._vector = None  # (key, vector) of the last miss, reused by put()
+
+        if self.embed and np is None:
+            print("[WARN] NumPy not installed - only exact repeats are answered from the cache")
+            self.embed = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")  # Fewer SD card syncs per write
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            scope TEXT, question TEXT, answer TEXT, created REAL, hits INTEGER DEFAULT 0,
+            embedding BLOB, PRIMARY KEY (scope, question))""")
+        self._db.commit()
+
+    def cacheable(self, question):
+        """False for questions whose answer depends on when they're asked."""
+        key = normalize(question)
+        return bool(key) and not (self.volatile and self.volatile.search(key))
+
+    def get(self, question):
+        """The cached answer to question, or None."""
+        start = time.monotonic()
+        answer, result = self._lookup(question)
+        if self.metrics:
+            self.metrics.increment("response_cache_total", result=result)
+            if answer is not None:
+                self.metrics.observe("response_cache", time.monotonic() - start)
+        return answer
+
+    def put(self, question, answer):
+        """Remember answer to question (ignored for volatile questions)."""
+        answer = answer.strip()
+        if not answer or not self.cacheable(question):
+            return
+        key = normalize(question)
+        vector = None
+        if self.embed:
+            vector = self._vector[1] if self._vector and self._vector[0] == key else self._embedding(key)
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses (scope, question, answer, created, embedding) "
+                             "VALUES (?, ?, ?, ?, ?)", (self.scope, key, answer, time.time(), blob))
+            self._evict()
+            self._db.commit()
+            self._index = None
+
+    def invalidate(self, words=None):
+        """Forget every answer (all scopes), or those whose question contains words."""
+        with self._lock:
+            if words:
+                cursor = self._db.execute("DELETE FROM responses WHERE question LIKE ?",
+                                          (f"%{normalize(words)}%",))
+            else:
+                cursor = self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._index = None
+        return cursor.rowcount
+
+    def stats(self):
+        """Entries and hits on disk, plus this run's lookups."""
+        with self._lock:
+            entries, hits = self._db.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM responses").fetchone()
+        return {"entries": entries, "hits_stored": hits, "hits": self.hits,
+                "similar_hits": self.similar_hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _lookup(self, question):
+        if not self.cacheable(question):
+            return None, "skipped"
+        key = normalize(question)
+        oldest = time.time() - self.ttl
+
+        with self._lock:
+            row = self._db.execute("SELECT answer FROM responses WHERE scope = ? AND question = ? "
+                                   "AND created >= ?", (self.scope, key, oldest)).fetchone()
+        if row:
+            self._count_hit(key)
+            self.hits += 1
+            return row[0], "hit"
+
+        if self.embed:
+            vector = self._embedding(key)
+            self._vector = (key, vector)
+            match = self._most_similar(vector, oldest) if vector is not None else None
+            if match:
+                with self._lock:
+                    row = self._db.execute("SELECT answer FROM responses WHERE scope = ? AND question = ?",
+                                           (self.scope, match)).fetchone()
+                if row:
+                    self._count_hit(match)
+                    self.similar_hits += 1
+                    return row[0], "similar"
+
+        self.misses += 1
+        return None, "miss"
+
+    def _count_hit(self, key):
+        with self._lock:
+            self._db.execute("UPDATE responses SET hits = hits + 1 WHERE scope = ? AND question = ?",
+                             (self.scope, key))
+            self._db.commit()
+
+    def _embedding(self, text):
+        try:
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            print(f"[WARN] Embedding failed, using exact matches only: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _most_similar(self, vector, oldest):
+        """Key of the most similar fresh question above the threshold, or None."""
+        with self._lock:
+            if self._index is None or self._index[0] != self.scope:
+                rows = self._db.execute("SELECT question, created, embedding FROM responses "
+                                        "WHERE scope = ? AND embedding IS NOT NULL", (self.scope,)).fetchall()
+                vectors = [np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows]
+                keys = [question for question, _, _ in rows]
+                created = np.array([when for _, when, _ in rows])
+                if vectors and all(len(v) == len(vectors[0]) for v in vectors):
+                    self._index = (self.scope, keys, created, np.vstack(vectors))
+                else:
+                    self._index = (self.scope, [], created[:0], None)  # Nothing (usable) yet
+            _, keys, created, matrix = self._index
+
+        if matrix is None or matrix.shape[1] != len(vector):
+            return None
+        scores = matrix @ vector  # Stored vectors are unit length, so this is cosine similarity
+        scores[created < oldest] = -1.0
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity else None
+
+    def _evict(self):
+        """
+        Drop expired answers, then the oldest beyond max_entries (lock held).
+
+        Only in this scope: the other assistants sharing the file may use a
+        longer ttl, and their answers are theirs to expire.
+        """
+        self._db.execute("DELETE FROM responses WHERE scope = ? AND created < ?",
+                         (self.scope, time.time() - self.ttl))
+        self._db.execute("DELETE FROM responses WHERE scope = ? AND rowid NOT IN "
+                         "(SELECT rowid FROM responses WHERE scope = ? ORDER BY created DESC LIMIT ?)",
+                         (self.scope, self.scope, self.max_entries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the cached answers")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("words", nargs="?", help="Only clear questions containing these words")
+    parser.add_argument("--path", default=CACHE_PATH, help=f"Cache file (default: {CACHE_PATH})")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path)
+    if args.action == "clear":
+        print(f"Removed {cache.invalidate(args.words)} cached answers")
+    else:
+        stats = cache.stats()
+        print(f"{stats['entries']} cached answers, reused {stats['hits_stored']} times")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,33 @@ Simple Chatbot Example for PiAI
 A minimal chatbot using Ollama's API with conversation context.
 """
 
-import requests
-import json
+import sys
+import time
+import threading
 from datetime import datetime
+from pathlib import Path
+
+import requests
+
+# Shared helpers live one level up in examples/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ollama_client import get_client
+from response_cache import ResponseCache, scope_key
 
 # Configuration
-API_URL = "http://localhost:11434/api/generate"
 MODEL = "phi3:mini"  # Change to any installed model
+STREAM = True  # Print tokens as they arrive instead of waiting for the full answer
+
+# Conversation window - older turns are folded into a rolling summary
+MAX_TURNS = 6              # Exchanges kept word-for-word
+MAX_HISTORY_TOKENS = 1024  # Approximate token budget for the verbatim turns
+SUMMARY_TOKENS = 150       # Max length of the rolling summary
+
+# Response cache - opening questions asked before are answered from
+# ~/.cache/piai/responses.sqlite without calling the model
+RESPONSE_CACHE = False     # Opt in
+CACHE_TTL = 24 * 3600      # Seconds before a cached answer is generated again
+EMBEDDING_MODEL = None     # e.g. "nomic-embed-text" to match similar questions too
 
 # Colors for terminal output
 class Colors:
@@ -20,47 +40,361 @@ class Colors:
     ERROR = '\033[91m'     # Red
     RESET = '\033[0m'      # Reset
 
-def print_colored(text, color):
+def print_colored(text, color, end='\n'):
     """Print colored text to terminal."""
-    print(f"{color}{text}{Colors.RESET}")
+    print(f"{color}{text}{Colors.RESET}", end=end, flush=True)
 
 def check_ollama_connection():
     """Verify Ollama server is running."""
+    return get_client().is_available()
+
+def build_prompt(prompt, conversation_history="", context=None):
+    """
+    Build the prompt text for the next turn.
+    
+    When we have a KV-cache context from the previous reply, the model has
+    already "read" the conversation so only the new turn is sent.
+    """
+    turn = "\nUser: " + prompt + "\nAssistant:"
+    if context:
+        return turn
+    return conversation_history + turn
+
+def build_request(prompt, conversation_history="", context=None, model=None):
+    """Build the /api/generate request body."""
+    payload = {
+        "model": model or MODEL,
+        "prompt": build_prompt(prompt, conversation_history, context),
+        "options": {
+            "temperature": 0.7,
+            "top_p": 0.9,
+        }
+    }
+    if context:
+        payload["context"] = context
+    return payload
+
+def build_stats(final, start, first_token_at=None, chunk_count=0):
+    """Turn Ollama's final response fields into per-turn latency stats."""
+    now = time.monotonic()
+    total = now - start
+    ttft = (first_token_at - start) if first_token_at else total
+    
+    # Prefer Ollama's own counters; fall back to counting streamed chunks
+    eval_count = final.get("eval_count", chunk_count)
+    eval_seconds = final.get("eval_duration", 0) / 1e9
+    if not eval_seconds and first_token_at:
+        eval_seconds = now - first_token_at
+    tokens_per_sec = eval_count / eval_seconds if eval_seconds > 0 else 0.0
+    
+    return {
+        "ttft": ttft,
+        "total": total,
+        "tokens": eval_count,
+        "tokens_per_sec": tokens_per_sec,
+        "prompt_tokens": final.get("prompt_eval_count", 0),
+        "context": final.get("context"),
+    }
+
+def get_ai_response(prompt, conversation_history="", context=None, model=None):
+    """
+    Send prompt to Ollama and get response.
+    
+    Returns (response_text, stats), with stats None if the request failed.
+    """
+    start = time.monotonic()
+    
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
-        return False
+        result = get_client().generate(
+            build_request(prompt, conversation_history, context, model),
+            timeout=60
+        )
+        return result['response'], build_stats(result, start)
+    
+    except requests.exceptions.HTTPError as e:
+        return f"Error: Server returned status {e.response.status_code}", None
+    except requests.exceptions.Timeout:
+        return "Error: Request timed out. Try a smaller model or shorter prompt.", None
+    except requests.exceptions.RequestException as e:
+        return f"Error: {str(e)}", None
 
-def get_ai_response(prompt, conversation_history=""):
-    """Send prompt to Ollama and get response."""
-    # Build context from conversation history
-    full_prompt = conversation_history + "\nUser: " + prompt + "\nAssistant:"
+def stream_ai_response(prompt, conversation_history="", on_token=None, context=None, model=None):
+    """
+    Stream a response from Ollama, calling on_token() for each chunk.
+    
+    Ollama sends one JSON object per line (NDJSON) while it generates.
+    Returns (response_text, stats) where stats holds time-to-first-token
+    and tokens/sec for the turn, or None if the request failed.
+    """
+    start = time.monotonic()
+    first_token_at = None
+    chunks = []
+    final = {}
+    
+    try:
+        payload = build_request(prompt, conversation_history, context, model)
+        for chunk in get_client().stream_generate(payload, timeout=60):
+            token = chunk.get("response", "")
+            if token:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                chunks.append(token)
+                if on_token:
+                    on_token(token)
+            
+            if chunk.get("done"):
+                final = chunk
+    
+    except requests.exceptions.HTTPError as e:
+        return f"Error: Server returned status {e.response.status_code}", None
+    except requests.exceptions.Timeout:
+        return "Error: Request timed out. Try a smaller model or shorter prompt.", None
+    except requests.exceptions.RequestException as e:
+        return f"Error: {str(e)}", None
+    
+    return "".join(chunks), build_stats(final, start, first_token_at, len(chunks))
+
+def summarize_turns(summary, turns, model=None):
+    """
+    Ask the model to fold turns into the running summary.
+    
+    Returns the new summary, or None if the request failed.
+    """
+    new_lines = "".join(f"\nUser: {user}\nAssistant: {assistant}" for user, assistant in turns)
+    prompt = (
+        "Update the summary of a conversation with the new lines below. "
+        "Keep names, facts and decisions. Be brief.\n\n"
+        f"Current summary: {summary or '(none)'}\n\n"
+        f"New lines:{new_lines}\n\n"
+        "Updated summary:"
+    )
     
     try:
-        response = requests.post(
-            API_URL,
-            json={
-                "model": MODEL,
-                "prompt": full_prompt,
-                "stream": False,
+        result = get_client().generate(
+            {
+                "model": model or MODEL,
+                "prompt": prompt,
                 "options": {
-                    "temperature": 0.7,
-                    "top_p": 0.9,
+                    "temperature": 0.2,
+                    "num_predict": SUMMARY_TOKENS,
                 }
             },
-            timeout=60
+            timeout=120
         )
+        return result['response'].strip()
+    except requests.exceptions.RequestException:
+        pass
+    return None
+
+class ConversationHistory:
+    """
+    Bounded, token-aware conversation window.
+    
+    The last MAX_TURNS exchanges are kept word-for-word. Older ones move to a
+    pending list and a background thread folds them into a rolling summary,
+    so the prompt stays about the same size however long the session runs
+    and the user never waits for the summary. Turns are stored as tuples and
+    only joined into text when a prompt is built.
+    """
+    
+    def __init__(self, model=MODEL, max_turns=MAX_TURNS, max_tokens=MAX_HISTORY_TOKENS):
+        self.model = model
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.chars_per_token = 4.0  # Refined from Ollama's prompt_eval_count
+        self.summary = ""
+        self.turns = []       # (user, assistant) kept verbatim
+        self.pending = []     # Evicted turns waiting to be summarized
+        self.transcript = []  # Every turn, for /save
+        self.version = 0      # Bumped whenever the prompt prefix changes
+        self._generation = 0  # Bumped by clear() so stale summaries are dropped
+        self._summarizer = None
+        self._lock = threading.Lock()
+    
+    def __bool__(self):
+        return bool(self.transcript)
+    
+    def count_tokens(self, text):
+        """Estimate the token count of text."""
+        return int(len(text) / self.chars_per_token) + 1
+    
+    def calibrate(self, text, token_count):
+        """Refine the chars-per-token estimate from a known prompt size."""
+        if token_count > 0 and len(text) > 200:
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * (len(text) / token_count)
+    
+    def render(self):
+        """Return the summary plus verbatim turns as prompt text."""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"\n(Summary of the earlier conversation: {self.summary})")
+            for user, assistant in self.pending + self.turns:
+                parts.append(f"\nUser: {user}\nAssistant: {assistant}")
+        return "".join(parts)
+    
+    def text(self):
+        """Return the full transcript (not just the window)."""
+        return "".join(f"\nUser: {user}\nAssistant: {assistant}"
+                       for user, assistant in self.transcript)
+    
+    def add(self, user, assistant):
+        """Record a finished exchange and evict old turns if over budget."""
+        with self._lock:
+            self.turns.append((user, assistant))
+            self.transcript.append((user, assistant))
+            
+            while len(self.turns) > 1 and (
+                len(self.turns) > self.max_turns or self._turn_tokens() > self.max_tokens
+            ):
+                self.pending.append(self.turns.pop(0))
+            
+            # If summarizing keeps failing (e.g. Ollama busy), drop the oldest
+            # pending turns rather than let the prompt grow without bound
+            if len(self.pending) > self.max_turns:
+                del self.pending[:len(self.pending) - self.max_turns]
+                self.version += 1
+            
+            if self.pending and self._summarizer is None:
+                self._summarizer = threading.Thread(target=self._summarize, daemon=True)
+                self._summarizer.start()
+    
+    def clear(self):
+        """Forget everything (new conversation)."""
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.pending = []
+            self.transcript = []
+            self.version += 1
+            self._generation += 1
+    
+    def _turn_tokens(self):
+        return sum(self.count_tokens(user) + self.count_tokens(assistant)
+                   for user, assistant in self.turns)
+    
+    def _summarize(self):
+        """Background worker: fold pending turns into the summary."""
+        while True:
+            with self._lock:
+                batch = list(self.pending)
+                summary = self.summary
+                generation = self._generation
+                if not batch:
+                    self._summarizer = None
+                    return
+            
+            new_summary = summarize_turns(summary, batch, self.model)
+            
+            with self._lock:
+                if generation != self._generation:
+                    continue  # Conversation was reset meanwhile
+                if new_summary is None:
+                    self._summarizer = None
+                    return
+                self.summary = new_summary
+                del self.pending[:len(batch)]
+                self.version += 1
+
+class ChatSession:
+    """
+    Conversation state that reuses Ollama's KV-cache between turns.
+    
+    Each /api/generate reply includes a `context` token array. Passing it
+    back on the next request lets the model continue where it left off, so
+    only the new user turn needs a prefill instead of the whole transcript.
+    The context is tied to one model and one conversation; when it is
+    missing or rejected we resend the transcript once and pick up a fresh one.
+    It is also dropped whenever the history window folds old turns into its
+    summary, since the model's cache still holds the old turns verbatim.
+    """
+    
+    def __init__(self, model=MODEL, cache=None):
+        self.model = model
+        self.history = ConversationHistory(model)
+        self.context = None
+        self.context_version = self.history.version
+        self.cache = cache  # ResponseCache, used for the first question of a conversation
+        if cache:
+            cache.scope = scope_key(model)
+    
+    def reset(self):
+        """Start a new conversation (drops transcript and cached context)."""
+        self.history.clear()
+        self.context = None
+    
+    def switch_model(self, model):
+        """Change model; the transcript is kept but the context is not portable."""
+        self.model = model
+        self.history.model = model
+        self.context = None
+        if self.cache:
+            self.cache.scope = scope_key(model)
+    
+    def ask(self, user_input, on_token=None):
+        """Get a reply for user_input. Returns (response_text, stats)."""
+        if self.context_version != self.history.version:
+            self.context = None
+        
+        # Later answers depend on the conversation so far, so only an
+        # opening question can be answered from (or go into) the cache
+        first_question = self.cache is not None and not self.history
+        if first_question:
+            start = time.monotonic()
+            cached = self.cache.get(user_input)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                self.history.add(user_input, cached)
+                seconds = time.monotonic() - start
+                return cached, {"ttft": seconds, "total": seconds, "tokens": 0, "tokens_per_sec": 0.0,
+                                "prompt_tokens": 0, "context": None, "cached": True}
+        
+        delivered = []
+        
+        def deliver(token):
+            delivered.append(token)
+            if on_token:
+                on_token(token)
+        
+        ai_response, stats = self._send(user_input, deliver)
+        
+        if stats is None and self.context and not delivered:
+            # Context rejected (e.g. Ollama restarted) - fall back to full transcript.
+            # Not once part of an answer is out: the retry would show it twice
+            self.context = None
+            ai_response, stats = self._send(user_input, deliver)
+        
+        if stats:
+            self.history.add(user_input, ai_response)
+            self.context = stats.get("context") or None
+            self.context_version = self.history.version
+            if first_question:
+                self.cache.put(user_input, ai_response)
         
-        if response.status_code == 200:
-            return response.json()['response']
+        return ai_response, stats
+    
+    def _send(self, user_input, on_token):
+        history = "" if self.context else self.history.render()
+        if STREAM:
+            ai_response, stats = stream_ai_response(user_input, history, on_token,
+                                                    context=self.context, model=self.model)
         else:
-            return f"Error: Server returned status {response.status_code}"
-            
-    except requests.exceptions.Timeout:
-        return "Error: Request timed out. Try a smaller model or shorter prompt."
-    except requests.exceptions.RequestException as e:
-        return f"Error: {str(e)}"
+            ai_response, stats = get_ai_response(user_input, history,
+                                                 context=self.context, model=self.model)
+        
+        if stats and not self.context:
+            self.history.calibrate(build_prompt(user_input, history), stats["prompt_tokens"])
+        return ai_response, stats
+
+def format_stats(stats):
+    """Format per-turn latency stats for display."""
+    if stats.get("cached"):
+        return f"[cached answer | total {stats['total'] * 1000:.1f} ms]"
+    return (f"[first token {stats['ttft']:.2f}s | "
+            f"{stats['tokens']} tokens @ {stats['tokens_per_sec']:.1f} tok/s | "
+            f"prefill {stats['prompt_tokens']} tokens | "
+            f"total {stats['total']:.1f}s]")
 
 def save_conversation(conversation_history):
     """Save conversation to a log file."""
@@ -85,13 +419,25 @@ def main():
         print_colored("   Please start Ollama: ./ai-helper.sh start\n", Colors.SYSTEM)
         return
     
-    print_colored(f"✅ Connected to Ollama (model: {MODEL})\n", Colors.SYSTEM)
+    model = get_client().pick_model(MODEL)
+    if model is None:
+        print_colored("❌ Error: No models installed", Colors.ERROR)
+        print_colored(f"   Download one: ./ai-helper.sh pull {MODEL}\n", Colors.SYSTEM)
+        return
+    
+    print_colored(f"✅ Connected to Ollama (model: {model})\n", Colors.SYSTEM)
     print_colored("Commands:", Colors.SYSTEM)
-    print_colored("  /bye  - Exit chatbot", Colors.SYSTEM)
-    print_colored("  /save - Save conversation to file", Colors.SYSTEM)
-    print_colored("  /new  - Start new conversation\n", Colors.SYSTEM)
+    print_colored("  /bye          - Exit chatbot", Colors.SYSTEM)
+    print_colored("  /save         - Save conversation to file", Colors.SYSTEM)
+    print_colored("  /new          - Start new conversation", Colors.SYSTEM)
+    print_colored("  /model <name> - Switch to another installed model", Colors.SYSTEM)
+    print_colored("  /cache        - Show cached answers (/cache clear forgets them)\n", Colors.SYSTEM)
     
-    conversation_history = ""
+    cache = None
+    if RESPONSE_CACHE:
+        embed = (lambda text: get_client().embed(EMBEDDING_MODEL, text)) if EMBEDDING_MODEL else None
+        cache = ResponseCache(ttl=CACHE_TTL, embed=embed)
+    session = ChatSession(model, cache)
     
     while True:
         # Get user input
@@ -107,34 +453,66 @@ def main():
             break
         
         elif user_input.lower() == '/save':
-            if conversation_history:
-                filename = save_conversation(conversation_history)
+            if session.history:
+                filename = save_conversation(session.history.text())
                 print_colored(f"\n✅ Conversation saved to: {filename}\n", Colors.SYSTEM)
             else:
                 print_colored("\n⚠️  No conversation to save yet.\n", Colors.SYSTEM)
             continue
         
         elif user_input.lower() == '/new':
-            conversation_history = ""
+            session.reset()
             print_colored("\n✅ Started new conversation.\n", Colors.SYSTEM)
             continue
         
+        elif user_input.lower().startswith('/model'):
+            parts = user_input.split(maxsplit=1)
+            if len(parts) == 2:
+                session.switch_model(parts[1])
+                print_colored(f"\n✅ Switched to model: {session.model}\n", Colors.SYSTEM)
+            else:
+                print_colored(f"\nCurrent model: {session.model}\n", Colors.SYSTEM)
+            continue
+        
+        elif user_input.lower().startswith('/cache'):
+            if cache is None:
+                print_colored("\nResponse cache is off (set RESPONSE_CACHE = True).\n", Colors.SYSTEM)
+            elif user_input.lower().split()[-1] == 'clear':
+                print_colored(f"\n✅ Removed {cache.invalidate()} cached answers.\n", Colors.SYSTEM)
+            else:
+                stats = cache.stats()
+                print_colored(f"\n{stats['entries']} cached answers | this session: {stats['hits']} hits, "
+                              f"{stats['similar_hits']} similar, {stats['misses']} misses\n", Colors.SYSTEM)
+            continue
+        
         # Skip empty input
         if not user_input:
             continue
         
         # Get AI response
-        print_colored("AI: ", Colors.AI, end='')
-        print_colored("(thinking...)", Colors.SYSTEM, end='\r')
-        
-        ai_response = get_ai_response(user_input, conversation_history)
-        
-        # Clear "thinking" message and print response
-        print(' ' * 30, end='\r')  # Clear line
-        print_colored(f"{ai_response}\n", Colors.AI)
+        if STREAM:
+            print_colored("AI: ", Colors.AI, end='')
+            ai_response, stats = session.ask(
+                user_input,
+                on_token=lambda token: print_colored(token, Colors.AI, end='')
+            )
+            if stats:
+                print()
+        else:
+            print_colored("AI: ", Colors.AI, end='')
+            print_colored("(thinking...)", Colors.SYSTEM, end='\r')
+            
+            ai_response, stats = session.ask(user_input)
+            
+            # Clear "thinking" message and print response
+            print(' ' * 30, end='\r')  # Clear line
+            if stats:
+                print_colored(f"AI: {ai_response}", Colors.AI)
         
-        # Update conversation history
-        conversation_history += f"\nUser: {user_input}\nAssistant: {ai_response}"
+        if stats:
+            print_colored(format_stats(stats) + "\n", Colors.SYSTEM)
+        else:
+            print_colored(f"{ai_response}\n", Colors.ERROR)
 
 if __name__ == "__main__":
     main()